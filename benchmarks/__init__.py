@@ -0,0 +1,5 @@
+"""
+Benchmarks for the login and sign up paths of django-cryptolock.
+
+Run them with ``python -m benchmarks.run`` from the repository root.
+"""
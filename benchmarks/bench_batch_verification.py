@@ -0,0 +1,99 @@
+"""
+Compares ``verify_signatures_batch`` with verifying the signatures one by one.
+
+Usage (from the repository root):
+
+    python benchmarks/bench_batch_verification.py --items 200 --workers 4
+"""
+
+import argparse
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+
+from benchmarks.stub_rpc import StubWalletRPCServer  # noqa: E402
+from django_cryptolock.utils import (  # noqa: E402
+    verify_signature,
+    verify_signatures_batch,
+)
+from tests.helpers import (  # noqa: E402
+    EXAMPLE_LOGIN_URL,
+    VALID_BITCOIN_ADDRESS,
+    VALID_BITCOIN_SIG,
+    VALID_BITID_URI,
+    make_monero_account,
+    sign_monero_message,
+)
+
+
+def build_items(count, networks):
+    items = []
+    for i in range(count):
+        if networks[i % len(networks)] == "Bitcoin":
+            items.append(
+                ("Bitcoin", VALID_BITCOIN_ADDRESS, VALID_BITID_URI, VALID_BITCOIN_SIG)
+            )
+        else:
+            address, secret, _view_secret = make_monero_account()
+            challenge = f"challenge-{i}"
+            signature = sign_monero_message(address, secret, challenge)
+            items.append(("Monero", address, challenge, signature))
+    return items
+
+
+def run(label, items, workers):
+    request = RequestFactory().get(
+        "/", secure=True, HTTP_HOST="www.django-cryptolock.test"
+    )
+
+    start = perf_counter()
+    expected = [verify_signature(*item, request) for item in items]
+    sequential = perf_counter() - start
+
+    start = perf_counter()
+    results = verify_signatures_batch(
+        items, callback_uri=EXAMPLE_LOGIN_URL, max_workers=workers
+    )
+    batch = perf_counter() - start
+
+    assert results == expected, "Batch results differ from the sequential ones"
+    print(
+        f"{label:<12} {len(items):>6} items  "
+        f"sequential {len(items) / sequential:>9.1f}/s  "
+        f"batch {len(items) / batch:>9.1f}/s  "
+        f"speedup {sequential / batch:>5.2f}x"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    settings.ALLOWED_HOSTS = ["*"]
+    settings.DJCL_MONERO_VERIFICATION = "local"
+    run("bitcoin", build_items(args.items, ["Bitcoin"]), args.workers)
+    run("monero", build_items(args.items, ["Monero"]), args.workers)
+    run("mixed", build_items(args.items, ["Bitcoin", "Monero"]), args.workers)
+
+    # The stub wallet RPC answers immediately, so this measures the overhead
+    # of the requests themselves.
+    settings.DJCL_MONERO_VERIFICATION = "rpc"
+    with StubWalletRPCServer() as server:
+        settings.DJCL_MONERO_WALLET_RPC_HOST = server.host
+        run("monero-rpc", build_items(args.items, ["Monero"]), args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Runs the benchmarks against two git revisions and compares the results.
+
+Usage (from the repository root):
+
+    python -m benchmarks.compare master HEAD --iterations 200
+
+Each revision is checked out on a temporary git worktree. The benchmarks
+themselves always come from the current checkout.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_revision(revision, run_args, workdir):
+    checkout = os.path.join(workdir, "checkout")
+    output = os.path.join(workdir, "results.json")
+    subprocess.run(
+        ["git", "worktree", "add", "--detach", checkout, revision],
+        cwd=ROOT,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        print(f"# {revision}")
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.run", "--source", checkout]
+            + ["--json", output]
+            + run_args,
+            cwd=ROOT,
+            check=True,
+        )
+    finally:
+        subprocess.run(
+            ["git", "worktree", "remove", "--force", checkout], cwd=ROOT, check=True
+        )
+    with open(output) as results:
+        return json.load(results)
+
+
+def change(before, after):
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def print_comparison(base, head):
+    print(
+        f"{'scenario':<20} {'p50 ms':>17} {'change':>8} {'p95 ms':>17} "
+        f"{'change':>8} {'queries':>11}"
+    )
+    for name, after in head.items():
+        before = base.get(name)
+        if before is None or "error" in before or "error" in after:
+            print(f"{name:<20} {'n/a':>17}")
+            continue
+        print(
+            f"{name:<20} {before['p50']:>8.2f}>{after['p50']:<8.2f} "
+            f"{change(before['p50'], after['p50']):>8} "
+            f"{before['p95']:>8.2f}>{after['p95']:<8.2f} "
+            f"{change(before['p95'], after['p95']):>8} "
+            f"{before['queries']:>5.1f}>{after['queries']:<5.1f}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("base", help="Reference git revision.")
+    parser.add_argument("head", help="Git revision compared to the reference.")
+    args, run_args = parser.parse_known_args(argv)
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        base = run_revision(args.base, run_args, base_dir)
+    with tempfile.TemporaryDirectory() as head_dir:
+        head = run_revision(args.head, run_args, head_dir)
+
+    print()
+    print_comparison(base, head)
+
+
+if __name__ == "__main__":
+    main()
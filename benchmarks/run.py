@@ -0,0 +1,123 @@
+"""
+Measures the latency and the number of queries of the login and sign up paths.
+
+Usage (from the repository root):
+
+    python -m benchmarks.run --iterations 200 --json results.json
+
+Monero signatures are checked by a local stub wallet RPC server that accepts
+all of them, so no external service is needed.
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+from time import perf_counter
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def measure(scenario, iterations, warmup):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    scenario.setup()
+    timings = []
+    queries = []
+    for i in range(warmup + iterations):
+        state = scenario.prepare()
+        with CaptureQueriesContext(connection) as context:
+            start = perf_counter()
+            scenario.run(state)
+            elapsed = perf_counter() - start
+        if i >= warmup:
+            timings.append(elapsed * 1000)
+            queries.append(len(context.captured_queries))
+
+    return {
+        "iterations": iterations,
+        "p50": percentile(timings, 50),
+        "p95": percentile(timings, 95),
+        "p99": percentile(timings, 99),
+        "mean": sum(timings) / iterations,
+        "queries": sum(queries) / iterations,
+    }
+
+
+def print_results(results):
+    print(
+        f"{'scenario':<20} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+        f"{'mean ms':>9} {'queries':>8}"
+    )
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<20} failed ({result['error'][:60]})")
+            continue
+        print(
+            f"{name:<20} {result['p50']:>9.2f} {result['p95']:>9.2f} "
+            f"{result['p99']:>9.2f} {result['mean']:>9.2f} {result['queries']:>8.1f}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        help="Name of a scenario to run, can be repeated. Defaults to all.",
+    )
+    parser.add_argument("--json", help="Also write the results to this file.")
+    parser.add_argument(
+        "--source",
+        help="Checkout of django-cryptolock to benchmark, instead of this one.",
+    )
+    parser.add_argument("--settings", default="benchmarks.settings")
+    args = parser.parse_args(argv)
+
+    if args.source:
+        sys.path.insert(0, os.path.abspath(args.source))
+    os.environ["DJANGO_SETTINGS_MODULE"] = args.settings
+
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+
+    from .scenarios import SCENARIOS
+    from .stub_rpc import StubWalletRPCServer
+
+    scenarios = [s for s in SCENARIOS if not args.scenario or s.name in args.scenario]
+    old_name = settings.DATABASES["default"]["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    results = {}
+    try:
+        with StubWalletRPCServer() as server:
+            settings.DJCL_MONERO_WALLET_RPC_HOST = server.host
+            for scenario in scenarios:
+                try:
+                    result = measure(scenario(), args.iterations, args.warmup)
+                except Exception as e:
+                    # Older revisions might not support every scenario
+                    result = {"error": f"{e.__class__.__name__}: {e}"}
+                results[scenario.name] = result
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
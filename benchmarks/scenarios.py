@@ -0,0 +1,223 @@
+"""
+Operations measured by the benchmarks.
+
+Scenarios only rely on the public interface of the package, so they can also
+run against older revisions (see ``benchmarks.compare``).
+"""
+
+import os
+from binascii import hexlify
+from datetime import timedelta
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.test import Client, RequestFactory
+from django.utils import timezone
+
+from monero import base58
+from pybitid import bitid
+from rest_framework.test import APIClient
+
+from django_cryptolock.backends import BitcoinAddressBackend, MoneroAddressBackend
+from django_cryptolock.forms import SimpleLoginForm
+from django_cryptolock.models import Address, Challenge
+
+try:
+    from sha3 import keccak_256
+except ImportError:  # pragma: no cover
+    from Cryptodome.Hash import keccak
+
+    def keccak_256(data):
+        return keccak.new(data=data, digest_bits=256)
+
+
+HOST = "www.django-cryptolock.test"
+CALLBACK_URI = f"https://{HOST}/"
+BITCOIN_ADDRESS = "1N5attoW1FviYGnLmRu9xjaPMKTkWxtUCW"
+BITCOIN_CHALLENGE = "44d91949c7b2eb20"
+BITCOIN_SIGNATURE = "H5wI5uqhRCxBpyre2mYkjLxNKPi/TCj9IaHhmfnF8Wn1Pac6gsuYsd2GqTNpy/JFDv3HBSOD75pk2OsGDxE7U4o="
+
+
+def random_monero_address(netbyte=24):
+    """A well formed (stagenet by default) address, with random keys."""
+    data = bytes([netbyte]) + os.urandom(64)
+    checksum = keccak_256(data).digest()[:4]
+    return base58.encode(hexlify(data + checksum).decode())
+
+
+def make_user(address, network):
+    stored = Address.objects.filter(address=address).first()
+    if stored:
+        return stored.user
+    user = get_user_model().objects.create(username=uuid4().hex)
+    Address.objects.create(user=user, address=address, network=network)
+    return user
+
+
+def new_challenge(token=None):
+    """Returns a BitId URI for a new active challenge."""
+    if token is None:
+        token = Challenge.objects.generate().challenge
+    else:
+        Challenge.objects.filter(challenge=token).delete()
+        expires = timezone.now() + timedelta(minutes=10)
+        Challenge.objects.create(challenge=token, expires=expires)
+    return bitid.build_uri(CALLBACK_URI, token)
+
+
+def check(condition, message):
+    if not condition:
+        raise RuntimeError(message)
+
+
+class Scenario:
+    name = ""
+
+    def setup(self):
+        """Runs once, before any measurement."""
+        self.request = self.new_request()
+
+    def prepare(self):
+        """Runs before each iteration, without being measured."""
+        return None
+
+    def new_request(self):
+        """Requests must not be shared between iterations, since the package
+        can memoize lookups on them."""
+        return RequestFactory().get("/", secure=True, HTTP_HOST=HOST)
+
+    def run(self, state):
+        raise NotImplementedError
+
+
+class ChallengeGenerate(Scenario):
+    name = "challenge.generate"
+
+    def run(self, state):
+        Challenge.objects.generate()
+
+
+class LoginFormBitcoin(Scenario):
+    name = "login_form.bitcoin"
+
+    def setup(self):
+        super().setup()
+        make_user(BITCOIN_ADDRESS, Address.NETWORK_BITCOIN)
+
+    def prepare(self):
+        self.request = self.new_request()
+        return {
+            "challenge": new_challenge(BITCOIN_CHALLENGE),
+            "address": BITCOIN_ADDRESS,
+            "signature": BITCOIN_SIGNATURE,
+        }
+
+    def run(self, state):
+        form = SimpleLoginForm(self.request, state)
+        check(form.is_valid(), form.errors)
+
+
+class LoginFormMonero(Scenario):
+    name = "login_form.monero"
+
+    def setup(self):
+        super().setup()
+        self.address = random_monero_address()
+        make_user(self.address, Address.NETWORK_MONERO)
+
+    def prepare(self):
+        self.request = self.new_request()
+        return {
+            "challenge": new_challenge(),
+            "address": self.address,
+            "signature": "accepted-by-the-stub",
+        }
+
+    def run(self, state):
+        form = SimpleLoginForm(self.request, state)
+        check(form.is_valid(), form.errors)
+
+
+class BitcoinBackendAuthenticate(LoginFormBitcoin):
+    name = "backend.bitcoin"
+
+    def run(self, state):
+        user = BitcoinAddressBackend().authenticate(self.request, **state)
+        check(user is not None, "Authentication failed")
+
+
+class MoneroBackendAuthenticate(LoginFormMonero):
+    name = "backend.monero"
+
+    def run(self, state):
+        user = MoneroAddressBackend().authenticate(self.request, **state)
+        check(user is not None, "Authentication failed")
+
+
+class APITokenLogin(LoginFormMonero):
+    name = "api.token_login"
+
+    def setup(self):
+        super().setup()
+        self.client = APIClient()
+
+    def run(self, state):
+        response = self.client.post("/api/token_login", state)
+        check(response.status_code == 200, response.content)
+
+
+class APISignUp(Scenario):
+    name = "api.signup"
+
+    def setup(self):
+        super().setup()
+        self.client = APIClient()
+
+    def prepare(self):
+        return {
+            "challenge": new_challenge(),
+            "address": random_monero_address(),
+            "signature": "accepted-by-the-stub",
+            "username": uuid4().hex,
+        }
+
+    def run(self, state):
+        response = self.client.post("/api/signup", state)
+        check(response.status_code == 201, response.content)
+
+
+class LoginView(LoginFormMonero):
+    name = "view.login"
+
+    def setup(self):
+        super().setup()
+        self.client = Client()
+
+    def run(self, state):
+        response = self.client.post("/login", state)
+        check(response.status_code == 302, response.content)
+
+
+class SignUpView(APISignUp):
+    name = "view.signup"
+
+    def setup(self):
+        super().setup()
+        self.client = Client()
+
+    def run(self, state):
+        response = self.client.post("/signup", state)
+        check(response.status_code == 302, response.content)
+
+
+SCENARIOS = [
+    ChallengeGenerate,
+    LoginFormBitcoin,
+    LoginFormMonero,
+    BitcoinBackendAuthenticate,
+    MoneroBackendAuthenticate,
+    APITokenLogin,
+    APISignUp,
+    LoginView,
+    SignUpView,
+]
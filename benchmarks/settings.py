@@ -0,0 +1,61 @@
+"""
+Django settings used by the benchmarks.
+
+Use ``--settings`` to run them against another configuration, for example a
+PostgreSQL database.
+"""
+
+import os
+
+DEBUG = False
+USE_TZ = True
+SECRET_KEY = "benchmarks-only-secret-key"
+ALLOWED_HOSTS = ["*"]
+
+DATABASES = {"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}}
+
+ROOT_URLCONF = "benchmarks.urls"
+
+INSTALLED_APPS = [
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "django.contrib.sessions",
+    "django.contrib.sites",
+    "rest_framework.authtoken",
+    "django_cryptolock",
+]
+
+SITE_ID = 1
+
+MIDDLEWARE = [
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+]
+
+TEMPLATES = [
+    {
+        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "DIRS": [
+            os.path.join(os.path.dirname(os.path.dirname(__file__)), "tests/templates")
+        ],
+    }
+]
+
+AUTHENTICATION_BACKENDS = [
+    "django_cryptolock.backends.BitcoinAddressBackend",
+    "django_cryptolock.backends.MoneroAddressBackend",
+    "django.contrib.auth.backends.ModelBackend",
+]
+
+PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+LOGIN_REDIRECT_URL = "/"
+
+DJCL_MONERO_NETWORK = "stagenet"
+DJCL_BITCOIN_NETWORK = "mainnet"
+
+# The host is replaced by the address of the stub wallet RPC server
+DJCL_MONERO_WALLET_RPC_HOST = "localhost:3030"
+DJCL_MONERO_WALLET_RPC_USER = "bench"
+DJCL_MONERO_WALLET_RPC_PASS = "bench"
+DJCL_MONERO_WALLET_RPC_PROTOCOL = "http"
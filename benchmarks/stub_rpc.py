@@ -0,0 +1,74 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+class StubWalletRPCHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, avoid delayed ACK stalls
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length))
+        with server.lock:
+            server.requests.append(payload)
+            server.connections.add(self.client_address)
+        if server.delay:
+            time.sleep(server.delay)
+        result = server.responses.get(payload["method"], {})
+        if callable(result):
+            result = result(payload["params"])
+        if isinstance(result, dict) and "error" in result:
+            response = {"jsonrpc": "2.0", "id": payload["id"], "error": result["error"]}
+        else:
+            response = {"jsonrpc": "2.0", "id": payload["id"], "result": result}
+        body = json.dumps(response)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubWalletRPCServer(ThreadingMixIn, HTTPServer):
+    """Minimal JSON-RPC server that mimics the wallet RPC ``verify`` method.
+
+    Accepts every signature by default, which isolates the cost of the package
+    itself from the cost of the wallet. Shared by the benchmarks and the tests.
+
+    Keeps track of the received requests and of the client connections used.
+    Each response is sent after ``delay`` seconds. Responses can be callables,
+    that receive the params and may return an ``{"error": ...}`` instead.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, responses=None, delay=0):
+        super().__init__(("127.0.0.1", 0), StubWalletRPCHandler)
+        self.responses = responses or {"verify": {"good": True}}
+        self.delay = delay
+        self.requests = []
+        self.connections = set()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(
+            target=self.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+        )
+
+    @property
+    def host(self):
+        return f"{self.server_address[0]}:{self.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
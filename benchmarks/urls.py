@@ -0,0 +1,13 @@
+from django.conf.urls import include
+from django.urls import path
+
+from django_cryptolock.api_views import (
+    CryptoLockAPITokenLoginView,
+    CryptoLockAPISignUpView,
+)
+
+urlpatterns = [
+    path("api/token_login", CryptoLockAPITokenLoginView.as_view()),
+    path("api/signup", CryptoLockAPISignUpView.as_view()),
+    path("", include("django_cryptolock.urls", namespace="django_cryptolock")),
+]
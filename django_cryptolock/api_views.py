@@ -4,42 +4,47 @@ from rest_framework.status import HTTP_200_OK
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.authtoken.models import Token
 
 from monerorpc.authproxy import JSONRPCException
 
-from .models import Address, Challenge
+from .models import Challenge
 from .forms import SimpleSignUpForm, SimpleLoginForm
 from .utils import verify_signature
-from .mixins import CreateUserMixin, CreateChallengeMixin
+from .mixins import APIRateLimitMixin, CreateUserMixin, CreateChallengeMixin
+from .tokens import issue_token
 
 
-class CryptoLockAPITokenLoginView(CreateChallengeMixin, APIView):
+class CryptoLockAPITokenLoginView(APIRateLimitMixin, CreateChallengeMixin, APIView):
     """Endpoint to login the user with cryptocurrency wallet address.
 
-    Using the default token backend.
+    Using the default token backend, or signed tokens depending on the
+    ``DJCL_TOKEN_ISSUANCE`` setting.
     """
 
     http_method_names = ["get", "post"]
+    rate_limit_scope = "login"
 
     def post(self, request, format=None):
         """Authenticates the user using the provided signature."""
         form = SimpleLoginForm(request, request.data)
         if not form.is_valid():
+            if form.rpc_unavailable():
+                return Response(form.errors, status=status.HTTP_503_SERVICE_UNAVAILABLE)
             return Response(form.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        challenge = form.cleaned_data["challenge"]
-        Challenge.objects.invalidate(challenge)
-        Challenge.objects.clean_expired()
+        Challenge.objects.maybe_clean_expired()
 
-        token = Token.objects.create(user=form.user_cache)
-        return Response({"token": token.key}, status=HTTP_200_OK)
+        token = issue_token(form.user_cache)
+        return Response({"token": token}, status=HTTP_200_OK)
 
 
-class CryptoLockAPISignUpView(CreateUserMixin, CreateChallengeMixin, APIView):
+class CryptoLockAPISignUpView(
+    APIRateLimitMixin, CreateUserMixin, CreateChallengeMixin, APIView
+):
     """Endpoint to create a new user using cryptocurrency wallet address."""
 
     http_method_names = ["get", "post"]
+    rate_limit_scope = "signup"
 
     def post(self, request, format=None):
         """Verifies the signature and creates a new user account."""
@@ -49,14 +54,9 @@ class CryptoLockAPISignUpView(CreateUserMixin, CreateChallengeMixin, APIView):
 
         username = form.cleaned_data["username"]
         address = form.cleaned_data["address"]
-        challenge = form.cleaned_data["challenge"]
-        signature = form.cleaned_data["signature"]
-        network = [n[1] for n in Address.NETWORKS if n[0] == form.network][0]
 
         try:
-            valid_sig = verify_signature(
-                network, address, challenge, signature, self.request
-            )
+            valid_sig = verify_signature(*self.get_verification_args(form))
         except JSONRPCException:
             return Response(
                 {"__all__": [_("Error connecting to Monero daemon")]},
@@ -64,7 +64,14 @@ class CryptoLockAPISignUpView(CreateUserMixin, CreateChallengeMixin, APIView):
             )
 
         if valid_sig:
-            self.create_user(username, challenge, address, form.network)
+            user = self.create_user(
+                username, form.challenge_token, address, form.network
+            )
+            if user is None:
+                return Response(
+                    {"challenge": [_("Invalid or outdated challenge")]},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
             return Response({}, status=status.HTTP_201_CREATED)
         else:
             return Response(
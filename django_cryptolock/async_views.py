@@ -0,0 +1,174 @@
+from django.contrib.auth.views import LoginView
+from django.http import HttpResponseRedirect, JsonResponse
+from django.utils.cache import add_never_cache_headers
+from django.utils.decorators import method_decorator
+from django.utils.translation import gettext_lazy as _
+from django.views.decorators.csrf import csrf_exempt
+from django.views.generic import View
+
+from monerorpc.authproxy import JSONRPCException
+
+from .forms import SimpleSignUpForm, SimpleLoginForm
+from .mixins import (
+    APIRateLimitMixin,
+    AsyncViewMixin,
+    CreateUserMixin,
+    CreateChallengeMixin,
+)
+from .ratelimit import check_rate_limits
+from .models import Challenge
+from .tokens import issue_token
+from .utils import averify_signature, get_request_data
+from .views import CryptoLockLoginView, CryptoLockSignUpView
+
+
+class AsyncCryptoLockLoginView(AsyncViewMixin, CryptoLockLoginView):
+    """Async version of ``CryptoLockLoginView``, requires Django 3.1+.
+
+    CSRF protection is left to ``CsrfViewMiddleware``, since the decorators
+    used by ``LoginView`` do not support async views.
+    """
+
+    http_method_names = ["get", "post"]
+
+    async def dispatch(self, request, *args, **kwargs):
+        from asgiref.sync import sync_to_async
+
+        retry_after = await sync_to_async(check_rate_limits)(
+            request, self.rate_limit_scope
+        )
+        if retry_after is not None:
+            return self.rate_limited(retry_after)
+
+        request.sensitive_post_parameters = "__ALL__"
+        if self.redirect_authenticated_user:
+            is_authenticated = await sync_to_async(
+                lambda: request.user.is_authenticated
+            )()
+            if is_authenticated:
+                return HttpResponseRedirect(self.get_success_url())
+
+        response = await super(LoginView, self).dispatch(request, *args, **kwargs)
+        add_never_cache_headers(response)
+        return response
+
+    async def get(self, request, *args, **kwargs):
+        from asgiref.sync import sync_to_async
+
+        return await sync_to_async(super().get)(request, *args, **kwargs)
+
+    async def post(self, request, *args, **kwargs):
+        from asgiref.sync import sync_to_async
+
+        form = await sync_to_async(self.get_form)()
+        if await form.ais_valid():
+            return await sync_to_async(self.form_valid)(form)
+        return await sync_to_async(self.form_invalid)(form)
+
+
+class AsyncCryptoLockSignUpView(AsyncViewMixin, CryptoLockSignUpView):
+    """Async version of ``CryptoLockSignUpView``, requires Django 3.1+."""
+
+    http_method_names = ["get", "post"]
+
+    async def get(self, request, *args, **kwargs):
+        from asgiref.sync import sync_to_async
+
+        return await sync_to_async(super().get)(request, *args, **kwargs)
+
+    async def post(self, request, *args, **kwargs):
+        from asgiref.sync import sync_to_async
+
+        form = await sync_to_async(self.get_form)()
+        if not await sync_to_async(form.is_valid)():
+            return await sync_to_async(self.form_invalid)(form)
+
+        try:
+            valid_sig = await averify_signature(*self.get_verification_args(form))
+        except JSONRPCException:
+            return await sync_to_async(self.handle_rpc_error)(form)
+
+        return await sync_to_async(self.handle_verification)(form, valid_sig)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncCryptoLockAPITokenLoginView(
+    AsyncViewMixin, APIRateLimitMixin, CreateChallengeMixin, View
+):
+    """Async version of ``CryptoLockAPITokenLoginView``, requires Django 3.1+.
+
+    Django REST Framework does not support async views, so this is a plain
+    Django view accepting JSON or form data and returning the same payloads.
+    """
+
+    http_method_names = ["get", "post"]
+    rate_limit_scope = "login"
+
+    async def get(self, request, *args, **kwargs):
+        """Returns a new challenge for the login."""
+        from asgiref.sync import sync_to_async
+
+        data = await sync_to_async(self.get_challenge_data)(request)
+        return JsonResponse(data)
+
+    async def post(self, request, *args, **kwargs):
+        """Authenticates the user using the provided signature."""
+        from asgiref.sync import sync_to_async
+
+        form = await sync_to_async(SimpleLoginForm)(request, get_request_data(request))
+        if not await form.ais_valid():
+            return JsonResponse(
+                form.errors, status=503 if form.rpc_unavailable() else 400
+            )
+
+        await sync_to_async(Challenge.objects.maybe_clean_expired)()
+
+        token = await sync_to_async(issue_token)(form.user_cache)
+        return JsonResponse({"token": token})
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncCryptoLockAPISignUpView(
+    AsyncViewMixin, APIRateLimitMixin, CreateUserMixin, CreateChallengeMixin, View
+):
+    """Async version of ``CryptoLockAPISignUpView``, requires Django 3.1+."""
+
+    http_method_names = ["get", "post"]
+    rate_limit_scope = "signup"
+
+    async def get(self, request, *args, **kwargs):
+        """Returns a new challenge for the sign up."""
+        from asgiref.sync import sync_to_async
+
+        data = await sync_to_async(self.get_challenge_data)(request)
+        return JsonResponse(data)
+
+    async def post(self, request, *args, **kwargs):
+        """Verifies the signature and creates a new user account."""
+        from asgiref.sync import sync_to_async
+
+        form = await sync_to_async(SimpleSignUpForm)(request, get_request_data(request))
+        if not await sync_to_async(form.is_valid)():
+            return JsonResponse(form.errors, status=400)
+
+        try:
+            valid_sig = await averify_signature(*self.get_verification_args(form))
+        except JSONRPCException:
+            return JsonResponse(
+                {"__all__": [_("Error connecting to Monero daemon")]}, status=503
+            )
+
+        if not valid_sig:
+            return JsonResponse({"signature": [_("Invalid signature")]}, status=400)
+
+        user = await sync_to_async(self.create_user)(
+            form.cleaned_data["username"],
+            form.challenge_token,
+            form.cleaned_data["address"],
+            form.network,
+        )
+        if user is None:
+            return JsonResponse(
+                {"challenge": [_("Invalid or outdated challenge")]}, status=400
+            )
+        return JsonResponse({}, status=201)
@@ -1,33 +1,73 @@
+import inspect
+
+from django.contrib.auth import load_backend
 from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.signals import user_login_failed
 from django.core.exceptions import PermissionDenied
+from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
 from monerorpc.authproxy import JSONRPCException
 
+from .metrics import AUTHENTICATIONS, FAILURE, RPC_ERROR, SUCCESS, increment
 from .models import Address
-from .utils import verify_monero_signature, verify_bitcoin_signature
+from .validators import is_bitcoin_address_format, is_monero_address_format
+from .utils import (
+    verify_monero_signature,
+    verify_bitcoin_signature,
+    averify_monero_signature,
+    averify_bitcoin_signature,
+)
+
+
+class AddressBackend(ModelBackend):
+    """Base class for the backends that authenticate users by their address."""
+
+    network = None
+
+    def get_stored_address(self, address, request=None):
+        """Returns the address of this backend's network, or None.
 
+        The lookup is shared with the other backends and the forms handling
+        the same request.
+        """
+        stored_address = Address.objects.lookup(address, request)
+        if stored_address is None or stored_address.network != self.network:
+            return None
+        return stored_address
+
+    async def aget_stored_address(self, address, request=None):
+        from asgiref.sync import sync_to_async
 
-class MoneroAddressBackend(ModelBackend):
+        return await sync_to_async(self.get_stored_address)(address, request)
+
+    def count_authentication(self, outcome):
+        increment(
+            AUTHENTICATIONS,
+            network=dict(Address.NETWORKS)[self.network].lower(),
+            backend=self.__class__.__name__,
+            outcome=outcome,
+        )
+
+
+class MoneroAddressBackend(AddressBackend):
     """Custom Monero-Cryptolock authentication backend."""
 
+    network = Address.NETWORK_MONERO
+
     def authenticate(
         self, request, address=None, challenge=None, signature=None, **kwargs
     ):
         """Validates the provided signature for the given address and challenge.
 
-        This method currently relies on Wallet RPC access to verify the signature,
-        in the future it should be done locally to be more reliable and more
-        performant.
+        By default this method relies on Wallet RPC access to verify the
+        signature, set ``DJCL_MONERO_VERIFICATION = "local"`` to verify it
+        in-process instead.
         """
         if not all([address, challenge, signature]):
             return None
 
-        stored_address = (
-            Address.objects.select_related("user")
-            .filter(address=address, network=Address.NETWORK_MONERO)
-            .first()
-        )
+        stored_address = self.get_stored_address(address, request)
         if not stored_address:
             return None
         try:
@@ -35,17 +75,47 @@ class MoneroAddressBackend(ModelBackend):
                 stored_address.address, challenge, signature
             )
         except JSONRPCException:
+            self.count_authentication(RPC_ERROR)
+            raise PermissionDenied(_("Error while validating signature"))
+
+        if is_valid:
+            self.count_authentication(SUCCESS)
+            return stored_address.user
+
+        self.count_authentication(FAILURE)
+        return None
+
+    async def aauthenticate(
+        self, request, address=None, challenge=None, signature=None, **kwargs
+    ):
+        """Async version of ``authenticate``, without blocking on wallet RPC."""
+        if not all([address, challenge, signature]):
+            return None
+
+        stored_address = await self.aget_stored_address(address, request)
+        if not stored_address:
+            return None
+        try:
+            is_valid = await averify_monero_signature(
+                stored_address.address, challenge, signature
+            )
+        except JSONRPCException:
+            self.count_authentication(RPC_ERROR)
             raise PermissionDenied(_("Error while validating signature"))
 
         if is_valid:
+            self.count_authentication(SUCCESS)
             return stored_address.user
 
+        self.count_authentication(FAILURE)
         return None
 
 
-class BitcoinAddressBackend(ModelBackend):
+class BitcoinAddressBackend(AddressBackend):
     """Custom Bitcoin-BitId authentication backend."""
 
+    network = Address.NETWORK_BITCOIN
+
     def authenticate(
         self, request, address=None, challenge=None, signature=None, **kwargs
     ):
@@ -57,11 +127,7 @@ class BitcoinAddressBackend(ModelBackend):
         if not all([address, challenge, signature]):
             return None
 
-        stored_address = (
-            Address.objects.select_related("user")
-            .filter(address=address, network=Address.NETWORK_BITCOIN)
-            .first()
-        )
+        stored_address = self.get_stored_address(address, request)
         if not stored_address:
             return None
 
@@ -70,6 +136,117 @@ class BitcoinAddressBackend(ModelBackend):
         )
 
         if valid_signature:
+            self.count_authentication(SUCCESS)
+            return stored_address.user
+        else:
+            self.count_authentication(FAILURE)
+            return None
+
+    async def aauthenticate(
+        self, request, address=None, challenge=None, signature=None, **kwargs
+    ):
+        """Async version of ``authenticate``."""
+        if not all([address, challenge, signature]):
+            return None
+
+        stored_address = await self.aget_stored_address(address, request)
+        if not stored_address:
+            return None
+
+        valid_signature = await averify_bitcoin_signature(
+            stored_address.address, challenge, signature, request
+        )
+
+        if valid_signature:
+            self.count_authentication(SUCCESS)
             return stored_address.user
         else:
+            self.count_authentication(FAILURE)
+            return None
+
+
+class CryptoLockDispatchBackend(AddressBackend):
+    """Authenticates Monero and Bitcoin addresses with a single backend.
+
+    Replaces ``MoneroAddressBackend`` and ``BitcoinAddressBackend`` on
+    multi-network deployments. The network is picked from the format of the
+    address, so only the matching verification runs, and once an address is
+    handled the remaining backends (such as ``ModelBackend``) are skipped.
+    """
+
+    def get_network_backend(self, address):
+        """Returns the backend for the network of the address, or None."""
+        if is_monero_address_format(address):
+            return MoneroAddressBackend()
+        if is_bitcoin_address_format(address):
+            return BitcoinAddressBackend()
+        return None
+
+    def authenticate(
+        self, request, address=None, challenge=None, signature=None, **kwargs
+    ):
+        if not all([address, challenge, signature]):
+            return None
+
+        backend = self.get_network_backend(address)
+        if backend is None:
             return None
+        user = backend.authenticate(request, address, challenge, signature)
+        if user is None:
+            # No other backend can authenticate this address
+            raise PermissionDenied(_("Invalid address or signature"))
+        return user
+
+    async def aauthenticate(
+        self, request, address=None, challenge=None, signature=None, **kwargs
+    ):
+        """Async version of ``authenticate``."""
+        if not all([address, challenge, signature]):
+            return None
+
+        backend = self.get_network_backend(address)
+        if backend is None:
+            return None
+        user = await backend.aauthenticate(request, address, challenge, signature)
+        if user is None:
+            raise PermissionDenied(_("Invalid address or signature"))
+        return user
+
+
+async def aauthenticate(request=None, **credentials):
+    """Async version of ``django.contrib.auth.authenticate``.
+
+    Backends implementing ``aauthenticate`` are awaited, the remaining ones
+    run on a thread.
+    """
+    from asgiref.sync import sync_to_async
+    from django.contrib.auth import _clean_credentials
+
+    for backend_path in settings.AUTHENTICATION_BACKENDS:
+        backend = load_backend(backend_path)
+        try:
+            inspect.signature(backend.authenticate).bind(request, **credentials)
+        except TypeError:
+            # This backend doesn't accept these credentials as arguments.
+            continue
+        try:
+            if hasattr(backend, "aauthenticate"):
+                user = await backend.aauthenticate(request, **credentials)
+            else:
+                authenticate = sync_to_async(backend.authenticate)
+                user = await authenticate(request, **credentials)
+        except PermissionDenied:
+            # This backend says to stop in our tracks - this user should not
+            # be allowed in at all.
+            break
+        if user is None:
+            continue
+        # Annotate the user object with the path of the backend.
+        user.backend = backend_path
+        return user
+
+    # The credentials supplied are invalid to all backends, fire signal
+    send = sync_to_async(user_login_failed.send)
+    await send(
+        sender=__name__, credentials=_clean_credentials(credentials), request=request
+    )
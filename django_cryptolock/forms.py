@@ -3,15 +3,35 @@ from urllib.parse import urlparse, parse_qs
 from django import forms
 from django.contrib.auth import authenticate
 from django.contrib.auth import get_user_model
-from django.core.exceptions import ValidationError
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.utils.functional import SimpleLazyObject
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 
 from pybitid import bitid
 
+from .backends import aauthenticate
 from .models import Address, Challenge
-from .validators import validate_monero_address, validate_bitcoin_address
-from .utils import generate_challenge
+from .validators import (
+    validate_monero_address,
+    validate_bitcoin_address,
+    is_bitcoin_address_format,
+    is_monero_address_format,
+)
+from .utils import generate_challenge, is_monero_verification_available
+
+
+def _get_enabled_networks():
+    """Returns if the configured backends accept Bitcoin and Monero addresses."""
+    bitcoin_backend = "django_cryptolock.backends.BitcoinAddressBackend"
+    monero_backend = "django_cryptolock.backends.MoneroAddressBackend"
+    dispatch_backend = "django_cryptolock.backends.CryptoLockDispatchBackend"
+
+    backends = settings.AUTHENTICATION_BACKENDS
+    dispatch = dispatch_backend in backends
+    use_bitcoin = dispatch or bitcoin_backend in backends
+    use_monero = dispatch or monero_backend in backends
+    return use_bitcoin, use_monero
 
 
 class ChallengeMixin(forms.Form):
@@ -22,14 +42,22 @@ class ChallengeMixin(forms.Form):
     """
 
     challenge = forms.CharField()
+    challenge_token = None
 
     def include_challenge(self):
-        """Created a new challenge only when no data is provided by user."""
+        """Includes a new challenge only when no data is provided by user.
+
+        The challenge is lazy: it is only created when the field is rendered
+        or its initial value is read, so forms that are never displayed do
+        not cost a new challenge.
+        """
         if not self.data:
-            new_challenge = bitid.build_uri(
-                self.request.build_absolute_uri(), Challenge.objects.generate()
-            )
-            self.initial["challenge"] = new_challenge
+            self.initial["challenge"] = SimpleLazyObject(self.build_challenge)
+
+    def build_challenge(self):
+        return bitid.build_uri(
+            self.request.build_absolute_uri(), Challenge.objects.checkout()
+        )
 
     def clean_challenge(self):
         challenge = self.cleaned_data.get("challenge")
@@ -42,8 +70,16 @@ class ChallengeMixin(forms.Form):
         if not token or not Challenge.objects.is_active(token):
             raise forms.ValidationError(_("Invalid or outdated challenge"))
 
+        self.challenge_token = token
         return challenge
 
+    def consume_challenge(self):
+        """Uses the challenge, so it cannot be redeemed by another request.
+
+        Returns False if the challenge was used or expired in the meantime.
+        """
+        return Challenge.objects.consume(self.challenge_token)
+
 
 class SimpleLoginForm(ChallengeMixin, forms.Form):
     """Basic login form, that can be used as reference for implementation."""
@@ -54,6 +90,7 @@ class SimpleLoginForm(ChallengeMixin, forms.Form):
     error_messages = {
         "invalid_login": _("Please enter a correct address or signature."),
         "inactive": _("This account is inactive."),
+        "rpc_unavailable": _("Error connecting to Monero daemon"),
     }
 
     def __init__(self, request=None, *args, **kwargs):
@@ -64,22 +101,73 @@ class SimpleLoginForm(ChallengeMixin, forms.Form):
         self.user_cache = None
         self.include_challenge()
 
-    def clean(self):
+    # Set by ``ais_valid`` so the signature is verified outside of ``clean``
+    defer_authentication = False
+
+    def get_credentials(self):
         address = self.cleaned_data.get("address")
         challenge = self.cleaned_data.get("challenge")
         signature = self.cleaned_data.get("signature")
-
         if address and challenge and signature:
-            self.user_cache = authenticate(
-                self.request, address=address, challenge=challenge, signature=signature
-            )
-            if self.user_cache is None:
-                raise self.get_invalid_login_error()
-            else:
-                self.confirm_login_allowed(self.user_cache)
+            return {"address": address, "challenge": challenge, "signature": signature}
+        return None
+
+    def clean(self):
+        credentials = self.get_credentials()
+        if credentials:
+            self.check_verification_available(credentials["address"])
+        if credentials and not self.defer_authentication:
+            self.user_cache = authenticate(self.request, **credentials)
+            self.confirm_authentication()
 
         return self.cleaned_data
 
+    def check_verification_available(self, address):
+        """Fails fast, instead of waiting for a wallet RPC that is down."""
+        _use_bitcoin, use_monero = _get_enabled_networks()
+        if not use_monero or not is_monero_address_format(address):
+            return
+        if not is_monero_verification_available():
+            raise forms.ValidationError(
+                self.error_messages["rpc_unavailable"], code="rpc_unavailable"
+            )
+
+    def rpc_unavailable(self):
+        """True if the form failed because signatures could not be verified."""
+        return self.has_error(NON_FIELD_ERRORS, code="rpc_unavailable")
+
+    def confirm_authentication(self):
+        """Checks the authenticated user and consumes the challenge."""
+        if self.user_cache is None:
+            raise self.get_invalid_login_error()
+        else:
+            self.confirm_login_allowed(self.user_cache)
+
+        if not self.consume_challenge():
+            self.user_cache = None
+            raise forms.ValidationError(_("Invalid or outdated challenge"))
+
+    async def ais_valid(self):
+        """Async version of ``is_valid``.
+
+        The signature is verified by the backends' ``aauthenticate``, so a slow
+        wallet RPC does not block the event loop.
+        """
+        from asgiref.sync import sync_to_async
+
+        self.defer_authentication = True
+        if not await sync_to_async(self.is_valid)():
+            return False
+
+        self.user_cache = await aauthenticate(self.request, **self.get_credentials())
+        try:
+            await sync_to_async(self.confirm_authentication)()
+        except forms.ValidationError as e:
+            self.add_error(None, e)
+            return False
+
+        return True
+
     def confirm_login_allowed(self, user):
         if not user.is_active:
             raise forms.ValidationError(
@@ -113,17 +201,17 @@ class SimpleSignUpForm(ChallengeMixin, forms.Form):
     def clean_address(self):
         self.network = None
         value = self.cleaned_data["address"]
-        bitcoin_backend = "django_cryptolock.backends.BitcoinAddressBackend"
-        monero_backend = "django_cryptolock.backends.MoneroAddressBackend"
 
-        if bitcoin_backend in settings.AUTHENTICATION_BACKENDS:
+        # The address formats do not overlap, so at most one network needs
+        # the full validation.
+        use_bitcoin, use_monero = _get_enabled_networks()
+        if use_bitcoin and is_bitcoin_address_format(value):
             try:
                 validate_bitcoin_address(value)
                 self.network = Address.NETWORK_BITCOIN
             except ValidationError:
                 pass
-
-        if monero_backend in settings.AUTHENTICATION_BACKENDS:
+        elif use_monero and is_monero_address_format(value):
             try:
                 validate_monero_address(value)
                 self.network = Address.NETWORK_MONERO
@@ -133,7 +221,7 @@ class SimpleSignUpForm(ChallengeMixin, forms.Form):
         if not self.network:
             raise forms.ValidationError(_("Invalid address"))
 
-        if Address.objects.filter(address=value).exists():
+        if Address.objects.lookup(value, self.request) is not None:
             raise forms.ValidationError(_("This address already exists"))
 
         return value
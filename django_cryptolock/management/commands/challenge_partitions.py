@@ -0,0 +1,33 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from django_cryptolock.models import Challenge
+from django_cryptolock.stores import PartitionedChallengeStore
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates the upcoming partitions of PartitionedChallengeStore and drops "
+        "the ones whose challenges have all expired."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--windows",
+            type=int,
+            default=2,
+            help="Number of partitions created ahead, after the ones needed by "
+            "the challenges issued now.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            store = PartitionedChallengeStore(Challenge.objects)
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+
+        created, errors = store.create_partitions(windows=options["windows"])
+        for name, error in errors:
+            self.stderr.write(f"Could not create {name}: {error}")
+        dropped, _rows = store.drop_expired_partitions()
+        self.stdout.write(f"Created {created} partitions, dropped {dropped}")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from django_cryptolock.models import Challenge
+from django_cryptolock.stores import CompactChallengeStore
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies the active challenges to the CompactChallenge table, before "
+        "switching to CompactChallengeStore."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Maximum number of challenges inserted by each query.",
+        )
+        parser.add_argument(
+            "--delete",
+            action="store_true",
+            help="Empty the Challenge table after copying the active ones.",
+        )
+
+    def handle(self, *args, **options):
+        store = CompactChallengeStore(Challenge.objects)
+        copied = store.copy_from_database(batch_size=options["batch_size"])
+        self.stdout.write(f"Copied {copied} challenges")
+        if options["delete"]:
+            deleted = Challenge.objects.all().delete()[0]
+            self.stdout.write(f"Removed {deleted} challenges")
@@ -0,0 +1,60 @@
+from time import monotonic, sleep
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from django_cryptolock.models import Challenge
+
+
+class Command(BaseCommand):
+    help = "Adds pre-generated challenges to the pool, ahead of demand."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size",
+            type=int,
+            default=None,
+            help="Number of challenges kept on the pool. Defaults to "
+            "DJCL_CHALLENGE_POOL_SIZE.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Maximum number of challenges inserted by each query.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=None,
+            help="Keep refilling the pool, every this number of seconds.",
+        )
+        parser.add_argument(
+            "--max-runtime",
+            type=float,
+            default=None,
+            help="Stop refilling after this number of seconds.",
+        )
+
+    def handle(self, *args, **options):
+        size = options["size"]
+        if size is None:
+            size = getattr(settings, "DJCL_CHALLENGE_POOL_SIZE", 0)
+        if size <= 0:
+            raise CommandError(
+                "Set the pool size with --size or DJCL_CHALLENGE_POOL_SIZE"
+            )
+        interval = options["interval"]
+        max_runtime = options["max_runtime"]
+        start = monotonic()
+        total = 0
+
+        while True:
+            total += Challenge.objects.fill_pool(size, options["batch_size"])
+            if interval is None:
+                break
+            if max_runtime is not None and monotonic() - start >= max_runtime:
+                break
+            sleep(interval)
+
+        self.stdout.write(f"Added {total} challenges to the pool")
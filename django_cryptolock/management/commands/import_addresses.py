@@ -0,0 +1,220 @@
+import csv
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from time import monotonic
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from django_cryptolock.models import Address
+from django_cryptolock.validators import (
+    _bitcoin_address_error,
+    _monero_address_error,
+    is_bitcoin_address_format,
+    is_monero_address_format,
+)
+
+NETWORKS = {
+    "monero": Address.NETWORK_MONERO,
+    "bitcoin": Address.NETWORK_BITCOIN,
+    str(Address.NETWORK_MONERO): Address.NETWORK_MONERO,
+    str(Address.NETWORK_BITCOIN): Address.NETWORK_BITCOIN,
+}
+
+
+def validate_address(item):
+    """Returns the error of a ``(address, network, settings_network)`` item,
+    or None. Runs on the worker processes."""
+    address, network, settings_network = item
+    if network == Address.NETWORK_MONERO:
+        return _monero_address_error(address, settings_network)
+    return _bitcoin_address_error(address, settings_network)
+
+
+def read_csv(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_jsonl(stream):
+    for line_num, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_num, row if isinstance(row, dict) else None
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports addresses of existing users from a CSV or JSON Lines file, "
+        "with 'user', 'address' and (optionally) 'network' columns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, '-' reads from stdin.")
+        parser.add_argument(
+            "--format",
+            choices=("csv", "jsonl"),
+            default=None,
+            help="Format of the file. By default guessed from its extension.",
+        )
+        parser.add_argument(
+            "--user-field",
+            default=None,
+            help="User field matched by the 'user' column. Defaults to the "
+            "USERNAME_FIELD of the user model.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rows validated and inserted at once.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Processes used to validate the addresses. Defaults to the "
+            "number of CPUs, 1 validates them in this process.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"]
+        if file_format is None:
+            file_format = "jsonl" if path.endswith((".jsonl", ".json")) else "csv"
+        user_model = get_user_model()
+        self.user_field = options["user_field"] or user_model.USERNAME_FIELD
+        self.imported = 0
+        self.rejected = 0
+        batch_size = options["batch_size"]
+        workers = options["workers"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        stream = sys.stdin if path == "-" else open(path, newline="")
+        executor = None
+        if workers != 1:
+            executor = ProcessPoolExecutor(max_workers=workers)
+        start = monotonic()
+        try:
+            reader = read_jsonl if file_format == "jsonl" else read_csv
+            rows = reader(stream)
+            while True:
+                chunk = list(islice(rows, batch_size))
+                if not chunk:
+                    break
+                self.import_chunk(chunk, executor)
+                if options["verbosity"] >= 2:
+                    self.stdout.write(
+                        f"{self.imported} imported, {self.rejected} rejected"
+                    )
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = monotonic() - start
+        rate = (self.imported + self.rejected) / elapsed if elapsed else 0
+        self.stdout.write(
+            f"Imported {self.imported} addresses, rejected {self.rejected} rows "
+            f"in {elapsed:.2f}s ({rate:.0f} rows/s)"
+        )
+
+    def reject(self, line_num, reason):
+        self.rejected += 1
+        self.stderr.write(f"Line {line_num}: {reason}")
+
+    def parse_row(self, line_num, row):
+        """Returns the ``(line, user, address, network)`` of a row, or None."""
+        if row is None:
+            self.reject(line_num, "Malformed row")
+            return None
+        user = str(row.get("user") or "").strip()
+        address = str(row.get("address") or "").strip()
+        if not user or not address:
+            self.reject(line_num, "Missing user or address")
+            return None
+
+        network = str(row.get("network") or "").strip().lower()
+        if network:
+            network = NETWORKS.get(network)
+        elif is_monero_address_format(address):
+            network = Address.NETWORK_MONERO
+        elif is_bitcoin_address_format(address):
+            network = Address.NETWORK_BITCOIN
+        if not network:
+            self.reject(line_num, f"Unknown network for {address}")
+            return None
+        return line_num, user, address, network
+
+    def validate(self, rows, executor):
+        """Returns the validation error of each row, or None."""
+        settings_networks = {
+            Address.NETWORK_MONERO: getattr(settings, "DJCL_MONERO_NETWORK", None),
+            Address.NETWORK_BITCOIN: getattr(settings, "DJCL_BITCOIN_NETWORK", None),
+        }
+        items = [
+            (address, network, settings_networks[network])
+            for _line, _user, address, network in rows
+        ]
+        if executor is None or len(items) < 2:
+            return [validate_address(item) for item in items]
+        chunksize = max(1, len(items) // 32)
+        return list(executor.map(validate_address, items, chunksize=chunksize))
+
+    def import_chunk(self, chunk, executor):
+        rows = [self.parse_row(*entry) for entry in chunk]
+        rows = [row for row in rows if row is not None]
+
+        valid = []
+        for row, error in zip(rows, self.validate(rows, executor)):
+            if error is None:
+                valid.append(row)
+                continue
+            message, params = error
+            self.reject(row[0], message % params if params else message)
+
+        users = get_user_model().objects.filter(
+            **{f"{self.user_field}__in": {row[1] for row in valid}}
+        )
+        user_ids = {
+            str(getattr(user, self.user_field)): user.pk
+            for user in users.only("pk", self.user_field)
+        }
+        existing = Address.objects.filter(address__in=[row[2] for row in valid])
+        existing = set(existing.values_list("address", flat=True))
+
+        addresses = {}
+        for line_num, user, address, network in valid:
+            if user not in user_ids:
+                self.reject(line_num, f"Unknown user {user}")
+            elif address in existing:
+                self.reject(line_num, f"Address {address} already exists")
+            else:
+                existing.add(address)
+                addresses[line_num] = Address(
+                    user_id=user_ids[user], address=address, network=network
+                )
+
+        # Conflicts with addresses created meanwhile are skipped, so check
+        # which rows were actually inserted
+        Address.objects.bulk_create(addresses.values(), ignore_conflicts=True)
+        inserted = set(
+            Address.objects.filter(
+                address__in=[a.address for a in addresses.values()]
+            ).values_list("address", "user_id", "network")
+        )
+        for line_num, address in addresses.items():
+            if (address.address, address.user_id, address.network) in inserted:
+                self.imported += 1
+            else:
+                self.reject(line_num, f"Address {address.address} already exists")
@@ -0,0 +1,48 @@
+from time import monotonic, sleep
+
+from django.core.management.base import BaseCommand
+
+from django_cryptolock.models import Challenge
+
+
+class Command(BaseCommand):
+    help = "Removes expired challenges from the database in bounded batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Maximum number of challenges removed by each query.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to wait between batches.",
+        )
+        parser.add_argument(
+            "--max-runtime",
+            type=float,
+            default=None,
+            help="Stop after this number of seconds, even if work remains.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        pause = options["sleep"]
+        max_runtime = options["max_runtime"]
+        start = monotonic()
+        total = 0
+
+        while True:
+            deleted = Challenge.objects.clean_expired(batch_size=batch_size)
+            total += deleted
+            if deleted < batch_size:
+                break
+            if max_runtime is not None and monotonic() - start >= max_runtime:
+                break
+            if pause:
+                sleep(pause)
+
+        self.stdout.write(f"Removed {total} expired challenges")
@@ -1,32 +1,133 @@
-from datetime import timedelta
+import random
 
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
 from django.db.models.manager import Manager
 from django.conf import settings
-from django.utils import timezone
+from django.utils.module_loading import import_string
 
-from .utils import generate_challenge
+from .metrics import CHALLENGE_OPERATION_SECONDS, timer
 
 
 class ChallengeManager(Manager):
-    """Provides methods to easily create and verify challenges."""
+    """Provides methods to easily create and verify challenges.
+
+    The work is delegated to the challenge store set by
+    ``DJCL_CHALLENGE_STORE`` (see ``django_cryptolock.stores``).
+    """
+
+    @property
+    def store(self):
+        default = "django_cryptolock.stores.DatabaseChallengeStore"
+        if getattr(settings, "DJCL_STATELESS_CHALLENGES", False):
+            default = "django_cryptolock.stores.SignedChallengeStore"
+        store_class = import_string(getattr(settings, "DJCL_CHALLENGE_STORE", default))
+        return store_class(self)
 
     def generate(self):
-        token = generate_challenge()
-        age = getattr(settings, "DJCL_CHALLENGE_EXPIRATION", 10)
-        expiry_date = timezone.now() + timedelta(minutes=age)
-        return self.create(challenge=token, expires=expiry_date)
+        with timer(CHALLENGE_OPERATION_SECONDS, operation="generate"):
+            return self.store.generate()
+
+    def checkout(self):
+        """Returns a new challenge, taken from the pool of pre-generated
+        challenges when ``DJCL_CHALLENGE_POOL_SIZE`` is set."""
+        if not getattr(settings, "DJCL_CHALLENGE_POOL_SIZE", 0):
+            return self.generate()
+        with timer(CHALLENGE_OPERATION_SECONDS, operation="checkout"):
+            return self.store.checkout()
+
+    def fill_pool(self, size=None, batch_size=1000):
+        """Adds challenges to the pool, up to ``size`` (by default
+        ``DJCL_CHALLENGE_POOL_SIZE``). Returns nº of challenges added."""
+        if size is None:
+            size = getattr(settings, "DJCL_CHALLENGE_POOL_SIZE", 0)
+        return self.store.fill_pool(size, batch_size=batch_size)
 
     def is_active(self, challenge):
         """Returns True if the challenge can be used. Otherwise False."""
-        now = timezone.now()
-        return self.filter(challenge=challenge, expires__gte=now).exists()
+        with timer(CHALLENGE_OPERATION_SECONDS, operation="is_active"):
+            return self.store.is_active(challenge)
+
+    def consume(self, challenge):
+        """Atomically uses the challenge. Returns True if it was still active.
+
+        When concurrent requests try to use the same challenge only one of
+        them succeeds.
+        """
+        with timer(CHALLENGE_OPERATION_SECONDS, operation="consume"):
+            return self.store.consume(challenge)
 
     def invalidate(self, challenge):
         """Removes the provided challenge if it exists."""
-        self.filter(challenge=challenge).delete()
+        self.store.invalidate(challenge)
+
+    def clean_expired(self, batch_size=None):
+        """Delete expired challenges. Returns nº of entries removed.
+
+        When ``batch_size`` is provided, at most that number of challenges
+        are removed.
+        """
+        with timer(CHALLENGE_OPERATION_SECONDS, operation="clean_expired"):
+            return self.store.clean_expired(batch_size=batch_size)
+
+    def maybe_clean_expired(self):
+        """Amortized cleanup of expired challenges, meant for request handlers.
+
+        The cleanup only runs on a fraction of the calls, controlled by
+        ``DJCL_CHALLENGE_PURGE_PROBABILITY`` (``0`` disables it, so the
+        ``purge_challenges`` command can be used instead). Returns nº of
+        entries removed.
+        """
+        probability = getattr(settings, "DJCL_CHALLENGE_PURGE_PROBABILITY", 1)
+        if probability <= 0 or random.random() >= probability:
+            return 0
+        return self.clean_expired()
+
+
+class AddressQuerySet(QuerySet):
+    def for_login(self, address, network=None):
+        """Addresses matching ``address`` (and ``network``, when provided),
+        with only the user columns needed to authenticate and log in."""
+        user_model = get_user_model()
+        concrete = {field.name for field in user_model._meta.concrete_fields}
+        user_fields = {
+            user_model._meta.pk.name,
+            user_model.USERNAME_FIELD,
+            "password",
+            "last_login",
+            "is_active",
+        }
+        queryset = self.filter(address=address)
+        if network is not None:
+            queryset = queryset.filter(network=network)
+        return queryset.select_related("user").only(
+            "address",
+            "network",
+            "user",
+            *(f"user__{name}" for name in sorted(user_fields & concrete)),
+        )
+
+
+class AddressManager(Manager.from_queryset(AddressQuerySet)):
+    """Provides the address lookups used by the forms and backends."""
+
+    def lookup(self, address, request=None):
+        """Returns the stored address, with its user, or None.
+
+        Addresses are unique across networks, so a single query serves every
+        backend. When a request is provided the result is memoized on it, and
+        the form and the backends handling that request share the same query.
+        """
+        if request is None:
+            return self.for_login(address).first()
+
+        memo = vars(request).setdefault("_cryptolock_addresses", {})
+        if address not in memo:
+            memo[address] = self.for_login(address).first()
+        return memo[address]
 
-    def clean_expired(self):
-        """Delete all expired challenges. Returns nº of entries removed."""
-        now = timezone.now()
-        del_summary = self.filter(expires__lt=now).delete()
-        return del_summary[0]
+    def remember(self, stored_address, request=None):
+        """Updates the memoized lookup after creating ``stored_address``."""
+        if request is not None:
+            memo = vars(request).setdefault("_cryptolock_addresses", {})
+            memo[stored_address.address] = stored_address
@@ -0,0 +1,116 @@
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+SIGNATURE_VERIFICATION_SECONDS = "djcl_signature_verification_seconds"
+SIGNATURE_VERIFICATIONS = "djcl_signature_verifications"
+CHALLENGE_OPERATION_SECONDS = "djcl_challenge_operation_seconds"
+AUTHENTICATIONS = "djcl_authentications"
+VERIFICATION_CACHE_HITS = "djcl_verification_cache_hits"
+RATE_LIMITED = "djcl_rate_limited_requests"
+
+VALID = "valid"
+INVALID = "invalid"
+RPC_ERROR = "rpc_error"
+SUCCESS = "success"
+FAILURE = "failure"
+
+DESCRIPTIONS = {
+    SIGNATURE_VERIFICATION_SECONDS: "Time spent verifying signatures.",
+    SIGNATURE_VERIFICATIONS: "Signature verifications, by outcome.",
+    CHALLENGE_OPERATION_SECONDS: "Time spent on challenge operations.",
+    AUTHENTICATIONS: "Authentication attempts handled by the backends.",
+    VERIFICATION_CACHE_HITS: "Signature verifications answered by the cache.",
+    RATE_LIMITED: "Requests rejected by the rate limits.",
+}
+
+
+class MetricsCollector:
+    """Receives the measurements of the package. Discards them by default.
+
+    Set ``DJCL_METRICS_COLLECTOR`` to the path of a subclass to send them
+    somewhere else.
+    """
+
+    def observe(self, name: str, value: float, **labels):
+        """Records a value (such as a duration in seconds) on a histogram."""
+
+    def increment(self, name: str, value: float = 1, **labels):
+        """Increments a counter."""
+
+
+class PrometheusCollector(MetricsCollector):
+    """Exposes the measurements using the optional ``prometheus_client``."""
+
+    def __init__(self, registry=None):
+        import prometheus_client
+
+        self.prometheus_client = prometheus_client
+        self.registry = registry or prometheus_client.REGISTRY
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def get_metric(self, metric_class, name, labels):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = metric_class(
+                    name,
+                    DESCRIPTIONS.get(name, name),
+                    sorted(labels),
+                    registry=self.registry,
+                )
+                self.metrics[name] = metric
+        return metric.labels(**labels) if labels else metric
+
+    def observe(self, name, value, **labels):
+        histogram = self.prometheus_client.Histogram
+        self.get_metric(histogram, name, labels).observe(value)
+
+    def increment(self, name, value=1, **labels):
+        counter = self.prometheus_client.Counter
+        self.get_metric(counter, name, labels).inc(value)
+
+
+_collectors = {}
+_collectors_lock = threading.Lock()
+
+
+def get_collector() -> MetricsCollector:
+    """Returns the collector set by ``DJCL_METRICS_COLLECTOR``."""
+    path = getattr(
+        settings, "DJCL_METRICS_COLLECTOR", "django_cryptolock.metrics.MetricsCollector"
+    )
+    collector = _collectors.get(path)
+    if collector is None:
+        with _collectors_lock:
+            collector = _collectors.get(path)
+            if collector is None:
+                collector = import_string(path)()
+                _collectors[path] = collector
+    return collector
+
+
+@contextmanager
+def timer(name: str, **labels):
+    """Records the duration of the block on the ``name`` histogram."""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        get_collector().observe(name, perf_counter() - start, **labels)
+
+
+def increment(name: str, value: float = 1, **labels):
+    get_collector().increment(name, value, **labels)
+
+
+def count_verification(network: str, outcome):
+    """Counts a signature verification, ``outcome`` is either ``RPC_ERROR`` or
+    the verification result."""
+    if outcome != RPC_ERROR:
+        outcome = VALID if outcome else INVALID
+    increment(SIGNATURE_VERIFICATIONS, network=network, outcome=outcome)
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("django_cryptolock", "0003_challenge")]
+
+    operations = [
+        migrations.AlterField(
+            model_name="challenge",
+            name="challenge",
+            field=models.CharField(max_length=150, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="challenge",
+            name="expires",
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
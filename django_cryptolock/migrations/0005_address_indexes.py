@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_cryptolock", "0004_challenge_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="address",
+            index=models.Index(
+                fields=["user", "network"], name="djcl_address_user_network"
+            ),
+        ),
+    ]
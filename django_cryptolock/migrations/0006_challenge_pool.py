@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_cryptolock", "0005_address_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="challenge",
+            name="issued",
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddIndex(
+            model_name="challenge",
+            index=models.Index(
+                condition=models.Q(("issued", False)),
+                fields=["id"],
+                name="djcl_challenge_pool",
+            ),
+        ),
+    ]
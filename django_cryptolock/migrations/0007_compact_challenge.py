@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:44
+
+from django.db import migrations, models
+import django_cryptolock.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_cryptolock", "0006_challenge_pool"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CompactChallenge",
+            fields=[
+                (
+                    "token",
+                    django_cryptolock.models.TokenField(
+                        max_length=64, primary_key=True, serialize=False
+                    ),
+                ),
+                ("expires", models.DateTimeField(db_index=True)),
+            ],
+            options={
+                "verbose_name": "Compact challenge",
+                "verbose_name_plural": "Compact challenges",
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:47
+
+from django.db import migrations, models
+import django_cryptolock.models
+
+TABLE = "django_cryptolock_partitionedchallenge"
+
+
+def create_partitioned_table(apps, schema_editor):
+    """Only PostgreSQL (11+) supports the partitioned table, on the other
+    databases ``PartitionedChallengeStore`` cannot be used."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        f"CREATE TABLE {TABLE} ("
+        "token bytea NOT NULL, "
+        "expires timestamp with time zone NOT NULL, "
+        "PRIMARY KEY (token, expires)"
+        ") PARTITION BY RANGE (expires)"
+    )
+    # Challenges outside of the partitions created by the store land here
+    schema_editor.execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+
+
+def drop_partitioned_table(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_cryptolock", "0007_compact_challenge"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PartitionedChallenge",
+            fields=[
+                (
+                    "token",
+                    django_cryptolock.models.TokenField(
+                        max_length=64, primary_key=True, serialize=False
+                    ),
+                ),
+                ("expires", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name": "Partitioned challenge",
+                "verbose_name_plural": "Partitioned challenges",
+                "db_table": "django_cryptolock_partitionedchallenge",
+                "managed": False,
+            },
+        ),
+        migrations.RunPython(create_partitioned_table, drop_partitioned_table),
+    ]
@@ -1,30 +1,129 @@
+import asyncio
+from functools import update_wrapper
+
 from django.db import transaction
 from django.contrib.auth import get_user_model
+from django.http import HttpResponse, JsonResponse
+from django.utils.translation import gettext_lazy as _
 
 from rest_framework.response import Response
 from rest_framework import status
 
 from pybitid import bitid
 
-from .models import Challenge
+from .models import Address, Challenge
+from .ratelimit import check_rate_limits
 from .serializers import ChallengeSerializer
 
 
 class CreateChallengeMixin:
     """Add create challenge on get functionality to API views."""
 
+    def get_challenge_data(self, request, callback_uri=None):
+        """Returns a new challenge, as a BitId URI for ``callback_uri`` (by
+        default the current URL), and its expiry date."""
+        challenge = Challenge.objects.checkout()
+        data = dict(ChallengeSerializer(instance=challenge).data)
+        data["challenge"] = bitid.build_uri(
+            callback_uri or request.build_absolute_uri(), challenge.challenge
+        )
+        return data
+
     def get(self, request, format=None):
         """Returns a new challenge for the login."""
-        serializer = ChallengeSerializer(instance=Challenge.objects.generate())
-        serializer.data["challenge"] = bitid.build_uri(
-            request.build_absolute_uri(), serializer.data["challenge"]
-        )
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(self.get_challenge_data(request), status=status.HTTP_200_OK)
+
+
+class AsyncViewMixin:
+    """Allows class based views with ``async`` handlers on Django 3.1+.
+
+    Every handler listed in ``http_method_names`` must be ``async``.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        """Applies the limits of ``RateLimitMixin`` on a thread, since the
+        cache calls and reading the request body block."""
+        from asgiref.sync import sync_to_async
+
+        if isinstance(self, RateLimitMixin):
+            retry_after = await sync_to_async(check_rate_limits)(
+                request, self.rate_limit_scope
+            )
+            if retry_after is not None:
+                return self.rate_limited(retry_after)
+            self.rate_limits_checked = True
+
+        response = super().dispatch(request, *args, **kwargs)
+        if asyncio.iscoroutine(response):
+            response = await response
+        return response
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+            return response
+
+        update_wrapper(async_view, view)
+        return async_view
+
+
+class RateLimitMixin:
+    """Answers with ``429`` the requests over the ``DJCL_RATE_LIMITS`` of
+    ``rate_limit_scope``, before doing any other work."""
+
+    rate_limit_scope = None
+    # Set by ``AsyncViewMixin``, that checks the limits off the event loop
+    rate_limits_checked = False
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.rate_limits_checked:
+            retry_after = check_rate_limits(request, self.rate_limit_scope)
+            if retry_after is not None:
+                return self.rate_limited(retry_after)
+        return super().dispatch(request, *args, **kwargs)
+
+    def rate_limited(self, retry_after):
+        response = HttpResponse(_("Too many requests"), status=429)
+        response["Retry-After"] = str(retry_after)
+        return response
+
+
+class APIRateLimitMixin(RateLimitMixin):
+    """``RateLimitMixin`` for the API views, answering with JSON."""
+
+    def rate_limited(self, retry_after):
+        response = JsonResponse({"detail": _("Too many requests")}, status=429)
+        response["Retry-After"] = str(retry_after)
+        return response
 
 
 class CreateUserMixin:
+    def get_verification_args(self, form):
+        """Arguments for ``verify_signature`` taken from a valid sign up form."""
+        network = [n[1] for n in Address.NETWORKS if n[0] == form.network][0]
+        return (
+            network,
+            form.cleaned_data["address"],
+            form.cleaned_data["challenge"],
+            form.cleaned_data["signature"],
+            self.request,
+        )
+
     @transaction.atomic
     def create_user(self, username, challenge, address, network):
+        """Creates the new user, consuming the challenge token.
+
+        Returns None, without creating anything, if the challenge was already
+        used or expired in the meantime.
+        """
+        if not Challenge.objects.consume(challenge):
+            return None
         user = get_user_model().objects.create(username=username)
-        user.address_set.create(address=address, network=network)
-        Challenge.objects.invalidate(challenge)
+        stored_address = user.address_set.create(address=address, network=network)
+        Address.objects.remember(stored_address, getattr(self, "request", None))
+        return user
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from django.db import models
+from django.db.models import Q
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
@@ -7,7 +8,7 @@ from django.core.exceptions import ValidationError
 from model_utils.models import TimeStampedModel
 
 from .validators import validate_monero_address, validate_bitcoin_address
-from .managers import ChallengeManager
+from .managers import AddressManager, ChallengeManager
 
 
 class Address(TimeStampedModel):
@@ -22,11 +23,16 @@ class Address(TimeStampedModel):
     network = models.PositiveSmallIntegerField(choices=NETWORKS, default=NETWORK_MONERO)
     address = models.CharField(max_length=106, unique=True)
 
+    objects = AddressManager()
+
     class Meta:
         """Meta definition for Address."""
 
         verbose_name = _("Address")
         verbose_name_plural = _("Addresses")
+        indexes = [
+            models.Index(fields=["user", "network"], name="djcl_address_user_network")
+        ]
 
     def __str__(self):
         """Unicode representation of Address."""
@@ -45,8 +51,10 @@ class Address(TimeStampedModel):
 class Challenge(TimeStampedModel):
     """Challenges provided to users for authentication purposes."""
 
-    challenge = models.CharField(max_length=150)
-    expires = models.DateTimeField(null=False)
+    challenge = models.CharField(max_length=150, unique=True)
+    expires = models.DateTimeField(null=False, db_index=True)
+    # False while the challenge waits on the pool, before being handed out
+    issued = models.BooleanField(default=True)
 
     objects = ChallengeManager()
 
@@ -55,7 +63,67 @@ class Challenge(TimeStampedModel):
 
         verbose_name = _("Challenge")
         verbose_name_plural = _("Challenges")
+        indexes = [
+            models.Index(
+                fields=["id"], name="djcl_challenge_pool", condition=Q(issued=False)
+            )
+        ]
 
     def __str__(self):
         """Unicode representation of Challenge."""
         return self.challenge
+
+
+class TokenField(models.BinaryField):
+    """Raw bytes of a challenge token. Uses ``VARBINARY`` on MySQL, where
+    ``BinaryField`` columns cannot be indexed."""
+
+    def db_type(self, connection):
+        if connection.vendor == "mysql":
+            return f"varbinary({self.max_length})"
+        return super().db_type(connection)
+
+
+class CompactChallenge(models.Model):
+    """Compact storage for challenges, used by ``CompactChallengeStore``.
+
+    The token is stored as raw bytes and used as the primary key, without the
+    timestamp columns of ``Challenge``.
+    """
+
+    token = TokenField(max_length=64, primary_key=True)
+    expires = models.DateTimeField(db_index=True)
+
+    class Meta:
+        """Meta definition for CompactChallenge."""
+
+        verbose_name = _("Compact challenge")
+        verbose_name_plural = _("Compact challenges")
+
+    def __str__(self):
+        """Unicode representation of CompactChallenge."""
+        return bytes(self.token).hex()
+
+
+class PartitionedChallenge(models.Model):
+    """Challenges of ``PartitionedChallengeStore``.
+
+    The table is partitioned by expiry date on PostgreSQL, so it is created by
+    the migrations with SQL and its partitions are managed by the store. The
+    primary key of the table is ``(token, expires)``.
+    """
+
+    token = TokenField(max_length=64, primary_key=True)
+    expires = models.DateTimeField()
+
+    class Meta:
+        """Meta definition for PartitionedChallenge."""
+
+        managed = False
+        db_table = "django_cryptolock_partitionedchallenge"
+        verbose_name = _("Partitioned challenge")
+        verbose_name_plural = _("Partitioned challenges")
+
+    def __str__(self):
+        """Unicode representation of PartitionedChallenge."""
+        return bytes(self.token).hex()
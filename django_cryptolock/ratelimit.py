@@ -0,0 +1,103 @@
+import hashlib
+from math import ceil
+from time import time
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpRequest
+
+from .metrics import RATE_LIMITED, increment
+from .utils import get_request_data
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# Scope of the requests that issue a new challenge, limited by IP
+CHALLENGE_SCOPE = "challenge"
+
+
+def parse_rate(rate: str) -> Tuple[int, int]:
+    """Returns the number of requests and the period (in seconds) of a rate
+    such as ``"10/m"``."""
+    num, _sep, period = rate.partition("/")
+    return int(num), PERIODS[period.strip()[:1].lower()]
+
+
+def get_client_ip(request: HttpRequest) -> str:
+    """Returns the client IP, from the ``request.META`` key set on
+    ``DJCL_RATE_LIMIT_IP_META``. Only the first entry of lists such as
+    ``HTTP_X_FORWARDED_FOR`` is used."""
+    key = getattr(settings, "DJCL_RATE_LIMIT_IP_META", "REMOTE_ADDR")
+    return request.META.get(key, "").split(",")[0].strip()
+
+
+class RateLimiter:
+    """Sliding window rate limiter, backed by the Django cache.
+
+    Each window of ``period`` seconds has a counter, that is atomically
+    incremented on every hit. The requests of the previous window are
+    weighted by how much of it still overlaps the sliding window, so bursts
+    at the edge of two windows are not allowed through.
+    """
+
+    def __init__(self, cache_alias: str = "default"):
+        self.cache = caches[cache_alias]
+
+    def key(self, scope, identifier, window):
+        digest = hashlib.sha256(identifier.encode()).hexdigest()[:32]
+        return f"djcl:ratelimit:{scope}:{digest}:{window}"
+
+    def hit(self, scope: str, identifier: str, rate: str) -> Optional[int]:
+        """Counts a request. Returns None if it is allowed, otherwise the
+        number of seconds to wait before retrying."""
+        limit, period = parse_rate(rate)
+        now = time()
+        window = int(now // period)
+        key = self.key(scope, identifier, window)
+
+        self.cache.add(key, 0, period * 2)
+        try:
+            count = self.cache.incr(key)
+        except ValueError:
+            # Expired between add and incr
+            self.cache.set(key, 1, period * 2)
+            count = 1
+        previous = self.cache.get(self.key(scope, identifier, window - 1), 0)
+
+        elapsed = (now % period) / period
+        if previous * (1 - elapsed) + count <= limit:
+            return None
+        return max(1, ceil(period - now % period))
+
+
+def check_rate_limits(request: HttpRequest, scope: Optional[str]) -> Optional[int]:
+    """Applies the ``DJCL_RATE_LIMITS`` of a view to the request.
+
+    ``GET`` requests issue challenges, limited by IP on the ``"challenge"``
+    scope. ``POST`` requests are limited by IP on ``scope`` and by the
+    submitted address on ``"<scope>_address"``. Returns None when the request
+    is allowed, otherwise the number of seconds to wait before retrying.
+    """
+    limits = getattr(settings, "DJCL_RATE_LIMITS", None)
+    if not limits or scope is None:
+        return None
+
+    checks = []
+    if request.method == "GET":
+        checks.append((CHALLENGE_SCOPE, get_client_ip(request)))
+    elif request.method == "POST":
+        checks.append((scope, get_client_ip(request)))
+        address = get_request_data(request).get("address")
+        if address:
+            checks.append((f"{scope}_address", str(address)))
+
+    limiter = RateLimiter(getattr(settings, "DJCL_RATE_LIMIT_CACHE", "default"))
+    for check_scope, identifier in checks:
+        rate = limits.get(check_scope)
+        if not rate:
+            continue
+        retry_after = limiter.hit(check_scope, identifier, rate)
+        if retry_after is not None:
+            increment(RATE_LIMITED, scope=check_scope)
+            return retry_after
+    return None
@@ -0,0 +1,599 @@
+import asyncio
+import itertools
+import threading
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from time import monotonic
+from typing import Optional
+
+from django.conf import settings
+
+from monerorpc.authproxy import AuthServiceProxy, JSONRPCException, USER_AGENT
+from monerorpc.authproxy import HTTP_TIMEOUT
+from requests import Session
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPDigestAuth
+from requests.exceptions import Timeout
+
+# Error code used by ``monerorpc`` when the HTTP request itself fails
+RPC_CONNECTION_ERROR = -341
+# Error code used when the call is not even attempted, the circuit is open
+RPC_UNAVAILABLE = -345
+# Errors caused by the transport or the wallet RPC process, not by the request
+RPC_TRANSPORT_ERRORS = (-341, -342, -343, -344)
+
+
+class CircuitBreaker:
+    """Stops calling the wallet RPC for a while after consecutive failures.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls fail immediately for ``open_duration`` seconds. Then a single probe
+    call is let through (half-open): if it succeeds the circuit closes again,
+    otherwise it stays open for another ``open_duration`` seconds. A
+    ``failure_threshold`` of ``0`` disables the breaker.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, open_duration: float = 30):
+        self.failure_threshold = failure_threshold
+        self.open_duration = open_duration
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def _state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if monotonic() - self.opened_at < self.open_duration:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def allow_request(self) -> bool:
+        """Returns True if a call can be made now."""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if not self.failure_threshold:
+                return
+            if self.probing or self.failures >= self.failure_threshold:
+                self.opened_at = monotonic()
+            self.probing = False
+
+    def before_call(self):
+        """Raises ``JSONRPCException`` if the circuit does not allow the call."""
+        if not self.allow_request():
+            raise JSONRPCException(
+                {
+                    "code": RPC_UNAVAILABLE,
+                    "message": "Wallet RPC unavailable, the circuit is open.",
+                }
+            )
+
+    def after_error(self, error: Exception):
+        """Records the outcome of a call that raised ``error``."""
+        answered = isinstance(error, JSONRPCException)
+        if answered and error.code not in RPC_TRANSPORT_ERRORS:
+            # The wallet RPC is working, it is just an error for this request
+            self.record_success()
+        else:
+            self.record_failure()
+
+
+class PooledSession(Session):
+    """Session that remembers if its last request timed out.
+
+    ``monerorpc`` reports timeouts and connection errors with the same code,
+    but only the latter are worth retrying on a fresh connection.
+    """
+
+    timed_out = False
+
+    def request(self, *args, **kwargs):
+        self.timed_out = False
+        try:
+            return super().request(*args, **kwargs)
+        except Timeout:
+            self.timed_out = True
+            raise
+
+
+class WalletRPCPool:
+    """Thread-safe pool of keep-alive HTTP sessions to a single wallet RPC.
+
+    Each session keeps its TCP connection and its digest authentication state
+    between calls, so consecutive verifications skip both the connection setup
+    and the authentication handshake. Sessions idle for longer than
+    ``idle_timeout`` seconds are discarded instead of being reused.
+
+    At most ``size`` calls run at the same time, so at most ``size``
+    connections are open. Other calls wait up to ``timeout`` seconds for one
+    of them to finish.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        size: int = 4,
+        idle_timeout: float = 30,
+        timeout: float = HTTP_TIMEOUT,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.url = url
+        self.user = user
+        self.password = password
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.breaker = breaker
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def _slot(self):
+        """Waits until fewer than ``size`` calls are running."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise JSONRPCException(
+                {
+                    "code": RPC_UNAVAILABLE,
+                    "message": "No wallet RPC connection became available.",
+                }
+            )
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def _new_session(self) -> PooledSession:
+        session = PooledSession()
+        session.headers.update(
+            {"Content-Type": "application/json", "User-Agent": USER_AGENT}
+        )
+        if self.user is not None and self.password is not None:
+            session.auth = HTTPDigestAuth(self.user, self.password)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _acquire(self):
+        """Returns an idle session (and if it was reused) or a new one."""
+        now = monotonic()
+        expired = []
+        session = None
+        with self._lock:
+            while self._idle:
+                candidate, last_used = self._idle.pop()
+                if now - last_used <= self.idle_timeout:
+                    session = candidate
+                    break
+                expired.append(candidate)
+        for stale in expired:
+            stale.close()
+        if session is not None:
+            return session, True
+        return self._new_session(), False
+
+    def _release(self, session: Session):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((session, monotonic()))
+                return
+        session.close()
+
+    def call(self, method: str, params: Optional[dict] = None):
+        """Executes a JSON-RPC method using a pooled connection.
+
+        When a reused connection fails at the transport level (for example
+        because the server dropped it while idle) the call is retried once
+        using a fresh connection. Timeouts are not retried. If the pool has a
+        circuit breaker that is open, the call fails immediately.
+        """
+        with self._slot():
+            if self.breaker is None:
+                return self._call(method, params)
+
+            self.breaker.before_call()
+            try:
+                result = self._call(method, params)
+            except Exception as e:
+                self.breaker.after_error(e)
+                raise
+            self.breaker.record_success()
+            return result
+
+    def _call(self, method, params):
+        session, reused = self._acquire()
+        try:
+            return self._call_with(session, method, params)
+        except JSONRPCException as e:
+            stale = reused and e.code == RPC_CONNECTION_ERROR
+            if not stale or session.timed_out:
+                raise
+        # The reused connection was dropped while idle, retry once on a new one
+        return self._call_with(self._new_session(), method, params)
+
+    def _call_with(self, session, method, params):
+        proxy = AuthServiceProxy(
+            self.url, service_name=method, timeout=self.timeout, connection=session
+        )
+        try:
+            result = proxy(params or {})
+        except JSONRPCException as e:
+            if e.code != RPC_CONNECTION_ERROR:
+                self._release(session)
+            else:
+                session.close()
+            raise
+        except Exception:
+            session.close()
+            raise
+        self._release(session)
+        return result
+
+    def close(self):
+        """Closes every idle connection in the pool."""
+        with self._lock:
+            sessions = [session for session, _ in self._idle]
+            self._idle.clear()
+        for session in sessions:
+            session.close()
+
+    def __len__(self):
+        return len(self._idle)
+
+
+class AsyncWalletRPCClient:
+    """Non-blocking wallet RPC client, for use in async views and backends.
+
+    Relies on the optional ``httpx`` dependency, that keeps up to ``size``
+    keep-alive connections open. A client can only be used by the event loop
+    where it was created.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        size: int = 4,
+        timeout: float = HTTP_TIMEOUT,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        import httpx
+
+        self.url = url
+        self.size = size
+        self.timeout = timeout
+        self.breaker = breaker
+        self._ids = itertools.count(1)
+        self._errors = (httpx.HTTPError, httpx.StreamError)
+        auth = None
+        if user is not None and password is not None:
+            auth = httpx.DigestAuth(user, password)
+        self.client = httpx.AsyncClient(
+            auth=auth,
+            timeout=timeout,
+            limits=httpx.Limits(max_keepalive_connections=size),
+            headers={"User-Agent": USER_AGENT},
+        )
+
+    async def call(self, method: str, params: Optional[dict] = None):
+        """Executes a JSON-RPC method, raising ``JSONRPCException`` on errors."""
+        if self.breaker is None:
+            return await self._call(method, params)
+
+        self.breaker.before_call()
+        try:
+            result = await self._call(method, params)
+        except Exception as e:
+            self.breaker.after_error(e)
+            raise
+        self.breaker.record_success()
+        return result
+
+    async def _call(self, method, params):
+        payload = {
+            "jsonrpc": "2.0",
+            "id": next(self._ids),
+            "method": method,
+            "params": params or {},
+        }
+        try:
+            response = await self.client.post(self.url, json=payload)
+        except self._errors as e:
+            raise JSONRPCException(
+                {"code": RPC_CONNECTION_ERROR, "message": f"Request error: '{e}'."}
+            )
+
+        if response.status_code != 200:
+            raise JSONRPCException(
+                {
+                    "code": -344,
+                    "message": f"Received HTTP status code '{response.status_code}'.",
+                }
+            )
+        data = response.json()
+        if data.get("error") is not None:
+            raise JSONRPCException(data["error"])
+        if "result" not in data:
+            raise JSONRPCException(
+                {"code": -343, "message": "Missing JSON-RPC result."}
+            )
+        return data["result"]
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class BaseWalletRPCBalancer:
+    """Spreads the calls over several wallet RPC endpoints.
+
+    With the ``"round_robin"`` strategy the endpoints take turns, with
+    ``"least_outstanding"`` each call goes to the endpoint with fewer calls
+    in progress. Endpoints whose circuit is open are tried last, and when an
+    endpoint fails at the transport level the call fails over to the next
+    one. Errors returned by the wallet itself are raised right away.
+    """
+
+    ROUND_ROBIN = "round_robin"
+    LEAST_OUTSTANDING = "least_outstanding"
+    HEALTH_CHECK_METHOD = "get_version"
+
+    def __init__(self, endpoints: list, strategy: str = ROUND_ROBIN):
+        if strategy not in (self.ROUND_ROBIN, self.LEAST_OUTSTANDING):
+            raise ValueError(f"Unknown balancing strategy: {strategy}")
+        self.endpoints = list(endpoints)
+        self.strategy = strategy
+        self.outstanding = [0] * len(self.endpoints)
+        self._turns = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """Total number of pooled connections, over all the endpoints."""
+        return sum(endpoint.size for endpoint in self.endpoints)
+
+    def _is_available(self, index):
+        breaker = self.endpoints[index].breaker
+        return breaker is None or breaker.state != CircuitBreaker.OPEN
+
+    def _candidates(self):
+        """Returns the endpoint indexes, in the order they should be tried."""
+        count = len(self.endpoints)
+        start = next(self._turns) % count
+        order = [(start + offset) % count for offset in range(count)]
+        if self.strategy == self.LEAST_OUTSTANDING:
+            with self._lock:
+                outstanding = list(self.outstanding)
+            order.sort(key=lambda index: outstanding[index])
+        # Stable sort, keeps the previous order between available endpoints
+        order.sort(key=lambda index: not self._is_available(index))
+        return order
+
+    def _started(self, index):
+        with self._lock:
+            self.outstanding[index] += 1
+
+    def _finished(self, index):
+        with self._lock:
+            self.outstanding[index] -= 1
+
+    @staticmethod
+    def _can_fail_over(error):
+        return error.code in RPC_TRANSPORT_ERRORS or error.code == RPC_UNAVAILABLE
+
+    def is_available(self) -> bool:
+        """False when the circuit of every endpoint is open."""
+        return any(self._is_available(i) for i in range(len(self.endpoints)))
+
+
+class WalletRPCBalancer(BaseWalletRPCBalancer):
+    """Balances the calls over several ``WalletRPCPool``."""
+
+    def call(self, method: str, params: Optional[dict] = None):
+        """Executes a JSON-RPC method on one of the endpoints.
+
+        If every endpoint fails, the last error is raised.
+        """
+        error = None
+        for index in self._candidates():
+            self._started(index)
+            try:
+                return self.endpoints[index].call(method, params)
+            except JSONRPCException as e:
+                if not self._can_fail_over(e):
+                    raise
+                error = e
+            finally:
+                self._finished(index)
+        raise error
+
+    def check_health(self) -> dict:
+        """Calls every endpoint, even those with an open circuit, updating
+        their circuit breakers. Returns the result by endpoint URL."""
+        health = {}
+        for pool in self.endpoints:
+            breaker = pool.breaker or CircuitBreaker(failure_threshold=0)
+            try:
+                with pool._slot():
+                    pool._call(self.HEALTH_CHECK_METHOD, None)
+            except Exception as e:
+                # Errors returned by the wallet are recorded as a success
+                breaker.after_error(e)
+            else:
+                breaker.record_success()
+            health[pool.url] = breaker.failures == 0
+        return health
+
+
+class AsyncWalletRPCBalancer(BaseWalletRPCBalancer):
+    """Balances the calls over several ``AsyncWalletRPCClient``."""
+
+    async def call(self, method: str, params: Optional[dict] = None):
+        """Async version of ``WalletRPCBalancer.call``."""
+        error = None
+        for index in self._candidates():
+            self._started(index)
+            try:
+                return await self.endpoints[index].call(method, params)
+            except JSONRPCException as e:
+                if not self._can_fail_over(e):
+                    raise
+                error = e
+            finally:
+                self._finished(index)
+        raise error
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_breakers = {}
+_balancers = {}
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _get_wallet_rpc_urls():
+    """Returns the URL of every configured wallet RPC endpoint."""
+    protocol = settings.DJCL_MONERO_WALLET_RPC_PROTOCOL
+    hosts = getattr(settings, "DJCL_MONERO_WALLET_RPC_HOSTS", None)
+    if not hosts:
+        hosts = [settings.DJCL_MONERO_WALLET_RPC_HOST]
+    return [f"{protocol}://{host}/json_rpc" for host in hosts]
+
+
+def _get_wallet_rpc_settings(url=None):
+    return {
+        "url": url or _get_wallet_rpc_urls()[0],
+        "user": settings.DJCL_MONERO_WALLET_RPC_USER,
+        "password": settings.DJCL_MONERO_WALLET_RPC_PASS,
+        "size": getattr(settings, "DJCL_MONERO_WALLET_RPC_POOL_SIZE", 4),
+        "timeout": getattr(settings, "DJCL_MONERO_WALLET_RPC_TIMEOUT", HTTP_TIMEOUT),
+    }
+
+
+def _get_balancing_strategy():
+    return getattr(
+        settings, "DJCL_MONERO_WALLET_RPC_BALANCING", BaseWalletRPCBalancer.ROUND_ROBIN
+    )
+
+
+def get_circuit_breaker(url: Optional[str] = None) -> CircuitBreaker:
+    """Returns the circuit breaker shared by every client of a wallet RPC
+    endpoint, by default the first one."""
+    if url is None:
+        url = _get_wallet_rpc_urls()[0]
+    threshold = getattr(settings, "DJCL_MONERO_WALLET_RPC_FAILURE_THRESHOLD", 5)
+    duration = getattr(settings, "DJCL_MONERO_WALLET_RPC_OPEN_DURATION", 30)
+    key = (url, threshold, duration)
+    with _pools_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(threshold, duration)
+            _breakers[key] = breaker
+    return breaker
+
+
+def is_wallet_rpc_available() -> bool:
+    """False while the circuit of every endpoint is open, so wallet RPC calls
+    fail immediately."""
+    return any(
+        get_circuit_breaker(url).state != CircuitBreaker.OPEN
+        for url in _get_wallet_rpc_urls()
+    )
+
+
+def get_wallet_rpc_pool(url: Optional[str] = None) -> WalletRPCPool:
+    """Returns the shared pool of a wallet RPC endpoint, by default the first
+    one, for the current settings."""
+    options = _get_wallet_rpc_settings(url)
+    options["idle_timeout"] = getattr(
+        settings, "DJCL_MONERO_WALLET_RPC_POOL_IDLE_TIMEOUT", 30
+    )
+    breaker = get_circuit_breaker(options["url"])
+    key = tuple(sorted(options.items())) + (id(breaker),)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = WalletRPCPool(breaker=breaker, **options)
+            _pools[key] = pool
+    return pool
+
+
+def get_wallet_rpc() -> WalletRPCBalancer:
+    """Returns the shared balancer over every configured wallet RPC endpoint."""
+    pools = [get_wallet_rpc_pool(url) for url in _get_wallet_rpc_urls()]
+    strategy = _get_balancing_strategy()
+    key = (strategy,) + tuple(id(pool) for pool in pools)
+    with _pools_lock:
+        balancer = _balancers.get(key)
+        if balancer is None:
+            balancer = WalletRPCBalancer(pools, strategy)
+            _balancers[key] = balancer
+    return balancer
+
+
+def get_async_wallet_rpc_client(url: Optional[str] = None) -> AsyncWalletRPCClient:
+    """Returns the async client of a wallet RPC endpoint, by default the first
+    one, for the current settings and loop."""
+    options = _get_wallet_rpc_settings(url)
+    breaker = get_circuit_breaker(options["url"])
+    key = tuple(sorted(options.items())) + (id(breaker),)
+    clients = _async_clients.setdefault(asyncio.get_event_loop(), {})
+    client = clients.get(key)
+    if client is None:
+        client = AsyncWalletRPCClient(breaker=breaker, **options)
+        clients[key] = client
+    return client
+
+
+def get_async_wallet_rpc() -> AsyncWalletRPCBalancer:
+    """Returns the async balancer over every configured wallet RPC endpoint,
+    for the current loop."""
+    clients = [get_async_wallet_rpc_client(url) for url in _get_wallet_rpc_urls()]
+    strategy = _get_balancing_strategy()
+    key = ("balancer", strategy) + tuple(id(client) for client in clients)
+    balancers = _async_clients[asyncio.get_event_loop()]
+    balancer = balancers.get(key)
+    if balancer is None:
+        balancer = AsyncWalletRPCBalancer(clients, strategy)
+        balancers[key] = balancer
+    return balancer
+
+
+def close_wallet_rpc_pools():
+    """Closes and forgets every wallet RPC pool (and circuit) created so far."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+        _breakers.clear()
+        _balancers.clear()
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,176 @@
+"""
+Local verification of Monero message signatures.
+
+Implements the same checks performed by ``monero-wallet-rpc`` on its
+``verify`` method, for both ``SigV1`` and ``SigV2`` signatures, without any
+external service.
+"""
+
+from binascii import unhexlify
+
+from monero import base58
+from monero.address import address as decode_address
+
+try:
+    from sha3 import keccak_256
+except ImportError:  # Newer versions of monero use pycryptodomex instead
+    from Cryptodome.Hash import keccak
+
+    def keccak_256(data=b""):
+        return keccak.new(digest_bits=256, data=data)
+
+
+SIGNATURE_V1_HEADER = "SigV1"
+SIGNATURE_V2_HEADER = "SigV2"
+# The wallet includes the trailing NUL byte of the C string in the hash
+MESSAGE_SIGNING_KEY = b"MoneroMessageSignature\x00"
+
+SIGN_WITH_SPEND_KEY = 0
+SIGN_WITH_VIEW_KEY = 1
+
+# Ed25519 curve parameters
+Q = 2**255 - 19
+L = 2**252 + 27742317777372353535851937790883648493
+D = -121665 * pow(121666, Q - 2, Q) % Q
+D2 = 2 * D % Q
+SQRT_M1 = pow(2, (Q - 1) // 4, Q)
+
+_BASE_Y = 4 * pow(5, Q - 2, Q) % Q
+_BASE_X = 15112221349535400772501151409588531511454012693041857206046113283949847762202
+BASE = (_BASE_X, _BASE_Y, 1, _BASE_X * _BASE_Y % Q)
+IDENTITY = (0, 1, 1, 0)
+IDENTITY_BYTES = b"\x01" + b"\x00" * 31
+
+
+def _point_add(p1, p2):
+    """Adds two points in extended coordinates (unified formula)."""
+    x1, y1, z1, t1 = p1
+    x2, y2, z2, t2 = p2
+    a = (y1 - x1) * (y2 - x2) % Q
+    b = (y1 + x1) * (y2 + x2) % Q
+    c = t1 * D2 * t2 % Q
+    d = 2 * z1 * z2 % Q
+    e, f, g, h = b - a, d - c, d + c, b + a
+    return (e * f % Q, g * h % Q, f * g % Q, e * h % Q)
+
+
+def _double_scalarmult_base(a, point, b):
+    """Computes ``a * point + b * BASE`` using Shamir's trick."""
+    both = _point_add(point, BASE)
+    result = IDENTITY
+    for i in reversed(range(max(a.bit_length(), b.bit_length()))):
+        result = _point_add(result, result)
+        bit_a = (a >> i) & 1
+        bit_b = (b >> i) & 1
+        if bit_a and bit_b:
+            result = _point_add(result, both)
+        elif bit_a:
+            result = _point_add(result, point)
+        elif bit_b:
+            result = _point_add(result, BASE)
+    return result
+
+
+def _encode_point(point):
+    x, y, z, _ = point
+    z_inv = pow(z, Q - 2, Q)
+    x = x * z_inv % Q
+    y = y * z_inv % Q
+    return (y | ((x & 1) << 255)).to_bytes(32, "little")
+
+
+def _decode_point(data: bytes):
+    """Decodes a compressed point. Returns None if it is not on the curve."""
+    value = int.from_bytes(data, "little")
+    sign = value >> 255
+    y = (value & ((1 << 255) - 1)) % Q
+    y2 = y * y % Q
+    x2 = (y2 - 1) * pow(D * y2 + 1, Q - 2, Q) % Q
+    x = pow(x2, (Q + 3) // 8, Q)
+    if (x * x - x2) % Q != 0:
+        x = x * SQRT_M1 % Q
+        if (x * x - x2) % Q != 0:
+            return None
+    if (x & 1) != sign:
+        if x == 0:
+            return None
+        x = Q - x
+    return (x, y, 1, x * y % Q)
+
+
+def _hash_to_scalar(*parts: bytes) -> int:
+    return int.from_bytes(keccak_256(b"".join(parts)).digest(), "little") % L
+
+
+def _encode_varint(value: int) -> bytes:
+    data = bytearray()
+    while value >= 0x80:
+        data.append((value & 0x7F) | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+
+def get_message_hash(message: bytes, spend_key: bytes, view_key: bytes, mode: int):
+    """Builds the domain separated hash used by ``SigV2`` signatures."""
+    return keccak_256(
+        MESSAGE_SIGNING_KEY
+        + spend_key
+        + view_key
+        + bytes([mode])
+        + _encode_varint(len(message))
+        + message
+    ).digest()
+
+
+def check_signature(prefix_hash: bytes, public_key: bytes, signature: bytes) -> bool:
+    """Verifies a ``(c, r)`` signature of ``prefix_hash`` for ``public_key``."""
+    point = _decode_point(public_key)
+    if point is None:
+        return False
+    c = int.from_bytes(signature[:32], "little")
+    r = int.from_bytes(signature[32:], "little")
+    if c >= L or r >= L or c == 0:
+        return False
+
+    commitment = _encode_point(_double_scalarmult_base(c, point, r))
+    if commitment == IDENTITY_BYTES:
+        return False
+
+    return _hash_to_scalar(prefix_hash, public_key, commitment) == c
+
+
+def verify_monero_message(address: str, message: str, signature: str) -> bool:
+    """Verifies a Monero message signature (``SigV1`` or ``SigV2``) locally.
+
+    Like the wallet, the signature is accepted if it was made with either the
+    spend key or the view key of the address.
+    """
+    if signature.startswith(SIGNATURE_V1_HEADER):
+        version = 1
+    elif signature.startswith(SIGNATURE_V2_HEADER):
+        version = 2
+    else:
+        return False
+
+    try:
+        decoded = unhexlify(base58.decode(signature[len(SIGNATURE_V1_HEADER) :]))
+        addr = decode_address(address)
+    except (ValueError, TypeError, IndexError, KeyError):
+        return False
+    if len(decoded) != 64:
+        return False
+
+    data = message.encode()
+    spend_key = unhexlify(addr.spend_key())
+    view_key = unhexlify(addr.view_key())
+    keys = ((spend_key, SIGN_WITH_SPEND_KEY), (view_key, SIGN_WITH_VIEW_KEY))
+    for public_key, mode in keys:
+        if version == 1:
+            prefix_hash = keccak_256(data).digest()
+        else:
+            prefix_hash = get_message_hash(data, spend_key, view_key, mode)
+        if check_signature(prefix_hash, public_key, decoded):
+            return True
+
+    return False
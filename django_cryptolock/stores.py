@@ -0,0 +1,512 @@
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import django
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .utils import generate_challenge, sign_challenge, unsign_challenge
+
+
+class ChallengeStore:
+    """Base class for the places where ``ChallengeManager`` keeps challenges.
+
+    Stores always return ``Challenge`` instances from ``generate``, even when
+    nothing is saved to the database, so the rest of the package does not
+    depend on the store in use.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    @property
+    def expiration(self):
+        """Challenge lifetime, as a ``timedelta``."""
+        age = getattr(settings, "DJCL_CHALLENGE_EXPIRATION", 10)
+        return timedelta(minutes=age)
+
+    def generate(self):
+        raise NotImplementedError
+
+    def checkout(self):
+        """Returns a challenge from the pool. Stores without a pool generate
+        a new one."""
+        return self.generate()
+
+    def fill_pool(self, size, batch_size=1000):
+        """Adds challenges to the pool until it has ``size`` of them. Returns
+        nº of challenges added."""
+        return 0
+
+    def is_active(self, challenge):
+        """Returns True if the challenge can be used. Otherwise False."""
+        raise NotImplementedError
+
+    def consume(self, challenge):
+        """Atomically uses the challenge. Returns True if it was still active."""
+        raise NotImplementedError
+
+    def invalidate(self, challenge):
+        """Removes the provided challenge if it exists."""
+        self.consume(challenge)
+
+    def clean_expired(self, batch_size=None):
+        """Delete expired challenges. Returns nº of entries removed."""
+        return 0
+
+
+class DatabaseChallengeStore(ChallengeStore):
+    """Keeps every generated challenge on the ``Challenge`` table."""
+
+    def generate(self):
+        token = generate_challenge()
+        expiry_date = timezone.now() + self.expiration
+        return self.manager.create(challenge=token, expires=expiry_date)
+
+    @property
+    def pool_expiration(self):
+        """For how long challenges can wait on the pool, as a ``timedelta``."""
+        age = getattr(settings, "DJCL_CHALLENGE_POOL_EXPIRATION", 60 * 24)
+        return timedelta(minutes=age)
+
+    def checkout(self):
+        """Claims a challenge from the pool, generating a new one when the
+        pool is empty.
+
+        On PostgreSQL the challenge is claimed with a single ``UPDATE`` that
+        skips the rows locked by concurrent requests. On the other databases
+        a candidate is selected first and then claimed with a conditional
+        ``UPDATE``.
+        """
+        expiry_date = timezone.now() + self.expiration
+        if connections[self.manager.db].vendor == "postgresql":
+            token = self._claim_skip_locked(expiry_date)
+        else:
+            token = self._claim(expiry_date)
+        if token is None:
+            return self.generate()
+        return self.manager.model(challenge=token, expires=expiry_date, issued=True)
+
+    def _claim_skip_locked(self, expiry_date):
+        connection = connections[self.manager.db]
+        opts = self.manager.model._meta
+        table = connection.ops.quote_name(opts.db_table)
+        pk = connection.ops.quote_name(opts.pk.column)
+        sql = (
+            f"UPDATE {table} SET issued = TRUE, expires = %s "
+            f"WHERE {pk} = (SELECT {pk} FROM {table} "
+            "WHERE issued = FALSE AND expires >= %s "
+            f"ORDER BY {pk} LIMIT 1 FOR UPDATE SKIP LOCKED) "
+            "RETURNING challenge"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [expiry_date, timezone.now()])
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _claim(self, expiry_date, attempts=3):
+        pool = self.manager.filter(issued=False, expires__gte=timezone.now())
+        for _attempt in range(attempts):
+            candidate = pool.order_by("pk").values_list("pk", "challenge").first()
+            if candidate is None:
+                return None
+            pk, token = candidate
+            claimed = self.manager.filter(pk=pk, issued=False)
+            if claimed.update(issued=True, expires=expiry_date):
+                return token
+        return None
+
+    def fill_pool(self, size, batch_size=1000):
+        """Adds challenges to the pool until it has ``size`` of them, inserting
+        them in batches. Returns nº of challenges added."""
+        now = timezone.now()
+        missing = size - self.manager.filter(issued=False, expires__gte=now).count()
+        expiry_date = now + self.pool_expiration
+        added = 0
+        while added < missing:
+            batch = [
+                self.manager.model(
+                    challenge=generate_challenge(), expires=expiry_date, issued=False
+                )
+                for _ in range(min(batch_size, missing - added))
+            ]
+            self.manager.bulk_create(batch)
+            added += len(batch)
+        return added
+
+    def is_active(self, challenge):
+        now = timezone.now()
+        active = self.manager.filter(challenge=challenge, expires__gte=now)
+        return active.filter(issued=True).exists()
+
+    def consume(self, challenge):
+        """Atomically uses the challenge. Returns True if it was still active.
+
+        The validation and the removal happen in a single ``DELETE`` statement,
+        so when concurrent requests try to use the same challenge only one of
+        them succeeds.
+        """
+        now = timezone.now()
+        active = self.manager.filter(challenge=challenge, expires__gte=now)
+        return active.filter(issued=True).delete()[0] > 0
+
+    def invalidate(self, challenge):
+        self.manager.filter(challenge=challenge).delete()
+
+    def clean_expired(self, batch_size=None):
+        """Delete expired challenges. Returns nº of entries removed.
+
+        When ``batch_size`` is provided, at most that number of challenges
+        are removed.
+        """
+        now = timezone.now()
+        expired = self.manager.filter(expires__lt=now)
+        if batch_size is not None:
+            pks = expired.order_by("expires").values_list("pk", flat=True)
+            expired = self.manager.filter(pk__in=list(pks[:batch_size]))
+        del_summary = expired.delete()
+        return del_summary[0]
+
+
+class SignedChallengeStore(DatabaseChallengeStore):
+    """Stateless challenges, signed with the ``SECRET_KEY``.
+
+    The challenges carry their own expiry date, so nothing is written to the
+    database until a challenge is used. Used challenges are then stored until
+    they expire, to prevent them from being redeemed again.
+    """
+
+    def generate(self):
+        expiry_date = (timezone.now() + self.expiration).replace(microsecond=0)
+        token = sign_challenge(generate_challenge(), expiry_date)
+        return self.manager.model(challenge=token, expires=expiry_date)
+
+    # Generating signed challenges does not touch the database, no pool needed
+    checkout = ChallengeStore.checkout
+    fill_pool = ChallengeStore.fill_pool
+
+    def is_active(self, challenge):
+        unsigned = unsign_challenge(challenge)
+        return unsigned is not None and unsigned[1] >= timezone.now()
+
+    def consume(self, challenge):
+        """Atomically uses the challenge. Returns True if it was still active.
+
+        The unique ``INSERT`` of the used challenge makes sure that only one
+        of several concurrent requests succeeds.
+        """
+        unsigned = unsign_challenge(challenge)
+        if unsigned is None or unsigned[1] < timezone.now():
+            return False
+        nonce, expiry_date = unsigned
+        try:
+            with transaction.atomic(using=self.manager.db):
+                self.manager.create(challenge=nonce, expires=expiry_date)
+        except IntegrityError:
+            return False
+        return True
+
+    def invalidate(self, challenge):
+        self.consume(challenge)
+
+
+class CacheChallengeStore(ChallengeStore):
+    """Keeps challenges on the Django cache set by ``DJCL_CHALLENGE_CACHE``.
+
+    Challenges are removed by the cache itself once they expire. A backend
+    shared between processes (Redis, memcached, ...) is required when running
+    more than one process.
+    """
+
+    key_prefix = "djcl:challenge:"
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, "DJCL_CHALLENGE_CACHE", "default")]
+
+    def _key(self, challenge):
+        return f"{self.key_prefix}{challenge}"
+
+    def generate(self):
+        token = generate_challenge()
+        expiry_date = timezone.now() + self.expiration
+        timeout = self.expiration.total_seconds()
+        self.cache.set(self._key(token), expiry_date.timestamp(), timeout)
+        return self.manager.model(challenge=token, expires=expiry_date)
+
+    def is_active(self, challenge):
+        expires = self.cache.get(self._key(challenge))
+        return expires is not None and expires >= timezone.now().timestamp()
+
+    def consume(self, challenge):
+        """Atomically uses the challenge. Returns True if it was still active.
+
+        Relies on the cache reporting whether the key existed when deleting
+        it, so only one of several concurrent requests succeeds.
+        """
+        key = self._key(challenge)
+        if django.VERSION >= (3, 1):
+            return bool(self.cache.delete(key))
+
+        # Older versions do not report if the key existed, so the first request
+        # to atomically add a marker for the used challenge wins instead.
+        expires = self.cache.get(key)
+        if expires is None:
+            return False
+        timeout = self.expiration.total_seconds()
+        used = self.cache.add(f"{key}:used", True, timeout)
+        self.cache.delete(key)
+        return used
+
+
+class CompactChallengeStore(ChallengeStore):
+    """Keeps challenges on the ``CompactChallenge`` table.
+
+    Tokens are stored as raw bytes, used as the primary key, next to their
+    expiry date, so rows and indexes are much smaller than on ``Challenge``.
+    Only the hexadecimal tokens of ``generate_challenge`` are supported and
+    no pool is kept.
+    """
+
+    @property
+    def queryset(self):
+        from .models import CompactChallenge
+
+        return CompactChallenge.objects.using(self.manager.db)
+
+    def _token(self, challenge):
+        """Raw bytes of a token, or None when it is not hexadecimal."""
+        try:
+            return bytes.fromhex(challenge)
+        except (TypeError, ValueError):
+            return None
+
+    def generate(self):
+        token = generate_challenge()
+        expiry_date = timezone.now() + self.expiration
+        self.queryset.create(token=self._token(token), expires=expiry_date)
+        return self.manager.model(challenge=token, expires=expiry_date)
+
+    def is_active(self, challenge):
+        token = self._token(challenge)
+        now = timezone.now()
+        return (
+            token is not None
+            and self.queryset.filter(token=token, expires__gte=now).exists()
+        )
+
+    def consume(self, challenge):
+        """Atomically uses the challenge. Returns True if it was still active.
+
+        The validation and the removal happen in a single ``DELETE`` statement,
+        as on ``DatabaseChallengeStore``.
+        """
+        token = self._token(challenge)
+        if token is None:
+            return False
+        active = self.queryset.filter(token=token, expires__gte=timezone.now())
+        return active.delete()[0] > 0
+
+    def invalidate(self, challenge):
+        token = self._token(challenge)
+        if token is not None:
+            self.queryset.filter(token=token).delete()
+
+    def clean_expired(self, batch_size=None):
+        """Delete expired challenges. Returns nº of entries removed.
+
+        When ``batch_size`` is provided, at most that number of challenges
+        are removed.
+        """
+        expired = self.queryset.filter(expires__lt=timezone.now())
+        if batch_size is not None:
+            pks = expired.order_by("expires").values_list("pk", flat=True)
+            expired = self.queryset.filter(pk__in=list(pks[:batch_size]))
+        return expired.delete()[0]
+
+    def copy_from_database(self, batch_size=1000):
+        """Copies the active challenges of the ``Challenge`` table, so the ones
+        handed out before switching stores can still be used. Returns nº of
+        challenges copied."""
+        from .models import CompactChallenge
+
+        active = self.manager.filter(issued=True, expires__gte=timezone.now())
+        rows = active.order_by("pk").values_list("challenge", "expires")
+        copied = 0
+        batch = []
+        for challenge, expires in rows.iterator(chunk_size=batch_size):
+            token = self._token(challenge)
+            if token is None:
+                continue
+            batch.append(CompactChallenge(token=token, expires=expires))
+            if len(batch) >= batch_size:
+                self.queryset.bulk_create(batch, ignore_conflicts=True)
+                copied += len(batch)
+                batch = []
+        if batch:
+            self.queryset.bulk_create(batch, ignore_conflicts=True)
+            copied += len(batch)
+        return copied
+
+
+def partition_window(moment, interval):
+    """Returns the ``(start, end)`` of the partition window of ``moment``.
+
+    Windows are aligned to the Unix epoch, so every process computes the
+    same boundaries.
+    """
+    step = interval.total_seconds()
+    start = moment.timestamp() // step * step
+    start = datetime.fromtimestamp(start, tz=dt_timezone.utc)
+    return start, start + interval
+
+
+def parse_partition_bound(expression):
+    """Returns the upper bound of a range partition, from the output of
+    ``pg_get_expr``. None for the default partition."""
+    match = re.search(r"TO \('([^']+)'\)", expression)
+    return parse_datetime(match.group(1)) if match else None
+
+
+class PartitionedChallengeStore(CompactChallengeStore):
+    """Keeps challenges on a PostgreSQL table partitioned by expiry date.
+
+    Each partition holds the challenges expiring during a window of
+    ``DJCL_CHALLENGE_PARTITION_INTERVAL`` minutes. Once the window is over
+    the whole partition is dropped, instead of deleting its rows one by one
+    and leaving the table bloated. Requires PostgreSQL 11+.
+
+    Partitions must be created ahead of time with the
+    ``challenge_partitions`` management command. Challenges that do not fit
+    in any of them are kept on a default partition, cleaned row by row.
+    """
+
+    def __init__(self, manager):
+        super().__init__(manager)
+        if connections[manager.db].vendor != "postgresql":
+            raise ImproperlyConfigured("PartitionedChallengeStore requires PostgreSQL")
+
+    @property
+    def queryset(self):
+        from .models import PartitionedChallenge
+
+        return PartitionedChallenge.objects.using(self.manager.db)
+
+    @property
+    def interval(self):
+        """Time span of each partition, as a ``timedelta``."""
+        minutes = getattr(settings, "DJCL_CHALLENGE_PARTITION_INTERVAL", 60)
+        return timedelta(minutes=minutes)
+
+    @property
+    def connection(self):
+        return connections[self.manager.db]
+
+    @property
+    def table(self):
+        return self.queryset.model._meta.db_table
+
+    def partition_name(self, start):
+        return f"{self.table}_{start:%Y%m%d%H%M}"
+
+    def partitions(self):
+        """Returns the ``(name, upper bound, estimated rows)`` of each
+        partition. The upper bound of the default partition is None."""
+        sql = (
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass"
+        )
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, [self.table])
+            rows = cursor.fetchall()
+        return [
+            (name, parse_partition_bound(bound), max(int(tuples), 0))
+            for name, bound, tuples in rows
+        ]
+
+    def create_partitions(self, windows=2):
+        """Creates the partitions of the current window, of the challenges
+        issued now, and of the next ``windows`` windows after those.
+
+        PostgreSQL cannot create a partition for a range that already has
+        rows on the default partition, so those windows are skipped. Their
+        challenges stay on the default partition until they expire. Returns
+        nº of partitions created and the ``(name, error)`` of the ones that
+        failed.
+        """
+        existing = {name for name, _bound, _rows in self.partitions()}
+        qn = self.connection.ops.quote_name
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"SELECT MAX(expires) FROM {qn(self.table + '_default')}")
+            latest_default = cursor.fetchone()[0]
+
+        now = timezone.now()
+        start, end = partition_window(now, self.interval)
+        last, _end = partition_window(now + self.expiration, self.interval)
+        last += self.interval * windows
+        if latest_default is not None and latest_default >= start:
+            start, end = partition_window(latest_default, self.interval)
+            start, end = end, end + self.interval
+
+        created = 0
+        errors = []
+        while start <= last:
+            name = self.partition_name(start)
+            if name not in existing:
+                try:
+                    with transaction.atomic(using=self.manager.db):
+                        with self.connection.cursor() as cursor:
+                            cursor.execute(
+                                f"CREATE TABLE IF NOT EXISTS {qn(name)} PARTITION "
+                                f"OF {qn(self.table)} FOR VALUES FROM (%s) TO (%s)",
+                                [start, end],
+                            )
+                except DatabaseError as e:
+                    errors.append((name, e))
+                else:
+                    created += 1
+            start, end = end, end + self.interval
+        return created, errors
+
+    def drop_expired_partitions(self):
+        """Drops the partitions whose challenges have all expired. Returns nº
+        of partitions dropped and the estimated nº of challenges on them."""
+        now = timezone.now()
+        qn = self.connection.ops.quote_name
+        dropped = rows = 0
+        for name, bound, tuples in self.partitions():
+            if bound is None or bound > now:
+                continue
+            with self.connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {qn(name)}")
+            dropped += 1
+            rows += tuples
+        return dropped, rows
+
+    def clean_expired(self, batch_size=None):
+        """Deletes the expired challenges on the default partition. Returns nº
+        of entries removed.
+
+        Expired partitions are left to the ``challenge_partitions`` command,
+        since dropping them locks the whole table while logins use it.
+
+        When ``batch_size`` is provided, at most that number of challenges
+        are deleted.
+        """
+        default = self.connection.ops.quote_name(f"{self.table}_default")
+        sql = f"DELETE FROM {default} WHERE expires < %s"
+        params = [timezone.now()]
+        if batch_size is not None:
+            sql = (
+                f"DELETE FROM {default} WHERE ctid IN "
+                f"(SELECT ctid FROM {default} WHERE expires < %s LIMIT %s)"
+            )
+            params.append(batch_size)
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
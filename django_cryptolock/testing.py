@@ -0,0 +1,50 @@
+from contextlib import ContextDecorator
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block of code runs more queries than its budget."""
+
+
+class query_budget(ContextDecorator):
+    """Fails when the wrapped code runs more than ``max_queries`` queries.
+
+    Can be used as a context manager or as a decorator. The executed queries
+    are available on ``captured_queries``, so they can be inspected::
+
+        with query_budget(5) as budget:
+            client.post(url, data)
+        print(len(budget))
+    """
+
+    def __init__(self, max_queries: int, using: str = DEFAULT_DB_ALIAS):
+        self.max_queries = max_queries
+        self.using = using
+        self.context = None
+
+    @property
+    def captured_queries(self):
+        return self.context.captured_queries if self.context else []
+
+    def __len__(self):
+        return len(self.captured_queries)
+
+    def __enter__(self):
+        self.context = CaptureQueriesContext(connections[self.using])
+        self.context.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.context.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None or len(self) <= self.max_queries:
+            return False
+
+        queries = "\n".join(
+            f"{i}. {query['sql']}" for i, query in enumerate(self.captured_queries, 1)
+        )
+        raise QueryBudgetExceeded(
+            f"{len(self)} queries executed, the budget is {self.max_queries}:\n"
+            f"{queries}"
+        )
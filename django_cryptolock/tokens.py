@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+TOKEN_REUSE = "reuse"
+TOKEN_ROTATE = "rotate"
+TOKEN_SIGNED = "signed"
+
+SIGNED_TOKEN_SALT = "django_cryptolock.token"
+
+
+def get_signed_token_expiration() -> timedelta:
+    minutes = getattr(settings, "DJCL_SIGNED_TOKEN_EXPIRATION", 60 * 24)
+    return timedelta(minutes=minutes)
+
+
+def issue_token(user) -> str:
+    """Returns an API token for the user, according to ``DJCL_TOKEN_ISSUANCE``.
+
+    * ``"reuse"`` (default): keeps the user's existing token, creating it on
+      the first login.
+    * ``"rotate"``: replaces the key of the user's token in place.
+    * ``"signed"``: a stateless token, signed with the ``SECRET_KEY`` and
+      accepted by ``SignedTokenAuthentication``. Nothing is stored.
+    """
+    mode = getattr(settings, "DJCL_TOKEN_ISSUANCE", TOKEN_REUSE)
+    if mode == TOKEN_SIGNED:
+        signer = signing.TimestampSigner(salt=SIGNED_TOKEN_SALT)
+        return signer.sign(str(user.pk))
+
+    if mode == TOKEN_ROTATE:
+        key = Token().generate_key()
+        tokens = Token.objects.filter(user=user)
+        if tokens.update(key=key, created=timezone.now()):
+            return key
+        try:
+            with transaction.atomic():
+                return Token.objects.create(user=user, key=key).key
+        except IntegrityError:
+            # A concurrent first login created the token meanwhile
+            tokens.update(key=key, created=timezone.now())
+            return key
+
+    token, _created = Token.objects.get_or_create(user=user)
+    return token.key
+
+
+class SignedTokenAuthentication(TokenAuthentication):
+    """DRF authentication for the stateless tokens issued by ``issue_token``.
+
+    Expects the same ``Authorization: Token <token>`` header. The tokens
+    expire after ``DJCL_SIGNED_TOKEN_EXPIRATION`` minutes.
+    """
+
+    def authenticate_credentials(self, key):
+        signer = signing.TimestampSigner(salt=SIGNED_TOKEN_SALT)
+        max_age = get_signed_token_expiration().total_seconds()
+        try:
+            user_pk = signer.unsign(key, max_age=max_age)
+        except signing.BadSignature:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+
+        user = get_user_model().objects.filter(pk=user_pk).first()
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+
+        return (user, key)
@@ -1,11 +1,12 @@
 # -*- coding: utf-8 -*-
 from django.conf.urls import url
 
-from .views import CryptoLockLoginView, CryptoLockSignUpView
+from .views import CryptoLockChallengeView, CryptoLockLoginView, CryptoLockSignUpView
 
 
 app_name = "django_cryptolock"
 urlpatterns = [
     url(r"login", CryptoLockLoginView.as_view(), name="login"),
     url(r"signup", CryptoLockSignUpView.as_view(), name="signup"),
+    url(r"challenge", CryptoLockChallengeView.as_view(), name="challenge"),
 ]
@@ -1,28 +1,106 @@
+import hashlib
+import json
 import warnings
-from typing import Union
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple, Union
 from secrets import token_hex
+from urllib.parse import parse_qs, urlparse, urlunparse
 
 from django.conf import settings
+from django.core.cache import caches
 from django.http.request import HttpRequest
+from django.utils.crypto import constant_time_compare, salted_hmac
 from django.utils.translation import gettext_lazy as _
 
-from monerorpc.authproxy import AuthServiceProxy
+from monerorpc.authproxy import JSONRPCException
 from pybitid import bitid
 
+from .metrics import (
+    RPC_ERROR,
+    SIGNATURE_VERIFICATION_SECONDS,
+    VERIFICATION_CACHE_HITS,
+    count_verification,
+    increment,
+    timer,
+)
+from .rpc import (
+    RPC_TRANSPORT_ERRORS,
+    RPC_UNAVAILABLE,
+    get_wallet_rpc,
+    get_async_wallet_rpc,
+    is_wallet_rpc_available,
+)
+from .signatures import verify_monero_message
+
+
+def get_verification_cache_key(network: str, *parts: str) -> Optional[str]:
+    """Returns the cache key of a verification result, or None when the
+    verification cache is disabled (``DJCL_VERIFICATION_CACHE_TIMEOUT``)."""
+    if not getattr(settings, "DJCL_VERIFICATION_CACHE_TIMEOUT", 0):
+        return None
+    digest = hashlib.sha256("\0".join((network,) + parts).encode()).hexdigest()
+    return f"djcl:verification:{digest}"
+
+
+def _get_verification_cache():
+    return caches[getattr(settings, "DJCL_VERIFICATION_CACHE", "default")]
+
+
+def get_cached_verification(key: Optional[str], network: str) -> Optional[bool]:
+    """Returns the result of a recent identical verification, if any."""
+    if key is None:
+        return None
+    is_valid = _get_verification_cache().get(key)
+    if is_valid is not None:
+        increment(VERIFICATION_CACHE_HITS, network=network)
+    return is_valid
+
+
+def cache_verification(key: Optional[str], is_valid: bool):
+    if key is None:
+        return
+    timeout = settings.DJCL_VERIFICATION_CACHE_TIMEOUT
+    _get_verification_cache().set(key, is_valid, timeout)
+
 
 def verify_monero_signature(address: str, challenge: str, signature: str) -> bool:
-    """Makes a request to wallet RPC to verify address and signature."""
-    protocol = settings.DJCL_MONERO_WALLET_RPC_PROTOCOL
-    host = settings.DJCL_MONERO_WALLET_RPC_HOST
-    user = settings.DJCL_MONERO_WALLET_RPC_USER
-    pwd = settings.DJCL_MONERO_WALLET_RPC_PASS
-    wallet_rpc = AuthServiceProxy(f"{protocol}://{user}:{pwd}@{host}/json_rpc")
-
-    result = wallet_rpc.verify(
-        {"data": challenge, "address": address, "signature": signature}
-    )
+    """Verifies the signature for the given address and challenge.
 
-    return result.get("good", False)
+    By default a request is made to one of the wallet RPC endpoints, reusing
+    one of the pooled connections. When ``DJCL_MONERO_VERIFICATION`` is set to
+    ``"local"`` the signature is verified in-process instead.
+    """
+    key = get_verification_cache_key("monero", address, challenge, signature)
+    cached = get_cached_verification(key, "monero")
+    if cached is not None:
+        return cached
+
+    with timer(SIGNATURE_VERIFICATION_SECONDS, network="monero"):
+        if getattr(settings, "DJCL_MONERO_VERIFICATION", "rpc") == "local":
+            is_valid = verify_monero_message(address, challenge, signature)
+        else:
+            try:
+                result = get_wallet_rpc().call(
+                    "verify",
+                    {"data": challenge, "address": address, "signature": signature},
+                )
+            except JSONRPCException:
+                count_verification("monero", RPC_ERROR)
+                raise
+            is_valid = result.get("good", False)
+
+    count_verification("monero", is_valid)
+    cache_verification(key, is_valid)
+    return is_valid
+
+
+def is_monero_verification_available() -> bool:
+    """False when Monero signatures cannot be verified right now, because the
+    wallet RPC circuit breaker is open."""
+    if getattr(settings, "DJCL_MONERO_VERIFICATION", "rpc") == "local":
+        return True
+    return is_wallet_rpc_available()
 
 
 def verify_bitcoin_signature(
@@ -34,9 +112,21 @@ def verify_bitcoin_signature(
         warnings.warn(_("Please configure the bitcoin network in the settings file"))
     is_testnet = True if network == "testnet" else False
     callback_uri = request.build_absolute_uri()
-    return bitid.challenge_valid(
-        address, signature, challenge, callback_uri, is_testnet
+    key = get_verification_cache_key(
+        "bitcoin", address, challenge, signature, callback_uri, str(is_testnet)
     )
+    cached = get_cached_verification(key, "bitcoin")
+    if cached is not None:
+        return cached
+
+    with timer(SIGNATURE_VERIFICATION_SECONDS, network="bitcoin"):
+        is_valid = bitid.challenge_valid(
+            address, signature, challenge, callback_uri, is_testnet
+        )
+
+    count_verification("bitcoin", is_valid)
+    cache_verification(key, is_valid)
+    return is_valid
 
 
 def verify_signature(
@@ -54,7 +144,193 @@ def verify_signature(
     return valid_sig
 
 
+def _verify_bitcoin_item(item: Tuple[str, str, str, str, bool]) -> bool:
+    address, challenge, signature, callback_uri, is_testnet = item
+    return bitid.challenge_valid(
+        address, signature, challenge, callback_uri, is_testnet
+    )
+
+
+def _verify_monero_item(item: Tuple[str, str, str]) -> bool:
+    return verify_monero_message(*item)
+
+
+def _verify_monero_rpc_item(item: Tuple[str, str, str]) -> bool:
+    """Errors returned by the wallet for this item (such as an invalid
+    address) make it invalid, as on local verification. Transport errors
+    still raise, since no item of the batch can be verified."""
+    try:
+        return verify_monero_signature(*item)
+    except JSONRPCException as e:
+        if e.code in RPC_TRANSPORT_ERRORS or e.code == RPC_UNAVAILABLE:
+            raise
+        return False
+
+
+def _get_callback_uri(challenge: str) -> str:
+    """Returns the callback URI a BitId challenge was issued for."""
+    parsed = urlparse(challenge)
+    scheme = "http" if parse_qs(parsed.query).get("u") == ["1"] else "https"
+    return urlunparse((scheme, parsed.netloc, parsed.path, "", "", ""))
+
+
+def _run_batch(executor_class, func, items, max_workers):
+    if max_workers == 1 or len(items) < 2:
+        return [func(item) for item in items]
+    with executor_class(max_workers=max_workers) as executor:
+        return list(executor.map(func, items, chunksize=1))
+
+
+def verify_signatures_batch(
+    items: Iterable[Tuple[str, str, str, str]],
+    callback_uri: Optional[str] = None,
+    max_workers: Optional[int] = None,
+) -> List[bool]:
+    """Verifies many ``(network, address, challenge, signature)`` items.
+
+    Returns the results in the same order as the items. Items are grouped by
+    network: Bitcoin signatures (and Monero ones, when verified locally) are
+    checked in a process pool, while wallet RPC verifications are sent
+    concurrently over the pooled connections.
+
+    ``callback_uri`` is the URI the Bitcoin challenges were issued for. When
+    not provided, only the signature of each challenge is checked.
+
+    Items rejected by the wallet RPC are invalid, but a ``JSONRPCException``
+    is raised when the wallet RPC cannot be reached.
+    """
+    items = list(items)
+    results = [False] * len(items)
+    groups = {}
+    for index, (network, address, challenge, signature) in enumerate(items):
+        groups.setdefault(network, []).append(index)
+
+    bitcoin = groups.get("Bitcoin", [])
+    if bitcoin:
+        is_testnet = getattr(settings, "DJCL_BITCOIN_NETWORK", None) == "testnet"
+        args = []
+        for index in bitcoin:
+            _network, address, challenge, signature = items[index]
+            uri = callback_uri or _get_callback_uri(challenge)
+            args.append((address, challenge, signature, uri, is_testnet))
+        valid = _run_batch(ProcessPoolExecutor, _verify_bitcoin_item, args, max_workers)
+        for index, is_valid in zip(bitcoin, valid):
+            results[index] = is_valid
+
+    monero = groups.get("Monero", [])
+    if monero:
+        args = [items[index][1:] for index in monero]
+        if getattr(settings, "DJCL_MONERO_VERIFICATION", "rpc") == "local":
+            executor_class, func = ProcessPoolExecutor, _verify_monero_item
+        else:
+            executor_class, func = ThreadPoolExecutor, _verify_monero_rpc_item
+            if max_workers is None:
+                max_workers = get_wallet_rpc().size
+        valid = _run_batch(executor_class, func, args, max_workers)
+        for index, is_valid in zip(monero, valid):
+            results[index] = is_valid
+
+    return results
+
+
+async def averify_monero_signature(
+    address: str, challenge: str, signature: str
+) -> bool:
+    """Async version of ``verify_monero_signature``.
+
+    The wallet RPC request does not block the event loop. Requires ``httpx``.
+    Local verification runs on a worker thread.
+    """
+    from asgiref.sync import sync_to_async
+
+    key = get_verification_cache_key("monero", address, challenge, signature)
+    if key is not None:
+        cached = await sync_to_async(get_cached_verification)(key, "monero")
+        if cached is not None:
+            return cached
+
+    with timer(SIGNATURE_VERIFICATION_SECONDS, network="monero"):
+        if getattr(settings, "DJCL_MONERO_VERIFICATION", "rpc") == "local":
+            verify = sync_to_async(verify_monero_message, thread_sensitive=False)
+            is_valid = await verify(address, challenge, signature)
+        else:
+            try:
+                result = await get_async_wallet_rpc().call(
+                    "verify",
+                    {"data": challenge, "address": address, "signature": signature},
+                )
+            except JSONRPCException:
+                count_verification("monero", RPC_ERROR)
+                raise
+            is_valid = result.get("good", False)
+
+    count_verification("monero", is_valid)
+    if key is not None:
+        await sync_to_async(cache_verification)(key, is_valid)
+    return is_valid
+
+
+async def averify_bitcoin_signature(
+    address: str, challenge: str, signature: str, request: HttpRequest
+) -> bool:
+    """Async version of ``verify_bitcoin_signature``, runs on a worker thread."""
+    from asgiref.sync import sync_to_async
+
+    verify = sync_to_async(verify_bitcoin_signature, thread_sensitive=False)
+    return await verify(address, challenge, signature, request)
+
+
+async def averify_signature(
+    network: str, address: str, challenge: str, signature: str, request: HttpRequest
+):
+    valid_sig = False
+
+    if network == "Bitcoin":
+        valid_sig = await averify_bitcoin_signature(
+            address, challenge, signature, request=request
+        )
+    elif network == "Monero":
+        valid_sig = await averify_monero_signature(address, challenge, signature)
+
+    return valid_sig
+
+
+def get_request_data(request: HttpRequest):
+    """Returns the submitted data, sent as JSON or as a regular form."""
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+    return request.POST
+
+
 def generate_challenge():
     """Generates a new random challenge for the authentication."""
     num_bytes = getattr(settings, "DJCL_CHALLENGE_BYTES", 16)
     return token_hex(num_bytes)
+
+
+def _challenge_hmac(value: str) -> str:
+    return salted_hmac("django_cryptolock.challenge", value).hexdigest()
+
+
+def sign_challenge(nonce: str, expires: datetime) -> str:
+    """Builds a self-contained challenge, with its expiry date and an HMAC."""
+    value = f"{nonce}.{int(expires.timestamp())}"
+    return f"{value}.{_challenge_hmac(value)}"
+
+
+def unsign_challenge(token: str) -> Optional[Tuple[str, datetime]]:
+    """Returns the nonce and expiry date of a signed challenge.
+
+    Returns None if the signature is not valid. The expiry date is not checked.
+    """
+    value, sep, mac = token.rpartition(".")
+    nonce, sep, expires = value.partition(".")
+    if not nonce or not expires.isdigit():
+        return None
+    if not constant_time_compare(mac, _challenge_hmac(value)):
+        return None
+    return nonce, datetime.fromtimestamp(int(expires), tz=timezone.utc)
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
@@ -5,34 +7,73 @@ from django.conf import settings
 from monero.address import Address
 from pybitid.bitid import address_valid
 
+# Maximum number of validation results kept for each network
+ADDRESS_CACHE_SIZE = 1024
 
-def validate_monero_address(value):
+BASE58_ALPHABET = frozenset(
+    "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+)
+
+
+def is_monero_address_format(value):
+    """Cheap check for the shape of a Monero address, without decoding it."""
+    return len(value) == 95 and BASE58_ALPHABET.issuperset(value)
+
+
+def is_bitcoin_address_format(value):
+    """Cheap check for the shape of a Bitcoin address, without decoding it."""
+    return 26 <= len(value) <= 35 and BASE58_ALPHABET.issuperset(value)
+
+
+@lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def _monero_address_error(value, network):
+    """Returns the message and params of the validation error, or None.
+
+    The network is part of the arguments, so changing ``DJCL_MONERO_NETWORK``
+    does not reuse previous results.
+    """
     try:
         address = Address(value)
     except ValueError as e:
-        raise ValidationError(
-            _("%(value)s is not a valid address"), params={"value": value}
-        )
+        return _("%(value)s is not a valid address"), {"value": value}
 
-    network = getattr(settings, "DJCL_MONERO_NETWORK", None)
     if not network:
-        raise ValidationError(
-            _("Please configure the monero network in the settings file")
-        )
+        return _("Please configure the monero network in the settings file"), None
     if network == "mainnet" and not address.is_mainnet():
-        raise ValidationError(_("Invalid address for mainnet"))
+        return _("Invalid address for mainnet"), None
     elif network == "stagenet" and not address.is_stagenet():
-        raise ValidationError(_("Invalid address for stagenet"))
+        return _("Invalid address for stagenet"), None
     elif network == "testnet" and not address.is_testnet():
-        raise ValidationError(_("Invalid address for testnet"))
+        return _("Invalid address for testnet"), None
+    return None
 
 
-def validate_bitcoin_address(value):
-    network = getattr(settings, "DJCL_BITCOIN_NETWORK", None)
+@lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def _bitcoin_address_error(value, network):
+    """Returns the message and params of the validation error, or None.
+
+    The network is part of the arguments, so changing ``DJCL_BITCOIN_NETWORK``
+    does not reuse previous results.
+    """
     if not network:
-        raise ValidationError(
-            _("Please configure the monero network in the settings file")
-        )
+        return _("Please configure the monero network in the settings file"), None
     testnet = True if network == "testnet" else False
     if not address_valid(value, is_testnet=testnet):
-        raise ValidationError(_(f"Invalid address for {network}"))
+        return _(f"Invalid address for {network}"), None
+    return None
+
+
+def validate_monero_address(value):
+    network = getattr(settings, "DJCL_MONERO_NETWORK", None)
+    error = _monero_address_error(value, network)
+    if error:
+        message, params = error
+        raise ValidationError(message, params=params)
+
+
+def validate_bitcoin_address(value):
+    network = getattr(settings, "DJCL_BITCOIN_NETWORK", None)
+    error = _bitcoin_address_error(value, network)
+    if error:
+        message, params = error
+        raise ValidationError(message, params=params)
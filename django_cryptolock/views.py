@@ -1,56 +1,79 @@
 # -*- coding: utf-8 -*-
+from urllib.parse import urlparse
+
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.views import LoginView
-from django.views.generic import FormView
+from django.views.generic import FormView, View
 from django.forms.utils import ErrorList
 from django.conf import settings
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import never_cache
 
 from monerorpc.authproxy import JSONRPCException
 
 from .forms import SimpleSignUpForm, SimpleLoginForm
 from .utils import verify_signature
-from .models import Address, Challenge
-from .mixins import CreateUserMixin
+from .models import Challenge
+from .mixins import (
+    APIRateLimitMixin,
+    CreateChallengeMixin,
+    CreateUserMixin,
+    RateLimitMixin,
+)
 
 
-class CryptoLockLoginView(LoginView):
+class CryptoLockLoginView(RateLimitMixin, LoginView):
     template_name = "django_cryptolock/login.html"
     form_class = SimpleLoginForm
+    rate_limit_scope = "login"
 
     def form_valid(self, form):
         response = super().form_valid(form)
-        challenge = form.cleaned_data["challenge"]
-        Challenge.objects.invalidate(challenge)
-        Challenge.objects.clean_expired()
+        Challenge.objects.maybe_clean_expired()
+        return response
+
+    def form_invalid(self, form):
+        response = super().form_invalid(form)
+        if form.rpc_unavailable():
+            response.status_code = 503
         return response
 
 
-class CryptoLockSignUpView(CreateUserMixin, FormView):
+class CryptoLockSignUpView(RateLimitMixin, CreateUserMixin, FormView):
     template_name = "django_cryptolock/signup.html"
     form_class = SimpleSignUpForm
+    rate_limit_scope = "signup"
 
     def get_form(self, form_class=None):
         return self.form_class(request=self.request, **self.get_form_kwargs())
 
     def form_valid(self, form):
-        username = form.cleaned_data["username"]
-        address = form.cleaned_data["address"]
-        challenge = form.cleaned_data["challenge"]
-        signature = form.cleaned_data["signature"]
-        network = [n[1] for n in Address.NETWORKS if n[0] == form.network][0]
-
         try:
-            valid_sig = verify_signature(
-                network, address, challenge, signature, self.request
-            )
+            valid_sig = verify_signature(*self.get_verification_args(form))
         except JSONRPCException:
-            form._errors["__all__"] = ErrorList(
-                [_("Error connecting to Monero daemon")]
-            )
-            return self.form_invalid(form)
+            return self.handle_rpc_error(form)
+
+        return self.handle_verification(form, valid_sig)
+
+    def handle_rpc_error(self, form):
+        form._errors["__all__"] = ErrorList([_("Error connecting to Monero daemon")])
+        return self.form_invalid(form)
 
+    def handle_verification(self, form, valid_sig):
+        """Creates the user when the signature is valid."""
         if valid_sig:
-            self.create_user(username, challenge, address, form.network)
+            username = form.cleaned_data["username"]
+            address = form.cleaned_data["address"]
+            user = self.create_user(
+                username, form.challenge_token, address, form.network
+            )
+            if user is None:
+                form._errors["challenge"] = ErrorList(
+                    [_("Invalid or outdated challenge")]
+                )
+                return self.form_invalid(form)
             return super().form_valid(form)
         else:
             form._errors["signature"] = ErrorList([_("Invalid signature")])
@@ -58,3 +81,29 @@ class CryptoLockSignUpView(CreateUserMixin, FormView):
 
     def get_success_url(self):
         return settings.LOGIN_REDIRECT_URL
+
+
+@method_decorator(never_cache, name="dispatch")
+class CryptoLockChallengeView(APIRateLimitMixin, CreateChallengeMixin, View):
+    """Returns a new challenge as JSON, for clients that fetch it on demand.
+
+    BitId challenges must be issued for the URL the signature is submitted
+    to. It is given by the ``callback`` parameter, a path on this site, and
+    defaults to the login view.
+    """
+
+    http_method_names = ["get"]
+    rate_limit_scope = "challenge"
+
+    def get(self, request, *args, **kwargs):
+        callback = request.GET.get("callback") or self.get_default_callback()
+        parsed = urlparse(callback)
+        if parsed.scheme or parsed.netloc or not callback.startswith("/"):
+            return JsonResponse({"callback": [_("Invalid callback")]}, status=400)
+
+        data = self.get_challenge_data(request, request.build_absolute_uri(callback))
+        return JsonResponse(data)
+
+    def get_default_callback(self):
+        namespace = self.request.resolver_match.namespace
+        return reverse(f"{namespace}:login" if namespace else "login")
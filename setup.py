@@ -58,7 +58,11 @@ setup(
     packages=["django_cryptolock"],
     include_package_data=True,
     install_requires=requirements,
-    extras_require={"drf": ["djangorestframework>=3.9.3"]},
+    extras_require={
+        "drf": ["djangorestframework>=3.9.3"],
+        "async": ["httpx"],
+        "prometheus": ["prometheus_client"],
+    },
     license="MIT",
     zip_safe=False,
     keywords="django-cryptolock",
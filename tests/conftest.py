@@ -0,0 +1,28 @@
+import pytest
+
+from django_cryptolock.rpc import close_wallet_rpc_pools
+from django_cryptolock.testing import query_budget as query_budget_class
+
+
+@pytest.fixture(autouse=True)
+def reset_wallet_rpc():
+    """Wallet RPC connections and circuit breakers are not shared by tests."""
+    yield
+    close_wallet_rpc_pools()
+
+
+@pytest.fixture
+def query_budget():
+    """Context manager that fails the test when a query budget is exceeded."""
+    return query_budget_class
+
+
+@pytest.fixture
+def session_settings(settings):
+    """Enables sessions (stored on signed cookies) for the HTML views."""
+    settings.SESSION_ENGINE = "django.contrib.sessions.backends.signed_cookies"
+    settings.MIDDLEWARE = [
+        "django.contrib.sessions.middleware.SessionMiddleware",
+        "django.contrib.auth.middleware.AuthenticationMiddleware",
+    ]
+    return settings
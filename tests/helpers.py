@@ -1,9 +1,15 @@
 """
 Set of functions and constants that help testing the existing functionality
 """
+import secrets
+from binascii import hexlify
+
+from monero import base58
 from pybitid import bitid
 
+from benchmarks.stub_rpc import StubWalletRPCServer  # noqa: F401
 from django_cryptolock.models import Challenge
+from django_cryptolock import signatures
 
 DUMMY_CREDS = {"username": "test", "password": "insecure"}
 VALID_MONERO_ADDRESS = "46fYuhPAdsxMbEeMg97LhSbFPamdiCw7C6b19VEcZSmV6xboWFZuZQ9MTbj1wLszhUExHi63CMtsWjDTrRDqegZiPVebgYq"
@@ -29,3 +35,40 @@ def set_bitcoin_settings(settings):
 
 def gen_challenge():
     return bitid.build_uri(EXAMPLE_LOGIN_URL, Challenge.objects.generate())
+
+
+def _public_key(secret):
+    point = signatures._double_scalarmult_base(0, signatures.BASE, secret)
+    return signatures._encode_point(point)
+
+
+def make_monero_account(netbyte=24):
+    """Creates random keys and the matching address (stagenet by default)."""
+    spend_secret = secrets.randbelow(signatures.L - 1) + 1
+    view_secret = secrets.randbelow(signatures.L - 1) + 1
+    data = bytes([netbyte]) + _public_key(spend_secret) + _public_key(view_secret)
+    checksum = signatures.keccak_256(data).digest()[:4]
+    address = base58.encode(hexlify(data + checksum).decode())
+    return address, spend_secret, view_secret
+
+
+def sign_monero_message(address, secret, message, version=2, mode=0):
+    """Signs a message the same way the Monero wallet does."""
+    public_key = _public_key(secret)
+    data = message.encode()
+    if version == 1:
+        prefix_hash = signatures.keccak_256(data).digest()
+        header = signatures.SIGNATURE_V1_HEADER
+    else:
+        decoded = bytes.fromhex(base58.decode(address))
+        prefix_hash = signatures.get_message_hash(
+            data, decoded[1:33], decoded[33:65], mode
+        )
+        header = signatures.SIGNATURE_V2_HEADER
+
+    k = secrets.randbelow(signatures.L - 1) + 1
+    commitment = _public_key(k)
+    c = signatures._hash_to_scalar(prefix_hash, public_key, commitment)
+    r = (k - c * secret) % signatures.L
+    sig = c.to_bytes(32, "little") + r.to_bytes(32, "little")
+    return header + base58.encode(hexlify(sig).decode())
@@ -1,5 +1,6 @@
 from unittest.mock import patch
 
+from django.core.cache import cache
 from django.urls import reverse_lazy
 from django.contrib.auth import get_user_model
 
@@ -9,11 +10,14 @@ from rest_framework.status import (
     HTTP_201_CREATED,
     HTTP_405_METHOD_NOT_ALLOWED,
     HTTP_400_BAD_REQUEST,
+    HTTP_503_SERVICE_UNAVAILABLE,
 )
 from model_mommy import mommy
+from pybitid import bitid
 import pytest
 
 from django_cryptolock.models import Address, Challenge
+from django_cryptolock.rpc import get_circuit_breaker
 from .helpers import (
     VALID_BITCOIN_ADDRESS,
     VALID_MONERO_ADDRESS,
@@ -43,6 +47,61 @@ def test_generate_new_token_login_challenge(api_client):
     assert response.status_code == HTTP_200_OK
     assert "challenge" in response.json().keys()
     assert "expires" in response.json().keys()
+    challenge = Challenge.objects.get()
+    assert response.json()["challenge"] == (
+        f"bitid://testserver/api/token_login?x={challenge.challenge}&u=1"
+    )
+
+
+def test_challenge_view(client):
+    response = client.get(reverse_lazy("django_cryptolock:challenge"))
+
+    assert response.status_code == HTTP_200_OK
+    assert "no-cache" in response["Cache-Control"]
+    challenge = Challenge.objects.get()
+    data = response.json()
+    assert data["challenge"] == bitid.build_uri(
+        "http://testserver/login", challenge.challenge
+    )
+    assert "expires" in data
+
+
+def test_challenge_view_callback(client):
+    url = reverse_lazy("django_cryptolock:challenge")
+    response = client.get(url, {"callback": "/signup?next=/"})
+
+    assert response.status_code == HTTP_200_OK
+    assert response.json()["challenge"].startswith("bitid://testserver/signup?")
+
+
+@pytest.mark.parametrize("callback", ["http://evil.com/login", "//evil.com", "login"])
+def test_challenge_view_invalid_callback(client, callback):
+    url = reverse_lazy("django_cryptolock:challenge")
+    response = client.get(url, {"callback": callback})
+
+    assert response.status_code == HTTP_400_BAD_REQUEST
+    assert "callback" in response.json()
+    assert not Challenge.objects.exists()
+
+
+def test_challenge_uri_accepted_by_login(api_client, settings):
+    set_bitcoin_settings(settings)
+    url = reverse_lazy("api_token_login")
+    mommy.make(Address, address=VALID_BITCOIN_ADDRESS, network=Address.NETWORK_BITCOIN)
+    challenge = api_client.get(url).json()["challenge"]
+
+    with patch("django_cryptolock.backends.verify_bitcoin_signature") as sig_mock:
+        sig_mock.return_value = True
+        response = api_client.post(
+            url,
+            {
+                "challenge": challenge,
+                "address": VALID_BITCOIN_ADDRESS,
+                "signature": "s",
+            },
+        )
+
+    assert response.status_code == HTTP_200_OK
 
 
 @pytest.mark.parametrize(
@@ -75,6 +134,26 @@ def test_token_login_fails_invalid_data(
     assert "Please enter a correct address or signature." in errors["__all__"]
 
 
+def test_token_login_monero_address_without_monero_backend(api_client, settings):
+    set_bitcoin_settings(settings)
+    # Bitcoin only deployments do not need the wallet RPC settings
+    del settings.DJCL_MONERO_WALLET_RPC_PROTOCOL
+    del settings.DJCL_MONERO_WALLET_RPC_HOST
+
+    response = api_client.post(
+        reverse_lazy("api_token_login"),
+        {
+            "challenge": gen_challenge(),
+            "address": VALID_MONERO_ADDRESS,
+            "signature": "something",
+        },
+    )
+
+    assert response.status_code == HTTP_400_BAD_REQUEST
+    errors = response.json()
+    assert "Please enter a correct address or signature." in errors["__all__"]
+
+
 @pytest.mark.parametrize(
     "addr,set_backend,network",
     [
@@ -100,6 +179,7 @@ def test_token_login_succeeds(api_client, settings, addr, set_backend, network):
 
     assert response.status_code == HTTP_200_OK
     assert "token" in response.json().keys()
+    assert not Challenge.objects.all().exists()
 
 
 @pytest.mark.parametrize("method", ["put", "patch", "delete", "head", "options"])
@@ -207,3 +287,156 @@ def test_sign_up_succeeds(api_client, settings, addr, set_backend):
         )
 
     assert response.status_code == HTTP_201_CREATED
+    assert not Challenge.objects.all().exists()
+
+
+def test_sign_up_fails_consumed_challenge(api_client, settings):
+    set_bitcoin_settings(settings)
+    challenge = gen_challenge()
+    data = {
+        "challenge": challenge,
+        "address": VALID_BITCOIN_ADDRESS,
+        "signature": "something",
+        "username": "user",
+    }
+
+    with patch("django_cryptolock.api_views.verify_signature") as sig_mock:
+        sig_mock.return_value = True
+        with patch("django_cryptolock.forms.Challenge.objects.is_active") as active:
+            active.return_value = True
+            Challenge.objects.all().delete()
+            response = api_client.post(reverse_lazy("api_signup"), data)
+
+    assert response.status_code == HTTP_400_BAD_REQUEST
+    assert "Invalid or outdated challenge" in response.json()["challenge"]
+    assert not User.objects.filter(username="user").exists()
+
+
+@pytest.mark.parametrize(
+    "setting,value",
+    [
+        ("DJCL_STATELESS_CHALLENGES", True),
+        ("DJCL_CHALLENGE_STORE", "django_cryptolock.stores.CacheChallengeStore"),
+    ],
+)
+def test_token_login_without_stored_challenges(api_client, settings, setting, value):
+    setattr(settings, setting, value)
+    set_bitcoin_settings(settings)
+    user = mommy.make(User)
+    mommy.make(
+        Address,
+        user=user,
+        address=VALID_BITCOIN_ADDRESS,
+        network=Address.NETWORK_BITCOIN,
+    )
+    challenge = gen_challenge()
+    assert not Challenge.objects.all().exists()
+    data = {
+        "challenge": challenge,
+        "address": VALID_BITCOIN_ADDRESS,
+        "signature": "something",
+    }
+
+    with patch("django_cryptolock.backends.verify_bitcoin_signature") as sig_mock:
+        sig_mock.return_value = True
+        response = api_client.post(reverse_lazy("api_token_login"), data)
+        replay = api_client.post(reverse_lazy("api_token_login"), data)
+
+    assert response.status_code == HTTP_200_OK
+    assert replay.status_code == HTTP_400_BAD_REQUEST
+
+
+def test_token_login_twice_reuses_token(api_client, settings):
+    set_bitcoin_settings(settings)
+    user = mommy.make(User)
+    mommy.make(
+        Address,
+        user=user,
+        address=VALID_BITCOIN_ADDRESS,
+        network=Address.NETWORK_BITCOIN,
+    )
+
+    tokens = []
+    with patch("django_cryptolock.backends.verify_bitcoin_signature") as sig_mock:
+        sig_mock.return_value = True
+        for _ in range(2):
+            response = api_client.post(
+                reverse_lazy("api_token_login"),
+                {
+                    "challenge": gen_challenge(),
+                    "address": VALID_BITCOIN_ADDRESS,
+                    "signature": "something",
+                },
+            )
+            assert response.status_code == HTTP_200_OK
+            tokens.append(response.json()["token"])
+
+    assert tokens[0] == tokens[1]
+
+
+def test_token_login_fails_fast_when_wallet_rpc_is_down(api_client, settings):
+    set_monero_settings(settings)
+    settings.DJCL_MONERO_NETWORK = "mainnet"
+    mommy.make(Address, address=VALID_MONERO_ADDRESS)
+    breaker = get_circuit_breaker()
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    with patch("django_cryptolock.backends.verify_monero_signature") as sig_mock:
+        response = api_client.post(
+            reverse_lazy("api_token_login"),
+            {
+                "challenge": gen_challenge(),
+                "address": VALID_MONERO_ADDRESS,
+                "signature": "something",
+            },
+        )
+
+    assert response.status_code == HTTP_503_SERVICE_UNAVAILABLE
+    assert "Error connecting to Monero daemon" in response.json()["__all__"]
+    assert not sig_mock.called
+
+
+def test_sign_up_fails_fast_when_wallet_rpc_is_down(api_client, settings):
+    set_monero_settings(settings)
+    settings.DJCL_MONERO_NETWORK = "mainnet"
+    breaker = get_circuit_breaker()
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    with patch("django_cryptolock.rpc.WalletRPCPool._call") as call_mock:
+        response = api_client.post(
+            reverse_lazy("api_signup"),
+            {
+                "challenge": gen_challenge(),
+                "address": VALID_MONERO_ADDRESS,
+                "signature": "something",
+                "username": "user",
+            },
+        )
+
+    assert response.status_code == HTTP_503_SERVICE_UNAVAILABLE
+    assert not call_mock.called
+
+
+def test_token_login_replay_fails_with_verification_cache(api_client, settings):
+    set_bitcoin_settings(settings)
+    settings.DJCL_VERIFICATION_CACHE_TIMEOUT = 10
+    cache.clear()
+    mommy.make(Address, address=VALID_BITCOIN_ADDRESS, network=Address.NETWORK_BITCOIN)
+    data = {
+        "challenge": gen_challenge(),
+        "address": VALID_BITCOIN_ADDRESS,
+        "signature": "something",
+    }
+
+    with patch("django_cryptolock.utils.bitid.challenge_valid") as valid_mock:
+        valid_mock.return_value = True
+        first = api_client.post(reverse_lazy("api_token_login"), data)
+        second = api_client.post(reverse_lazy("api_token_login"), data)
+    cache.clear()
+
+    assert first.status_code == HTTP_200_OK
+    # The cached result does not make the consumed challenge valid again
+    assert second.status_code == HTTP_400_BAD_REQUEST
+    assert valid_mock.call_count == 1
@@ -0,0 +1,236 @@
+from unittest.mock import patch
+from urllib.parse import urlencode
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient
+from django.urls import reverse_lazy
+from model_mommy import mommy
+import pytest
+
+from django_cryptolock.backends import aauthenticate
+from django_cryptolock.models import Address, Challenge
+from django_cryptolock.rpc import AsyncWalletRPCBalancer, AsyncWalletRPCClient
+from .helpers import (
+    VALID_BITCOIN_ADDRESS,
+    StubWalletRPCServer,
+    gen_challenge,
+    make_monero_account,
+    set_bitcoin_settings,
+    set_monero_settings,
+    sign_monero_message,
+)
+
+User = get_user_model()
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def async_client():
+    return AsyncClient()
+
+
+@pytest.fixture
+def wallet_rpc(settings):
+    with StubWalletRPCServer() as server:
+        settings.DJCL_MONERO_WALLET_RPC_HOST = server.host
+        yield server
+
+
+@pytest.fixture
+def monero_user(settings):
+    set_monero_settings(settings)
+    address, spend_secret, _view_secret = make_monero_account()
+    user = mommy.make(User)
+    mommy.make(Address, user=user, address=address, network=Address.NETWORK_MONERO)
+    return user, address, spend_secret
+
+
+def post(client, url, data, content_type="application/x-www-form-urlencoded"):
+    if content_type != "application/json":
+        data = urlencode(data)
+
+    async def request():
+        return await client.post(url, data, content_type=content_type)
+
+    return async_to_sync(request)()
+
+
+def test_async_rpc_client_reuses_connection(wallet_rpc):
+    async def run():
+        client = AsyncWalletRPCClient(f"http://{wallet_rpc.host}/json_rpc")
+        results = [await client.call("verify", {}) for _ in range(5)]
+        await client.close()
+        return results
+
+    assert async_to_sync(run)() == [{"good": True}] * 5
+    assert len(wallet_rpc.connections) == 1
+
+
+def test_async_rpc_balancer_fails_over(wallet_rpc):
+    async def run():
+        clients = [
+            AsyncWalletRPCClient("http://127.0.0.1:1/json_rpc"),
+            AsyncWalletRPCClient(f"http://{wallet_rpc.host}/json_rpc"),
+        ]
+        balancer = AsyncWalletRPCBalancer(clients)
+        results = [await balancer.call("verify", {}) for _ in range(4)]
+        for client in clients:
+            await client.close()
+        return results
+
+    assert async_to_sync(run)() == [{"good": True}] * 4
+    assert len(wallet_rpc.requests) == 4
+
+
+def test_aauthenticate_with_wallet_rpc(wallet_rpc, monero_user):
+    user, address, _secret = monero_user
+    credentials = {"address": address, "challenge": "1", "signature": "2"}
+
+    assert async_to_sync(aauthenticate)(None, **credentials) == user
+    assert wallet_rpc.requests[0]["params"]["address"] == address
+
+
+def test_aauthenticate_fails_invalid_signature(settings, monero_user):
+    settings.DJCL_MONERO_VERIFICATION = "local"
+    _user, address, _secret = monero_user
+    credentials = {"address": address, "challenge": "1", "signature": "SigV2bad"}
+
+    assert async_to_sync(aauthenticate)(None, **credentials) is None
+
+
+def test_async_token_login_succeeds(async_client, settings, monero_user):
+    settings.DJCL_MONERO_VERIFICATION = "local"
+    _user, address, secret = monero_user
+    challenge = gen_challenge()
+    data = {
+        "challenge": challenge,
+        "address": address,
+        "signature": sign_monero_message(address, secret, challenge),
+    }
+
+    response = post(async_client, reverse_lazy("async_api_token_login"), data)
+    replay = post(async_client, reverse_lazy("async_api_token_login"), data)
+
+    assert response.status_code == 200
+    assert "token" in response.json()
+    assert replay.status_code == 400
+    assert not Challenge.objects.all().exists()
+
+
+def test_async_token_login_accepts_json(async_client, settings):
+    set_bitcoin_settings(settings)
+    user = mommy.make(User)
+    mommy.make(
+        Address,
+        user=user,
+        address=VALID_BITCOIN_ADDRESS,
+        network=Address.NETWORK_BITCOIN,
+    )
+    data = {
+        "challenge": gen_challenge(),
+        "address": VALID_BITCOIN_ADDRESS,
+        "signature": "something",
+    }
+
+    with patch("django_cryptolock.utils.verify_bitcoin_signature") as sig_mock:
+        sig_mock.return_value = True
+        response = post(
+            async_client,
+            reverse_lazy("async_api_token_login"),
+            data,
+            content_type="application/json",
+        )
+
+    assert response.status_code == 200
+    assert "token" in response.json()
+
+
+def test_async_token_login_fails_invalid_signature(async_client, wallet_rpc):
+    wallet_rpc.responses = {"verify": {"good": False}}
+    address, _spend, _view = make_monero_account()
+    mommy.make(Address, address=address, network=Address.NETWORK_MONERO)
+    data = {"challenge": gen_challenge(), "address": address, "signature": "x"}
+
+    response = post(async_client, reverse_lazy("async_api_token_login"), data)
+
+    assert response.status_code == 400
+    errors = response.json()
+    assert "Please enter a correct address or signature." in errors["__all__"]
+
+
+def test_async_generate_challenge(async_client):
+    async def request():
+        return await async_client.get(reverse_lazy("async_api_signup"))
+
+    response = async_to_sync(request)()
+
+    assert response.status_code == 200
+    assert {"challenge", "expires"} <= response.json().keys()
+
+
+def test_async_sign_up_succeeds(async_client, settings):
+    settings.DJCL_MONERO_VERIFICATION = "local"
+    address, secret, _view_secret = make_monero_account()
+    challenge = gen_challenge()
+    data = {
+        "challenge": challenge,
+        "address": address,
+        "signature": sign_monero_message(address, secret, challenge),
+        "username": "user",
+    }
+
+    response = post(async_client, reverse_lazy("async_api_signup"), data)
+
+    assert response.status_code == 201
+    assert Address.objects.filter(address=address, user__username="user").exists()
+    assert not Challenge.objects.all().exists()
+
+
+def test_async_sign_up_fails_without_wallet_rpc(async_client, settings):
+    settings.DJCL_MONERO_WALLET_RPC_HOST = "127.0.0.1:1"
+    address, _spend, _view = make_monero_account()
+    data = {
+        "challenge": gen_challenge(),
+        "address": address,
+        "signature": "something",
+        "username": "user",
+    }
+
+    response = post(async_client, reverse_lazy("async_api_signup"), data)
+
+    assert response.status_code == 503
+    assert "Error connecting to Monero daemon" in response.json()["__all__"]
+
+
+def test_async_sign_up_view_redirects(async_client, settings, wallet_rpc):
+    address, _spend, _view = make_monero_account()
+    data = {
+        "challenge": gen_challenge(),
+        "address": address,
+        "signature": "something",
+        "username": "user",
+    }
+
+    response = post(async_client, reverse_lazy("async_signup"), data)
+
+    assert response.status_code == 302
+    assert User.objects.filter(username="user").exists()
+
+
+def test_async_login_view(async_client, settings, monero_user):
+    settings.DJCL_MONERO_VERIFICATION = "local"
+    user, address, secret = monero_user
+    challenge = gen_challenge()
+    data = {
+        "challenge": challenge,
+        "address": address,
+        "signature": sign_monero_message(address, secret, challenge),
+    }
+
+    with patch("django.contrib.auth.views.auth_login") as login_mock:
+        response = post(async_client, reverse_lazy("async_login"), data)
+
+    assert response.status_code == 302
+    assert login_mock.call_args[0][1] == user
+    assert "no-cache" in response["Cache-Control"]
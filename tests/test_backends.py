@@ -2,11 +2,17 @@ from unittest.mock import MagicMock, patch
 
 from django.contrib.auth import authenticate
 from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
 from django.core.exceptions import PermissionDenied
+from django.db import connection
+from django.http import HttpRequest
+from django.test.utils import CaptureQueriesContext
 
+from asgiref.sync import async_to_sync
 import pytest
 from model_mommy import mommy
 
+from django_cryptolock.backends import aauthenticate
 from django_cryptolock.models import Address
 
 from .helpers import (
@@ -58,7 +64,7 @@ def test_monero_backend_cannot_connect_to_RPC(settings, existing_user):
         address=VALID_MONERO_ADDRESS,
         challenge="1",
         signature="invalid sig",
-        **DUMMY_CREDS
+        **DUMMY_CREDS,
     )
 
     assert user is None
@@ -162,3 +168,128 @@ def test_bitcoin_backend_valid_signature(settings, existing_user):
     )
 
     assert user == existing_user
+
+
+def test_backends_share_address_lookup(settings):
+    settings.AUTHENTICATION_BACKENDS = [
+        "django_cryptolock.backends.MoneroAddressBackend",
+        "django_cryptolock.backends.BitcoinAddressBackend",
+        "django.contrib.auth.backends.ModelBackend",
+    ]
+    user = mommy.make(User)
+    mommy.make(
+        Address,
+        user=user,
+        address=VALID_BITCOIN_ADDRESS,
+        network=Address.NETWORK_BITCOIN,
+    )
+    request = HttpRequest()
+
+    with patch("django_cryptolock.backends.verify_bitcoin_signature") as sig_mock:
+        sig_mock.return_value = True
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(2):
+                assert (
+                    authenticate(
+                        request,
+                        address=VALID_BITCOIN_ADDRESS,
+                        challenge="1",
+                        signature="2",
+                    )
+                    == user
+                )
+
+    address_queries = [q for q in queries if "django_cryptolock_address" in q["sql"]]
+    assert len(address_queries) == 1
+
+
+def test_address_lookup_without_request():
+    stored = mommy.make(Address, address=VALID_MONERO_ADDRESS)
+    with CaptureQueriesContext(connection) as queries:
+        assert Address.objects.lookup(VALID_MONERO_ADDRESS).user == stored.user
+    assert len(queries) == 1
+    assert Address.objects.lookup(VALID_BITCOIN_ADDRESS) is None
+
+
+def test_address_lookup_remembers_new_addresses():
+    request = HttpRequest()
+    assert Address.objects.lookup(VALID_MONERO_ADDRESS, request) is None
+
+    stored = mommy.make(Address, address=VALID_MONERO_ADDRESS)
+    Address.objects.remember(stored, request)
+    with CaptureQueriesContext(connection) as queries:
+        assert Address.objects.lookup(VALID_MONERO_ADDRESS, request) == stored
+    assert len(queries) == 0
+
+
+@pytest.fixture
+def dispatch_settings(settings):
+    settings.AUTHENTICATION_BACKENDS = [
+        "django_cryptolock.backends.CryptoLockDispatchBackend",
+        "django.contrib.auth.backends.ModelBackend",
+    ]
+    return settings
+
+
+@pytest.mark.parametrize(
+    "address,network,verify",
+    [
+        (VALID_MONERO_ADDRESS, Address.NETWORK_MONERO, "verify_monero_signature"),
+        (VALID_BITCOIN_ADDRESS, Address.NETWORK_BITCOIN, "verify_bitcoin_signature"),
+    ],
+)
+def test_dispatch_backend_uses_address_network(
+    dispatch_settings, existing_user, address, network, verify
+):
+    mommy.make(Address, address=address, network=network, user=existing_user)
+    credentials = {"address": address, "challenge": "1", "signature": "2"}
+
+    with patch(f"django_cryptolock.backends.{verify}") as verify_mock:
+        verify_mock.return_value = True
+        assert authenticate(MagicMock(), **credentials) == existing_user
+
+    assert verify_mock.call_count == 1
+
+
+def test_dispatch_backend_skips_other_backends(dispatch_settings, existing_user):
+    mommy.make(Address, address=VALID_BITCOIN_ADDRESS, user=existing_user)
+    credentials = {"address": VALID_BITCOIN_ADDRESS, "challenge": "1", "signature": "2"}
+
+    with patch("django_cryptolock.backends.verify_bitcoin_signature") as verify_mock:
+        with patch.object(ModelBackend, "authenticate") as model_mock:
+            assert authenticate(MagicMock(), **credentials) is None
+            # The stored address belongs to another network
+            assert not verify_mock.called
+            assert not model_mock.called
+
+
+def test_dispatch_backend_invalid_signature(dispatch_settings, existing_user):
+    mommy.make(Address, address=VALID_MONERO_ADDRESS, user=existing_user)
+    credentials = {"address": VALID_MONERO_ADDRESS, "challenge": "1", "signature": "2"}
+
+    with patch("django_cryptolock.backends.verify_monero_signature") as verify_mock:
+        verify_mock.return_value = False
+        assert authenticate(MagicMock(), **credentials) is None
+        assert async_to_sync(aauthenticate)(MagicMock(), **credentials) is None
+
+
+def test_dispatch_backend_async(dispatch_settings, existing_user):
+    mommy.make(Address, address=VALID_MONERO_ADDRESS, user=existing_user)
+    credentials = {"address": VALID_MONERO_ADDRESS, "challenge": "1", "signature": "2"}
+
+    async def verify(*args):
+        return True
+
+    with patch("django_cryptolock.backends.averify_monero_signature", verify):
+        user = async_to_sync(aauthenticate)(MagicMock(), **credentials)
+
+    assert user == existing_user
+    assert user.backend == "django_cryptolock.backends.CryptoLockDispatchBackend"
+
+
+def test_dispatch_backend_lets_the_next_backend_to_be_used(
+    dispatch_settings, existing_user
+):
+    assert authenticate(MagicMock(), **DUMMY_CREDS) == existing_user
+    credentials = {"address": "unknown format", "challenge": "1", "signature": "2"}
+    assert authenticate(MagicMock(), **credentials) is None
@@ -0,0 +1,176 @@
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.utils import timezone
+
+import pytest
+from model_mommy import mommy
+
+from django_cryptolock.models import Address, Challenge, CompactChallenge
+from .helpers import VALID_BITCOIN_ADDRESS, VALID_MONERO_ADDRESS
+
+User = get_user_model()
+VALID_BITCOIN_TESTNET_ADDRESS = "n47QBape2PcisN2mkHR2YnhqoBr56iPhJh"
+pytestmark = pytest.mark.django_db
+
+
+def test_purge_challenges_removes_expired():
+    mommy.make(Challenge, 7, expires=timezone.now())
+    Challenge.objects.generate()
+    out = StringIO()
+
+    call_command("purge_challenges", batch_size=2, stdout=out)
+
+    assert Challenge.objects.count() == 1
+    assert "Removed 7 expired challenges" in out.getvalue()
+
+
+def test_purge_challenges_respects_max_runtime():
+    mommy.make(Challenge, 7, expires=timezone.now())
+
+    call_command("purge_challenges", batch_size=2, max_runtime=0, stdout=StringIO())
+
+    assert Challenge.objects.count() == 5
+
+
+def test_purge_challenges_without_expired():
+    Challenge.objects.generate()
+    out = StringIO()
+
+    call_command("purge_challenges", stdout=out)
+
+    assert Challenge.objects.count() == 1
+    assert "Removed 0 expired challenges" in out.getvalue()
+
+
+@pytest.fixture
+def import_settings(settings):
+    settings.DJCL_MONERO_NETWORK = "mainnet"
+    settings.DJCL_BITCOIN_NETWORK = "mainnet"
+    return settings
+
+
+def test_import_addresses_from_csv(import_settings, tmp_path):
+    mommy.make(User, username="alice")
+    mommy.make(User, username="bob")
+    path = tmp_path / "addresses.csv"
+    path.write_text(
+        "user,address,network\n"
+        f"alice,{VALID_MONERO_ADDRESS},\n"
+        f"bob,{VALID_BITCOIN_ADDRESS},bitcoin\n"
+        f"bob,{VALID_MONERO_ADDRESS},monero\n"
+        "bob,not an address,\n"
+        f"carol,{VALID_BITCOIN_TESTNET_ADDRESS},\n"
+    )
+    out, err = StringIO(), StringIO()
+
+    call_command(
+        "import_addresses", str(path), batch_size=2, workers=1, stdout=out, stderr=err
+    )
+
+    addresses = Address.objects.values_list("user__username", "address", "network")
+    assert set(addresses) == {
+        ("alice", VALID_MONERO_ADDRESS, Address.NETWORK_MONERO),
+        ("bob", VALID_BITCOIN_ADDRESS, Address.NETWORK_BITCOIN),
+    }
+    assert "Imported 2 addresses, rejected 3 rows" in out.getvalue()
+    errors = err.getvalue()
+    assert f"Line 4: Address {VALID_MONERO_ADDRESS} already exists" in errors
+    assert "Line 5: Unknown network for not an address" in errors
+    assert "Line 6: Invalid address for mainnet" in errors
+
+
+def test_import_addresses_created_concurrently(import_settings, tmp_path):
+    mommy.make(User, username="alice")
+    other = mommy.make(User, username="bob")
+    path = tmp_path / "addresses.csv"
+    path.write_text(
+        f"user,address\nalice,{VALID_MONERO_ADDRESS}\nalice,{VALID_BITCOIN_ADDRESS}\n"
+    )
+    out, err = StringIO(), StringIO()
+    bulk_create = Address.objects.bulk_create
+
+    def create_meanwhile(objs, **kwargs):
+        # Another process adds one of the addresses after it was checked
+        Address.objects.create(user=other, address=VALID_BITCOIN_ADDRESS)
+        return bulk_create(objs, **kwargs)
+
+    with patch.object(Address.objects, "bulk_create", side_effect=create_meanwhile):
+        call_command("import_addresses", str(path), workers=1, stdout=out, stderr=err)
+
+    assert "Imported 1 addresses, rejected 1 rows" in out.getvalue()
+    assert f"Line 3: Address {VALID_BITCOIN_ADDRESS} already exists" in err.getvalue()
+    assert Address.objects.get(address=VALID_BITCOIN_ADDRESS).user == other
+
+
+def test_import_addresses_from_jsonl_in_process_pool(import_settings, tmp_path):
+    user = mommy.make(User, username="alice")
+    mommy.make(Address, user=user, address=VALID_BITCOIN_ADDRESS)
+    path = tmp_path / "addresses.jsonl"
+    rows = [
+        {"user": "alice", "address": VALID_MONERO_ADDRESS, "network": 1},
+        {"user": "alice", "address": VALID_BITCOIN_ADDRESS},
+        {"user": "bob", "address": VALID_MONERO_ADDRESS},
+    ]
+    path.write_text("\n".join(json.dumps(row) for row in rows) + "\n[]\n")
+    out, err = StringIO(), StringIO()
+
+    call_command("import_addresses", str(path), workers=2, stdout=out, stderr=err)
+
+    assert Address.objects.filter(user=user, address=VALID_MONERO_ADDRESS).exists()
+    assert "Imported 1 addresses, rejected 3 rows" in out.getvalue()
+    errors = err.getvalue()
+    assert f"Line 2: Address {VALID_BITCOIN_ADDRESS} already exists" in errors
+    assert "Line 3: Unknown user bob" in errors
+    assert "Line 4: Malformed row" in errors
+
+
+def test_fill_challenge_pool(settings):
+    settings.DJCL_CHALLENGE_POOL_SIZE = 5
+    out = StringIO()
+
+    call_command("fill_challenge_pool", batch_size=2, stdout=out)
+
+    assert Challenge.objects.filter(issued=False).count() == 5
+    assert "Added 5 challenges to the pool" in out.getvalue()
+
+
+def test_fill_challenge_pool_with_interval():
+    with patch("django_cryptolock.management.commands.fill_challenge_pool.sleep"):
+        call_command(
+            "fill_challenge_pool", size=3, interval=1, max_runtime=0, stdout=StringIO()
+        )
+
+    assert Challenge.objects.filter(issued=False).count() == 3
+
+
+def test_fill_challenge_pool_without_size():
+    with pytest.raises(CommandError):
+        call_command("fill_challenge_pool", stdout=StringIO())
+
+
+def test_copy_compact_challenges(settings):
+    active = Challenge.objects.generate()
+    mommy.make(Challenge, challenge="abcd", expires=timezone.now() - timedelta(1))
+    mommy.make(Challenge, challenge="not hex", expires=active.expires)
+    out = StringIO()
+
+    call_command("copy_compact_challenges", batch_size=1, delete=True, stdout=out)
+
+    assert "Copied 1 challenges" in out.getvalue()
+    assert "Removed 3 challenges" in out.getvalue()
+    assert not Challenge.objects.exists()
+    assert str(CompactChallenge.objects.get()) == active.challenge
+    settings.DJCL_CHALLENGE_STORE = "django_cryptolock.stores.CompactChallengeStore"
+    assert Challenge.objects.consume(active.challenge)
+
+
+@pytest.mark.skipif(connection.vendor == "postgresql", reason="PostgreSQL only")
+def test_challenge_partitions_requires_postgresql():
+    with pytest.raises(CommandError):
+        call_command("challenge_partitions", stdout=StringIO())
@@ -34,12 +34,23 @@ def test_simpleloginform_generates_new_challenge():
     assert not Challenge.objects.all().exists()
 
     form = SimpleLoginForm(request=request)
-    challenge = Challenge.objects.first()
+    assert not Challenge.objects.all().exists()
+    assert 'value="bitid://something' in str(form["challenge"])
+    challenge = Challenge.objects.get()
     assert form.initial.get("challenge")
     assert form.initial.get("challenge") == gen_challenge(request, challenge.challenge)
     assert form.initial.get("challenge").startswith("bitid://something")
 
 
+def test_simpleloginform_challenge_not_rendered():
+    request = MagicMock()
+    request.build_absolute_uri.return_value = "http://something/"
+
+    form = SimpleLoginForm(request=request)
+    assert not form.is_valid()
+    assert not Challenge.objects.all().exists()
+
+
 def test_simpleloginform_generates_no_new_challenge():
     request = MagicMock()
     request.build_absolute_uri.return_value = "http://something/"
@@ -114,7 +125,9 @@ def test_simplesignupform_generates_new_challenge():
     assert not Challenge.objects.all().exists()
 
     form = SimpleSignUpForm(request=request)
-    challenge = Challenge.objects.first()
+    assert not Challenge.objects.all().exists()
+    assert 'value="bitid://something' in str(form["challenge"])
+    challenge = Challenge.objects.get()
     assert form.initial.get("challenge")
     assert form.initial.get("challenge") == gen_challenge(request, challenge.challenge)
     assert form.initial.get("challenge").startswith("bitid://something")
@@ -237,3 +250,86 @@ def test_simplesignupform_expired_challenge(settings):
         },
     )
     assert not form.is_valid()
+
+
+def test_simpleloginform_consumes_challenge(settings):
+    settings.DJCL_MONERO_NETWORK = "mainnet"
+    mommy.make(Challenge, challenge="12345678", expires=FUTURE_TIME)
+    request = MagicMock()
+    request.build_absolute_uri.return_value = "http://something/"
+    data = {
+        "address": VALID_MONERO_ADDRESS,
+        "challenge": gen_challenge(request, "12345678"),
+        "signature": "some valid signature",
+    }
+
+    with patch("django_cryptolock.forms.authenticate") as auth_mock:
+        auth_mock.return_value = mommy.make(User)
+        assert SimpleLoginForm(request=request, data=data).is_valid()
+        assert not Challenge.objects.all().exists()
+        assert not SimpleLoginForm(request=request, data=data).is_valid()
+
+
+def test_simpleloginform_keeps_challenge_on_invalid_login(settings):
+    settings.DJCL_MONERO_NETWORK = "mainnet"
+    mommy.make(Challenge, challenge="12345678", expires=FUTURE_TIME)
+    request = MagicMock()
+    request.build_absolute_uri.return_value = "http://something/"
+    form = SimpleLoginForm(
+        request=request,
+        data={
+            "address": VALID_MONERO_ADDRESS,
+            "challenge": gen_challenge(request, "12345678"),
+            "signature": "some invalid signature",
+        },
+    )
+
+    with patch("django_cryptolock.forms.authenticate") as auth_mock:
+        auth_mock.return_value = None
+        assert not form.is_valid()
+
+    assert Challenge.objects.filter(challenge="12345678").exists()
+
+
+def test_simpleloginform_rpc_unavailable(settings):
+    settings.DJCL_MONERO_NETWORK = "mainnet"
+    mommy.make(Challenge, challenge="12345678", expires=FUTURE_TIME)
+    request = MagicMock()
+    request.build_absolute_uri.return_value = "http://something/"
+
+    form = SimpleLoginForm(
+        request=request,
+        data={
+            "address": VALID_MONERO_ADDRESS,
+            "challenge": gen_challenge(request, "12345678"),
+            "signature": "some valid signature",
+        },
+    )
+    with patch(
+        "django_cryptolock.forms.is_monero_verification_available",
+        return_value=False,
+    ), patch("django_cryptolock.forms.authenticate") as auth_mock:
+        assert not form.is_valid()
+        auth_mock.assert_not_called()
+    assert form.rpc_unavailable()
+
+
+@pytest.mark.parametrize("address", (VALID_MONERO_ADDRESS, VALID_BITCOIN_ADDRESS))
+def test_simplesignupform_valid_addr_with_dispatch_backend(settings, address):
+    settings.AUTHENTICATION_BACKENDS = [
+        "django_cryptolock.backends.CryptoLockDispatchBackend"
+    ]
+    settings.DJCL_MONERO_NETWORK = "mainnet"
+    mommy.make(Challenge, challenge="12345678", expires=FUTURE_TIME)
+    request = MagicMock()
+    request.build_absolute_uri.return_value = "http://something/"
+    form = SimpleSignUpForm(
+        request=request,
+        data={
+            "username": "foo",
+            "address": address,
+            "challenge": gen_challenge(request, "12345678"),
+            "signature": "some valid signature",
+        },
+    )
+    assert form.is_valid()
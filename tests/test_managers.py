@@ -1,11 +1,20 @@
 from datetime import timedelta
+from unittest.mock import patch
 
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
 from django.utils import timezone
 
 import pytest
 from model_mommy import mommy
 
-from django_cryptolock.models import Challenge
+from django_cryptolock.models import Challenge, CompactChallenge, PartitionedChallenge
+from django_cryptolock.stores import (
+    PartitionedChallengeStore,
+    parse_partition_bound,
+    partition_window,
+)
 
 pytestmark = pytest.mark.django_db
 
@@ -37,6 +46,23 @@ class TestChallengeManager:
         challenge = Challenge.objects.generate()
         assert Challenge.objects.is_active(challenge=challenge.challenge)
 
+    def test_consume_active_challenge(self):
+        challenge = Challenge.objects.generate()
+        assert Challenge.objects.consume(challenge.challenge)
+        assert not Challenge.objects.all().exists()
+
+    def test_consume_challenge_only_once(self):
+        challenge = Challenge.objects.generate()
+        assert Challenge.objects.consume(challenge.challenge)
+        assert not Challenge.objects.consume(challenge.challenge)
+
+    def test_consume_expired_challenge(self):
+        challenge = mommy.make(Challenge, challenge="1234", expires=timezone.now())
+        assert not Challenge.objects.consume(challenge.challenge)
+
+    def test_consume_inexistent_challenge(self):
+        assert not Challenge.objects.consume("1234")
+
     def test_invalidate_existing_challenge(self):
         challenge = Challenge.objects.generate()
         Challenge.objects.invalidate(challenge.challenge)
@@ -52,3 +78,339 @@ class TestChallengeManager:
         deleted = Challenge.objects.clean_expired()
         assert deleted == num
         assert Challenge.objects.count() == 1
+
+    def test_clean_expired_challenges_in_batch(self):
+        mommy.make(Challenge, 5, expires=timezone.now())
+        Challenge.objects.generate()
+        assert Challenge.objects.clean_expired(batch_size=3) == 3
+        assert Challenge.objects.clean_expired(batch_size=3) == 2
+        assert Challenge.objects.count() == 1
+
+    @pytest.mark.parametrize("conf,expected", ((None, 2), (1, 2), (0, 0)))
+    def test_maybe_clean_expired(self, settings, conf, expected):
+        if conf is not None:
+            settings.DJCL_CHALLENGE_PURGE_PROBABILITY = conf
+        mommy.make(Challenge, 2, expires=timezone.now())
+        assert Challenge.objects.maybe_clean_expired() == expected
+
+    def test_maybe_clean_expired_is_amortized(self, settings):
+        settings.DJCL_CHALLENGE_PURGE_PROBABILITY = 0.5
+        mommy.make(Challenge, 2, expires=timezone.now())
+        with patch("django_cryptolock.managers.random.random") as random_mock:
+            random_mock.return_value = 0.7
+            assert Challenge.objects.maybe_clean_expired() == 0
+            random_mock.return_value = 0.2
+            assert Challenge.objects.maybe_clean_expired() == 2
+
+
+class TestStatelessChallengeManager:
+    @pytest.fixture(autouse=True)
+    def stateless(self, settings):
+        settings.DJCL_STATELESS_CHALLENGES = True
+
+    def test_generate_does_not_write(self, django_assert_num_queries):
+        with django_assert_num_queries(0):
+            challenge = Challenge.objects.generate()
+        assert challenge.challenge
+        assert challenge.pk is None
+
+    def test_is_active_does_not_read(self, django_assert_num_queries):
+        challenge = Challenge.objects.generate()
+        with django_assert_num_queries(0):
+            assert Challenge.objects.is_active(challenge.challenge)
+
+    def test_is_active_when_expired(self, settings):
+        settings.DJCL_CHALLENGE_EXPIRATION = -1
+        challenge = Challenge.objects.generate()
+        assert not Challenge.objects.is_active(challenge.challenge)
+
+    def test_is_active_when_forged(self):
+        challenge = Challenge.objects.generate()
+        assert not Challenge.objects.is_active(challenge.challenge + "0")
+        assert not Challenge.objects.is_active("1234")
+
+    def test_consume_challenge_only_once(self):
+        challenge = Challenge.objects.generate()
+        assert Challenge.objects.consume(challenge.challenge)
+        assert not Challenge.objects.consume(challenge.challenge)
+        assert Challenge.objects.count() == 1
+
+    def test_consume_expired_challenge(self, settings):
+        settings.DJCL_CHALLENGE_EXPIRATION = -1
+        challenge = Challenge.objects.generate()
+        assert not Challenge.objects.consume(challenge.challenge)
+        assert not Challenge.objects.all().exists()
+
+    def test_invalidate_challenge(self):
+        challenge = Challenge.objects.generate()
+        Challenge.objects.invalidate(challenge.challenge)
+        assert not Challenge.objects.consume(challenge.challenge)
+
+    def test_used_challenges_are_cleaned_after_expiring(self):
+        challenge = Challenge.objects.generate()
+        Challenge.objects.consume(challenge.challenge)
+        Challenge.objects.update(expires=timezone.now() - timedelta(minutes=1))
+        assert Challenge.objects.clean_expired() == 1
+
+
+class TestCacheChallengeManager:
+    @pytest.fixture(autouse=True)
+    def cache_store(self, settings):
+        settings.DJCL_CHALLENGE_STORE = "django_cryptolock.stores.CacheChallengeStore"
+        yield
+        cache.clear()
+
+    def test_generate_does_not_write(self, django_assert_num_queries):
+        with django_assert_num_queries(0):
+            challenge = Challenge.objects.generate()
+        assert challenge.challenge
+        assert challenge.pk is None
+
+    def test_is_active(self, django_assert_num_queries):
+        challenge = Challenge.objects.generate()
+        with django_assert_num_queries(0):
+            assert Challenge.objects.is_active(challenge.challenge)
+
+    def test_is_active_when_inexistent(self):
+        assert not Challenge.objects.is_active("1234")
+
+    def test_is_active_when_expired(self):
+        challenge = Challenge.objects.generate()
+        later = timezone.now() + timedelta(minutes=11)
+        with patch("django_cryptolock.stores.timezone.now") as now_mock:
+            now_mock.return_value = later
+            assert not Challenge.objects.is_active(challenge.challenge)
+
+    def test_consume_challenge_only_once(self):
+        challenge = Challenge.objects.generate()
+        assert Challenge.objects.consume(challenge.challenge)
+        assert not Challenge.objects.consume(challenge.challenge)
+        assert not Challenge.objects.is_active(challenge.challenge)
+
+    def test_consume_inexistent_challenge(self):
+        assert not Challenge.objects.consume("1234")
+
+    def test_consume_without_delete_result(self):
+        challenge = Challenge.objects.generate()
+        with patch("django_cryptolock.stores.django.VERSION", (2, 2)):
+            assert Challenge.objects.consume(challenge.challenge)
+            assert not Challenge.objects.consume(challenge.challenge)
+
+    def test_challenge_expires_with_cache_timeout(self, settings):
+        settings.DJCL_CHALLENGE_EXPIRATION = 0
+        challenge = Challenge.objects.generate()
+        assert not Challenge.objects.is_active(challenge.challenge)
+
+    def test_invalidate_challenge(self):
+        challenge = Challenge.objects.generate()
+        Challenge.objects.invalidate(challenge.challenge)
+        assert not Challenge.objects.is_active(challenge.challenge)
+
+    def test_clean_expired_is_noop(self):
+        Challenge.objects.generate()
+        assert Challenge.objects.clean_expired() == 0
+
+
+class TestCompactChallengeManager:
+    @pytest.fixture(autouse=True)
+    def compact_store(self, settings):
+        settings.DJCL_CHALLENGE_STORE = "django_cryptolock.stores.CompactChallengeStore"
+
+    def test_generate_stores_raw_token(self):
+        challenge = Challenge.objects.generate()
+
+        assert challenge.pk is None
+        assert not Challenge.objects.exists()
+        stored = CompactChallenge.objects.get()
+        assert bytes(stored.token) == bytes.fromhex(challenge.challenge)
+        assert stored.expires == challenge.expires
+
+    def test_is_active(self):
+        challenge = Challenge.objects.generate()
+        assert Challenge.objects.is_active(challenge.challenge)
+        assert not Challenge.objects.is_active("12345678")
+        assert not Challenge.objects.is_active("not hex")
+
+    def test_is_active_when_expired(self, settings):
+        settings.DJCL_CHALLENGE_EXPIRATION = -1
+        challenge = Challenge.objects.generate()
+        assert not Challenge.objects.is_active(challenge.challenge)
+
+    def test_consume_challenge_only_once(self):
+        challenge = Challenge.objects.generate()
+        assert Challenge.objects.consume(challenge.challenge)
+        assert not Challenge.objects.consume(challenge.challenge)
+        assert not Challenge.objects.consume("not hex")
+        assert not CompactChallenge.objects.exists()
+
+    def test_invalidate_challenge(self):
+        challenge = Challenge.objects.generate()
+        Challenge.objects.invalidate(challenge.challenge)
+        Challenge.objects.invalidate("not hex")
+        assert not Challenge.objects.is_active(challenge.challenge)
+
+    def test_clean_expired_challenges_in_batch(self):
+        Challenge.objects.generate()
+        expired = timezone.now() - timedelta(minutes=1)
+        for token in range(3):
+            CompactChallenge.objects.create(token=bytes([token]), expires=expired)
+
+        assert Challenge.objects.clean_expired(batch_size=2) == 2
+        assert Challenge.objects.clean_expired() == 1
+        assert CompactChallenge.objects.count() == 1
+
+    def test_checkout_without_pool(self, settings):
+        settings.DJCL_CHALLENGE_POOL_SIZE = 5
+        assert Challenge.objects.fill_pool() == 0
+        challenge = Challenge.objects.checkout()
+        assert Challenge.objects.is_active(challenge.challenge)
+
+
+def test_partition_window():
+    moment = timezone.now().replace(2020, 1, 1, 10, 25, 30)
+    start, end = partition_window(moment, timedelta(minutes=60))
+    assert start == moment.replace(minute=0, second=0, microsecond=0)
+    assert end == start + timedelta(minutes=60)
+
+
+def test_parse_partition_bound():
+    expression = (
+        "FOR VALUES FROM ('2020-01-01 10:00:00+00') TO ('2020-01-01 11:00:00+00')"
+    )
+    bound = parse_partition_bound(expression)
+    assert bound == timezone.now().replace(2020, 1, 1, 11, 0, 0, 0)
+    assert parse_partition_bound("DEFAULT") is None
+
+
+@pytest.mark.skipif(connection.vendor == "postgresql", reason="PostgreSQL only")
+def test_partitioned_store_requires_postgresql():
+    with pytest.raises(ImproperlyConfigured):
+        PartitionedChallengeStore(Challenge.objects)
+
+
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="Requires PostgreSQL")
+class TestPartitionedChallengeManager:
+    @pytest.fixture(autouse=True)
+    def partitioned_store(self, settings):
+        settings.DJCL_CHALLENGE_STORE = (
+            "django_cryptolock.stores.PartitionedChallengeStore"
+        )
+
+    @property
+    def store(self):
+        return PartitionedChallengeStore(Challenge.objects)
+
+    def test_create_partitions(self):
+        # The challenges issued now may expire on the next window
+        created, errors = self.store.create_partitions(windows=1)
+        assert created in (2, 3)
+        assert not errors
+        assert self.store.create_partitions(windows=1) == (0, [])
+        bounds = [bound for _name, bound, _rows in self.store.partitions()]
+        assert bounds.count(None) == 1
+        assert min(bound for bound in bounds if bound) > timezone.now()
+
+    def test_create_partitions_after_default_rows(self):
+        # Issued before the partitions exist, so kept on the default one
+        challenge = Challenge.objects.generate()
+        window_end = partition_window(challenge.expires, self.store.interval)[1]
+
+        created, errors = self.store.create_partitions(windows=1)
+
+        assert created == 1
+        assert not errors
+        bounds = [bound for _name, bound, _rows in self.store.partitions() if bound]
+        assert min(bounds) == window_end + self.store.interval
+        assert Challenge.objects.consume(challenge.challenge)
+
+    def test_consume_challenge_only_once(self):
+        self.store.create_partitions()
+        challenge = Challenge.objects.generate()
+
+        assert Challenge.objects.is_active(challenge.challenge)
+        assert Challenge.objects.consume(challenge.challenge)
+        assert not Challenge.objects.consume(challenge.challenge)
+
+    def test_drop_expired_partitions(self):
+        past = timezone.now() - timedelta(hours=3)
+        with patch("django.utils.timezone.now", return_value=past):
+            self.store.create_partitions()
+            challenge = Challenge.objects.generate()
+        self.store.create_partitions()
+
+        assert not Challenge.objects.is_active(challenge.challenge)
+        # Partitions are only dropped by the management command
+        assert Challenge.objects.clean_expired() == 0
+        assert PartitionedChallenge.objects.exists()
+        assert self.store.drop_expired_partitions()[0] >= 1
+        assert not PartitionedChallenge.objects.exists()
+
+    def test_clean_expired_on_default_partition(self, settings):
+        settings.DJCL_CHALLENGE_EXPIRATION = -1
+        Challenge.objects.generate()
+        Challenge.objects.generate()
+
+        assert Challenge.objects.clean_expired(batch_size=1) == 1
+        assert Challenge.objects.clean_expired() == 1
+        assert not PartitionedChallenge.objects.exists()
+
+
+class TestChallengePool:
+    @pytest.fixture(autouse=True)
+    def pool(self, settings):
+        settings.DJCL_CHALLENGE_POOL_SIZE = 5
+
+    def test_fill_pool(self):
+        assert Challenge.objects.fill_pool(batch_size=2) == 5
+        assert Challenge.objects.filter(issued=False).count() == 5
+        assert Challenge.objects.fill_pool() == 0
+
+        mommy.make(Challenge, 2, issued=False, expires=timezone.now())
+        assert Challenge.objects.fill_pool(size=8) == 3
+
+    def test_pooled_challenges_are_not_active(self):
+        Challenge.objects.fill_pool()
+        challenge = Challenge.objects.filter(issued=False).first()
+
+        assert not Challenge.objects.is_active(challenge.challenge)
+        assert not Challenge.objects.consume(challenge.challenge)
+
+    def test_checkout_claims_pooled_challenge(self, django_assert_max_num_queries):
+        Challenge.objects.fill_pool()
+        limit = timezone.now() + timedelta(minutes=11)
+
+        with django_assert_max_num_queries(2):
+            challenge = Challenge.objects.checkout()
+
+        assert Challenge.objects.count() == 5
+        assert Challenge.objects.filter(issued=False).count() == 4
+        assert challenge.expires < limit
+        assert Challenge.objects.get(challenge=challenge.challenge).issued
+        assert Challenge.objects.is_active(challenge.challenge)
+        assert Challenge.objects.consume(challenge.challenge)
+
+    def test_checkout_claims_each_challenge_once(self):
+        Challenge.objects.fill_pool()
+        tokens = {Challenge.objects.checkout().challenge for _ in range(5)}
+
+        assert len(tokens) == 5
+        assert not Challenge.objects.filter(issued=False).exists()
+
+    def test_checkout_generates_when_pool_is_empty(self):
+        mommy.make(Challenge, issued=False, expires=timezone.now())
+        challenge = Challenge.objects.checkout()
+
+        assert Challenge.objects.count() == 2
+        assert Challenge.objects.is_active(challenge.challenge)
+
+    def test_checkout_without_pool(self, settings):
+        settings.DJCL_CHALLENGE_POOL_SIZE = 0
+        mommy.make(Challenge, issued=False, expires=timezone.now() + timedelta(hours=1))
+        challenge = Challenge.objects.checkout()
+
+        assert Challenge.objects.filter(issued=True).get() == challenge
+
+    def test_stateless_challenges_are_not_pooled(self, settings):
+        settings.DJCL_STATELESS_CHALLENGES = True
+        assert Challenge.objects.fill_pool() == 0
+        assert Challenge.objects.checkout().pk is None
@@ -0,0 +1,133 @@
+from unittest.mock import MagicMock, patch
+
+from django.contrib.auth import authenticate, get_user_model
+from model_mommy import mommy
+from monerorpc.authproxy import JSONRPCException
+import pytest
+
+from django_cryptolock import metrics
+from django_cryptolock.models import Address, Challenge
+from django_cryptolock.utils import verify_bitcoin_signature, verify_monero_signature
+from .helpers import VALID_BITCOIN_ADDRESS, set_bitcoin_settings, set_monero_settings
+
+User = get_user_model()
+pytestmark = pytest.mark.django_db
+
+
+class RecordingCollector(metrics.MetricsCollector):
+    def __init__(self):
+        self.observed = []
+        self.counted = []
+
+    def observe(self, name, value, **labels):
+        self.observed.append((name, labels))
+
+    def increment(self, name, value=1, **labels):
+        self.counted.append((name, labels))
+
+
+@pytest.fixture
+def collector(settings):
+    settings.DJCL_METRICS_COLLECTOR = "tests.test_metrics.RecordingCollector"
+    metrics._collectors.clear()
+    yield metrics.get_collector()
+    metrics._collectors.clear()
+
+
+def test_default_collector_discards_measurements():
+    collector = metrics.get_collector()
+    assert type(collector) is metrics.MetricsCollector
+    assert collector is metrics.get_collector()
+
+
+def test_challenge_operations_are_timed(collector):
+    challenge = Challenge.objects.generate().challenge
+    Challenge.objects.is_active(challenge)
+    Challenge.objects.consume(challenge)
+    Challenge.objects.clean_expired()
+
+    operations = [labels["operation"] for name, labels in collector.observed]
+    assert operations == ["generate", "is_active", "consume", "clean_expired"]
+
+
+def test_bitcoin_verification_is_measured(collector):
+    with patch("django_cryptolock.utils.bitid.challenge_valid") as valid_mock:
+        valid_mock.return_value = False
+        verify_bitcoin_signature("address", "challenge", "signature", MagicMock())
+
+    assert collector.observed == [
+        (metrics.SIGNATURE_VERIFICATION_SECONDS, {"network": "bitcoin"})
+    ]
+    assert collector.counted == [
+        (metrics.SIGNATURE_VERIFICATIONS, {"network": "bitcoin", "outcome": "invalid"})
+    ]
+
+
+def test_monero_rpc_errors_are_counted(collector, settings):
+    settings.DJCL_MONERO_WALLET_RPC_HOST = "127.0.0.1:1"
+
+    with pytest.raises(JSONRPCException):
+        verify_monero_signature("address", "challenge", "signature")
+
+    assert collector.observed[0][1] == {"network": "monero"}
+    assert collector.counted == [
+        (
+            metrics.SIGNATURE_VERIFICATIONS,
+            {"network": "monero", "outcome": "rpc_error"},
+        )
+    ]
+
+
+@pytest.mark.parametrize("is_valid,outcome", [(True, "success"), (False, "failure")])
+def test_backend_authentications_are_counted(collector, settings, is_valid, outcome):
+    set_bitcoin_settings(settings)
+    mommy.make(Address, address=VALID_BITCOIN_ADDRESS, network=Address.NETWORK_BITCOIN)
+
+    with patch("django_cryptolock.backends.verify_bitcoin_signature") as sig_mock:
+        sig_mock.return_value = is_valid
+        authenticate(
+            MagicMock(),
+            address=VALID_BITCOIN_ADDRESS,
+            challenge="challenge",
+            signature="signature",
+        )
+
+    labels = {"network": "bitcoin", "backend": "BitcoinAddressBackend"}
+    assert (metrics.AUTHENTICATIONS, dict(labels, outcome=outcome)) in (
+        collector.counted
+    )
+
+
+def test_backend_rpc_errors_are_counted(collector, settings):
+    set_monero_settings(settings)
+    mommy.make(Address, address="address", network=Address.NETWORK_MONERO)
+
+    with patch("django_cryptolock.backends.verify_monero_signature") as sig_mock:
+        sig_mock.side_effect = JSONRPCException({"code": -341, "message": "error"})
+        user = authenticate(
+            MagicMock(), address="address", challenge="1", signature="2"
+        )
+
+    assert user is None
+    labels = {"network": "monero", "backend": "MoneroAddressBackend"}
+    assert (metrics.AUTHENTICATIONS, dict(labels, outcome="rpc_error")) in (
+        collector.counted
+    )
+
+
+def test_prometheus_collector():
+    prometheus_client = pytest.importorskip("prometheus_client")
+    registry = prometheus_client.CollectorRegistry()
+    collector = metrics.PrometheusCollector(registry=registry)
+
+    collector.observe(metrics.SIGNATURE_VERIFICATION_SECONDS, 0.2, network="monero")
+    collector.observe(metrics.SIGNATURE_VERIFICATION_SECONDS, 0.4, network="monero")
+    collector.increment(metrics.AUTHENTICATIONS, network="monero", outcome="success")
+
+    labels = {"network": "monero"}
+    name = metrics.SIGNATURE_VERIFICATION_SECONDS
+    assert registry.get_sample_value(f"{name}_count", labels) == 2
+    assert registry.get_sample_value(f"{name}_sum", labels) == pytest.approx(0.6)
+    labels = {"network": "monero", "outcome": "success"}
+    name = metrics.AUTHENTICATIONS
+    assert registry.get_sample_value(f"{name}_total", labels) == 1
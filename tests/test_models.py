@@ -8,7 +8,7 @@ test_django-cryptolock
 Tests for `django-cryptolock` models module.
 """
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
+from django.db import IntegrityError, connection, transaction
 
 import pytest
 from model_mommy import mommy
@@ -107,3 +107,56 @@ def test_address_is_unique():
 
     with pytest.raises(IntegrityError):
         mommy.make(Address, address=VALID_MONERO_MAINNET_ADDR)
+
+
+# Index expected on the query plans, for each database vendor
+ADDRESS_INDEXES = {
+    "sqlite": "sqlite_autoindex_django_cryptolock_address_1",
+    "postgresql": "django_cryptolock_address_address_key",
+}
+
+
+def explain(queryset):
+    if connection.vendor not in ADDRESS_INDEXES:
+        pytest.skip(f"No expected query plan for {connection.vendor}")
+    if connection.vendor == "postgresql":
+        # The tables are too small for the planner to pick an index otherwise
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            return queryset.explain()
+    return queryset.explain()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("network", (None, Address.NETWORK_MONERO))
+def test_for_login_uses_address_index(network):
+    address = mommy.make(Address, address=VALID_MONERO_MAINNET_ADDR)
+
+    queryset = Address.objects.for_login(VALID_MONERO_MAINNET_ADDR, network)
+
+    assert ADDRESS_INDEXES[connection.vendor] in explain(queryset)
+    assert queryset.get() == address
+
+
+@pytest.mark.django_db
+def test_for_login_only_loads_needed_user_columns(django_assert_num_queries):
+    mommy.make(Address, address=VALID_MONERO_MAINNET_ADDR)
+
+    with django_assert_num_queries(1) as captured:
+        address = Address.objects.for_login(VALID_MONERO_MAINNET_ADDR).get()
+        assert address.user.is_active
+        assert address.user.get_session_auth_hash()
+
+    sql = captured.captured_queries[0]["sql"]
+    assert "date_joined" not in sql
+    assert "email" not in sql
+    assert address.user.get_deferred_fields() >= {"email", "date_joined"}
+
+
+@pytest.mark.django_db
+def test_user_network_lookup_uses_index():
+    address = mommy.make(Address, address=VALID_MONERO_MAINNET_ADDR)
+
+    queryset = Address.objects.filter(user=address.user, network=address.network)
+
+    assert "djcl_address_user_network" in explain(queryset)
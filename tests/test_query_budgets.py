@@ -0,0 +1,108 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import Client
+from django.urls import reverse_lazy
+from model_mommy import mommy
+import pytest
+
+from django_cryptolock.models import Address, Challenge
+from django_cryptolock.testing import QueryBudgetExceeded
+from .helpers import VALID_BITCOIN_ADDRESS, gen_challenge, set_bitcoin_settings
+
+User = get_user_model()
+pytestmark = pytest.mark.django_db
+
+# Maximum number of queries for each view. Lower them when a change reduces the
+# number of queries, never raise them without a good reason. Sessions are kept
+# on signed cookies, so the session backend queries are not included.
+QUERY_BUDGETS = {
+    "django_cryptolock:login": 5,
+    "django_cryptolock:signup": 8,
+    "api_token_login": 8,
+    "api_signup": 8,
+}
+
+
+@pytest.fixture
+def bitcoin_user(settings):
+    set_bitcoin_settings(settings)
+    user = mommy.make(User)
+    mommy.make(
+        Address,
+        user=user,
+        address=VALID_BITCOIN_ADDRESS,
+        network=Address.NETWORK_BITCOIN,
+    )
+    return user
+
+
+def login_data():
+    return {
+        "challenge": gen_challenge(),
+        "address": VALID_BITCOIN_ADDRESS,
+        "signature": "something",
+    }
+
+
+def signup_data():
+    return dict(login_data(), username="user")
+
+
+@pytest.mark.parametrize(
+    "view,data,status",
+    [
+        ("django_cryptolock:login", login_data, 302),
+        ("api_token_login", login_data, 200),
+    ],
+)
+def test_login_query_budget(
+    session_settings, bitcoin_user, query_budget, view, data, status
+):
+    client = Client()
+    data = data()
+    with patch("django_cryptolock.backends.verify_bitcoin_signature") as sig_mock:
+        sig_mock.return_value = True
+        with query_budget(QUERY_BUDGETS[view]):
+            response = client.post(reverse_lazy(view), data)
+
+    assert response.status_code == status
+    assert not Challenge.objects.exists()
+
+
+@pytest.mark.parametrize(
+    "view,verify,status",
+    [
+        ("django_cryptolock:signup", "django_cryptolock.views.verify_signature", 302),
+        ("api_signup", "django_cryptolock.api_views.verify_signature", 201),
+    ],
+)
+def test_signup_query_budget(session_settings, query_budget, view, verify, status):
+    set_bitcoin_settings(session_settings)
+    client = Client()
+    data = signup_data()
+    with patch(verify) as sig_mock:
+        sig_mock.return_value = True
+        with query_budget(QUERY_BUDGETS[view]):
+            response = client.post(reverse_lazy(view), data)
+
+    assert response.status_code == status
+    assert User.objects.filter(username="user").exists()
+
+
+def test_query_budget_exceeded(query_budget):
+    with pytest.raises(QueryBudgetExceeded) as error:
+        with query_budget(1):
+            Challenge.objects.generate()
+            Challenge.objects.generate()
+
+    assert "2 queries executed, the budget is 1" in str(error.value)
+
+
+def test_query_budget_as_decorator(query_budget):
+    @query_budget(0)
+    def generate():
+        return Challenge.objects.generate()
+
+    with pytest.raises(QueryBudgetExceeded):
+        generate()
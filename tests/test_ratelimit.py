@@ -0,0 +1,173 @@
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import AsyncClient
+from django.urls import reverse_lazy
+from model_mommy import mommy
+from rest_framework.test import APIClient
+import pytest
+
+from django_cryptolock.models import Address, Challenge
+from django_cryptolock.ratelimit import RateLimiter, get_client_ip, parse_rate
+from .helpers import VALID_BITCOIN_ADDRESS, gen_challenge, set_bitcoin_settings
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+def login_data(address=VALID_BITCOIN_ADDRESS):
+    return {"challenge": gen_challenge(), "address": address, "signature": "sig"}
+
+
+@pytest.mark.parametrize(
+    "rate,expected", [("10/m", (10, 60)), ("1/s", (1, 1)), ("100/hour", (100, 3600))]
+)
+def test_parse_rate(rate, expected):
+    assert parse_rate(rate) == expected
+
+
+def test_get_client_ip(rf, settings):
+    request = rf.get("/", HTTP_X_FORWARDED_FOR="10.0.0.1, 10.0.0.2")
+    assert get_client_ip(request) == "127.0.0.1"
+
+    settings.DJCL_RATE_LIMIT_IP_META = "HTTP_X_FORWARDED_FOR"
+    assert get_client_ip(request) == "10.0.0.1"
+
+
+def test_rate_limiter_sliding_window():
+    limiter = RateLimiter()
+    with patch("django_cryptolock.ratelimit.time", return_value=6000.0):
+        assert limiter.hit("login", "ip", "2/m") is None
+        assert limiter.hit("login", "ip", "2/m") is None
+        assert limiter.hit("login", "ip", "2/m") == 60
+        # Each identifier has its own counter
+        assert limiter.hit("login", "other", "2/m") is None
+
+    # Halfway on the next window, half of the previous requests still count
+    with patch("django_cryptolock.ratelimit.time", return_value=6090.0):
+        assert limiter.hit("login", "ip", "2/m") == 30
+
+    with patch("django_cryptolock.ratelimit.time", return_value=6170.0):
+        assert limiter.hit("login", "ip", "2/m") is None
+
+
+def test_login_rate_limited_by_ip(client, settings):
+    set_bitcoin_settings(settings)
+    settings.DJCL_RATE_LIMITS = {"login": "2/m"}
+    url = reverse_lazy("django_cryptolock:login")
+    mommy.make(Address, address=VALID_BITCOIN_ADDRESS, network=Address.NETWORK_BITCOIN)
+
+    with patch("django_cryptolock.backends.verify_bitcoin_signature") as sig_mock:
+        sig_mock.return_value = False
+        responses = [client.post(url, login_data()) for _ in range(3)]
+
+    assert [r.status_code for r in responses] == [200, 200, 429]
+    assert int(responses[2]["Retry-After"]) > 0
+    assert sig_mock.call_count == 2
+
+
+def test_api_login_rate_limited_by_address(api_client, settings):
+    set_bitcoin_settings(settings)
+    settings.DJCL_RATE_LIMITS = {"login_address": "1/m"}
+    settings.DJCL_RATE_LIMIT_IP_META = "HTTP_X_FORWARDED_FOR"
+    url = reverse_lazy("api_token_login")
+    data = login_data()
+
+    first = api_client.post(url, data, HTTP_X_FORWARDED_FOR="10.0.0.1")
+    with patch("django_cryptolock.forms.authenticate") as auth_mock:
+        auth_mock.return_value = None
+        second = api_client.post(url, data, HTTP_X_FORWARDED_FOR="10.0.0.2")
+        other = api_client.post(
+            url, login_data("other"), HTTP_X_FORWARDED_FOR="10.0.0.2"
+        )
+
+    assert first.status_code == 400
+    assert second.status_code == 429
+    assert second.json() == {"detail": "Too many requests"}
+    assert other.status_code == 400
+    assert auth_mock.call_count == 1
+
+
+def test_challenge_issuance_rate_limited(api_client, settings):
+    settings.DJCL_RATE_LIMITS = {"challenge": "2/m"}
+    url = reverse_lazy("api_signup")
+
+    responses = [api_client.get(url) for _ in range(3)]
+
+    assert [r.status_code for r in responses] == [200, 200, 429]
+    assert Challenge.objects.count() == 2
+
+
+def test_async_sign_up_rate_limited(client, settings):
+    settings.DJCL_RATE_LIMITS = {"signup": "1/m"}
+    url = reverse_lazy("async_api_signup")
+    data = dict(login_data(), username="user")
+
+    first = client.post(url, data, content_type="application/json")
+    second = client.post(url, data, content_type="application/json")
+
+    assert first.status_code == 400
+    assert second.status_code == 429
+    assert second["Content-Type"] == "application/json"
+
+
+def test_async_login_challenge_rate_limited(client, settings):
+    settings.DJCL_RATE_LIMITS = {"challenge": "1/m"}
+    url = reverse_lazy("async_login")
+
+    assert client.get(url).status_code == 200
+    response = client.get(url)
+
+    assert response.status_code == 429
+    # The test template does not render the form, so no challenge is issued
+    assert not Challenge.objects.exists()
+
+
+def test_challenge_view_rate_limited(client, settings):
+    settings.DJCL_RATE_LIMITS = {"challenge": "1/m"}
+    url = reverse_lazy("django_cryptolock:challenge")
+
+    assert client.get(url).status_code == 200
+    response = client.get(url)
+
+    assert response.status_code == 429
+    assert response.json() == {"detail": "Too many requests"}
+    assert Challenge.objects.count() == 1
+
+
+@pytest.mark.parametrize("url_name", ["async_api_signup", "async_login"])
+def test_async_views_check_limits_off_the_event_loop(settings, url_name):
+    # The database cache can only be used from synchronous code
+    settings.CACHES = dict(
+        settings.CACHES,
+        ratelimit={
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "djcl_ratelimit",
+        },
+    )
+    settings.DJCL_RATE_LIMIT_CACHE = "ratelimit"
+    settings.DJCL_RATE_LIMITS = {"challenge": "1/m"}
+    call_command("createcachetable", "djcl_ratelimit")
+    client = AsyncClient()
+    url = reverse_lazy(url_name)
+
+    async def requests():
+        return [await client.get(url), await client.get(url)]
+
+    first, second = async_to_sync(requests)()
+
+    assert first.status_code == 200
+    assert second.status_code == 429
@@ -0,0 +1,326 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+from unittest.mock import patch
+
+import pytest
+from monerorpc.authproxy import JSONRPCException
+
+from django_cryptolock.rpc import (
+    CircuitBreaker,
+    WalletRPCBalancer,
+    WalletRPCPool,
+    get_circuit_breaker,
+    is_wallet_rpc_available,
+    get_wallet_rpc,
+    get_wallet_rpc_pool,
+    close_wallet_rpc_pools,
+)
+from django_cryptolock.utils import verify_monero_signature
+
+from .helpers import StubWalletRPCServer, VALID_MONERO_ADDRESS
+
+
+@pytest.fixture
+def wallet_rpc(settings):
+    with StubWalletRPCServer() as server:
+        settings.DJCL_MONERO_WALLET_RPC_HOST = server.host
+        yield server
+    close_wallet_rpc_pools()
+
+
+def test_call_returns_result(wallet_rpc):
+    pool = WalletRPCPool(f"http://{wallet_rpc.host}/json_rpc")
+    result = pool.call("verify", {"data": "1", "address": "2", "signature": "3"})
+
+    assert result == {"good": True}
+    assert wallet_rpc.requests[0]["method"] == "verify"
+    assert wallet_rpc.requests[0]["params"]["data"] == "1"
+
+
+def test_connection_is_reused_between_calls(wallet_rpc):
+    pool = WalletRPCPool(f"http://{wallet_rpc.host}/json_rpc")
+    for _ in range(10):
+        pool.call("verify", {})
+
+    assert len(wallet_rpc.requests) == 10
+    assert len(wallet_rpc.connections) == 1
+    assert len(pool) == 1
+
+
+def test_idle_connections_are_bounded_by_size(wallet_rpc):
+    pool = WalletRPCPool(f"http://{wallet_rpc.host}/json_rpc", size=2)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: pool.call("verify", {}), range(32)))
+
+    assert len(wallet_rpc.requests) == 32
+    assert len(pool) <= 2
+
+
+def test_open_connections_are_bounded_by_size():
+    with StubWalletRPCServer(delay=0.1) as server:
+        pool = WalletRPCPool(f"http://{server.host}/json_rpc", size=2)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: pool.call("verify", {}), range(16)))
+
+    assert len(server.requests) == 16
+    assert len(server.connections) == 2
+
+
+def test_call_fails_when_no_connection_becomes_available(wallet_rpc):
+    pool = WalletRPCPool(f"http://{wallet_rpc.host}/json_rpc", size=1, timeout=0.2)
+    with pool._slot():
+        with pytest.raises(JSONRPCException) as error:
+            pool.call("verify", {})
+
+    assert error.value.code == -345
+    assert not wallet_rpc.requests
+    assert pool.call("verify", {}) == {"good": True}
+
+
+def test_idle_connections_expire(wallet_rpc):
+    pool = WalletRPCPool(f"http://{wallet_rpc.host}/json_rpc", idle_timeout=0)
+    pool.call("verify", {})
+    with patch("django_cryptolock.rpc.monotonic", return_value=1e9):
+        pool.call("verify", {})
+
+    assert len(wallet_rpc.connections) == 2
+
+
+def test_reconnects_when_pooled_connection_fails(wallet_rpc):
+    pool = WalletRPCPool(f"http://{wallet_rpc.host}/json_rpc")
+    pool.call("verify", {})
+    session, _ = pool._idle[0]
+    # Simulate a connection dropped by the server while idle
+    broken = JSONRPCException({"code": -341, "message": "Connection reset"})
+    with patch.object(session, "post", side_effect=broken):
+        assert pool.call("verify", {}) == {"good": True}
+
+    assert len(wallet_rpc.requests) == 2
+
+
+def test_timeout_is_not_retried():
+    with StubWalletRPCServer(delay=5) as server:
+        pool = WalletRPCPool(f"http://{server.host}/json_rpc", timeout=1)
+        for _ in range(4):
+            pool._release(pool._new_session())
+
+        start = monotonic()
+        with pytest.raises(JSONRPCException):
+            pool.call("verify", {})
+        elapsed = monotonic() - start
+
+    assert 1 <= elapsed < 1.9
+    assert len(server.requests) == 1
+    assert len(pool) == 3
+
+
+def test_connection_error_without_server():
+    pool = WalletRPCPool("http://127.0.0.1:1/json_rpc")
+    with pytest.raises(JSONRPCException) as error:
+        pool.call("verify", {})
+
+    assert error.value.code == -341
+    assert len(pool) == 0
+
+
+def test_pool_is_shared_for_same_settings(wallet_rpc, settings):
+    pool = get_wallet_rpc_pool()
+    assert get_wallet_rpc_pool() is pool
+
+    settings.DJCL_MONERO_WALLET_RPC_POOL_SIZE = 1
+    assert get_wallet_rpc_pool() is not pool
+
+
+def test_verify_monero_signature_uses_pool(wallet_rpc):
+    assert verify_monero_signature(VALID_MONERO_ADDRESS, "challenge", "sig")
+    assert verify_monero_signature(VALID_MONERO_ADDRESS, "challenge", "sig")
+
+    assert len(wallet_rpc.connections) == 1
+    params = wallet_rpc.requests[0]["params"]
+    assert params == {
+        "data": "challenge",
+        "address": VALID_MONERO_ADDRESS,
+        "signature": "sig",
+    }
+
+
+def test_verify_monero_signature_invalid(wallet_rpc):
+    wallet_rpc.responses["verify"] = {"good": False}
+    assert not verify_monero_signature(VALID_MONERO_ADDRESS, "challenge", "sig")
+
+
+def test_circuit_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, open_duration=30)
+    pool = WalletRPCPool("http://127.0.0.1:1/json_rpc", breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(JSONRPCException) as error:
+            pool.call("verify", {})
+        assert error.value.code == -341
+
+    assert breaker.state == CircuitBreaker.OPEN
+    with patch.object(pool, "_call") as call_mock:
+        with pytest.raises(JSONRPCException) as error:
+            pool.call("verify", {})
+
+    assert error.value.code == -345
+    assert not call_mock.called
+
+
+def test_circuit_half_open_probe(wallet_rpc):
+    breaker = CircuitBreaker(failure_threshold=1, open_duration=30)
+    breaker.record_failure()
+    pool = WalletRPCPool(f"http://{wallet_rpc.host}/json_rpc", breaker=breaker)
+
+    with patch("django_cryptolock.rpc.monotonic", return_value=1e9):
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow_request()
+        # Only one probe at a time
+        assert not breaker.allow_request()
+        breaker.probing = False
+        assert pool.call("verify", {}) == {"good": True}
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_failed_probe_opens_again():
+    breaker = CircuitBreaker(failure_threshold=3, open_duration=30)
+    for _ in range(3):
+        breaker.record_failure()
+
+    with patch("django_cryptolock.rpc.monotonic", return_value=1e9):
+        assert breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_circuit_ignores_wallet_errors():
+    breaker = CircuitBreaker(failure_threshold=1)
+    breaker.after_error(JSONRPCException({"code": -2, "message": "Invalid"}))
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.after_error(JSONRPCException({"code": -344, "message": "HTTP 500"}))
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_circuit_disabled():
+    breaker = CircuitBreaker(failure_threshold=0)
+    for _ in range(10):
+        breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_is_shared_and_configurable(settings):
+    settings.DJCL_MONERO_WALLET_RPC_HOST = "127.0.0.1:1"
+    settings.DJCL_MONERO_WALLET_RPC_FAILURE_THRESHOLD = 1
+    settings.DJCL_MONERO_WALLET_RPC_TIMEOUT = 2
+    assert get_wallet_rpc_pool().timeout == 2
+    assert get_wallet_rpc_pool().breaker is get_circuit_breaker()
+    assert is_wallet_rpc_available()
+
+    with pytest.raises(JSONRPCException):
+        verify_monero_signature(VALID_MONERO_ADDRESS, "challenge", "sig")
+
+    assert not is_wallet_rpc_available()
+
+
+@pytest.fixture
+def wallet_rpcs(settings):
+    with StubWalletRPCServer() as first, StubWalletRPCServer() as second:
+        settings.DJCL_MONERO_WALLET_RPC_HOSTS = [first.host, second.host]
+        yield first, second
+    close_wallet_rpc_pools()
+
+
+def test_balancer_round_robin(wallet_rpcs):
+    first, second = wallet_rpcs
+    balancer = get_wallet_rpc()
+    for _ in range(4):
+        assert balancer.call("verify", {}) == {"good": True}
+
+    assert len(first.requests) == 2
+    assert len(second.requests) == 2
+    assert balancer.outstanding == [0, 0]
+
+
+def test_balancer_least_outstanding(wallet_rpcs, settings):
+    first, second = wallet_rpcs
+    settings.DJCL_MONERO_WALLET_RPC_BALANCING = "least_outstanding"
+    balancer = get_wallet_rpc()
+    balancer.outstanding[0] = 3
+    for _ in range(3):
+        balancer.call("verify", {})
+
+    assert len(first.requests) == 0
+    assert len(second.requests) == 3
+
+
+def test_balancer_unknown_strategy():
+    with pytest.raises(ValueError):
+        WalletRPCBalancer([], "random")
+
+
+def test_balancer_fails_over_to_next_endpoint(wallet_rpcs, settings):
+    first, _second = wallet_rpcs
+    settings.DJCL_MONERO_WALLET_RPC_HOSTS = ["127.0.0.1:1", first.host]
+    settings.DJCL_MONERO_WALLET_RPC_FAILURE_THRESHOLD = 1
+    for _ in range(3):
+        assert verify_monero_signature(VALID_MONERO_ADDRESS, "challenge", "sig")
+
+    assert len(first.requests) == 3
+    assert get_circuit_breaker("http://127.0.0.1:1/json_rpc").state == "open"
+    assert get_circuit_breaker(f"http://{first.host}/json_rpc").state == "closed"
+    assert is_wallet_rpc_available()
+
+
+def test_balancer_does_not_fail_over_wallet_errors(wallet_rpcs):
+    first, second = wallet_rpcs
+    balancer = get_wallet_rpc()
+    error = JSONRPCException({"code": -2, "message": "Invalid signature"})
+    with patch.object(WalletRPCPool, "_call", side_effect=error) as call_mock:
+        with pytest.raises(JSONRPCException):
+            balancer.call("verify", {})
+
+    assert call_mock.call_count == 1
+
+
+def test_balancer_raises_when_every_endpoint_fails(settings):
+    settings.DJCL_MONERO_WALLET_RPC_HOSTS = ["127.0.0.1:1", "127.0.0.1:2"]
+    settings.DJCL_MONERO_WALLET_RPC_FAILURE_THRESHOLD = 1
+    with pytest.raises(JSONRPCException) as error:
+        get_wallet_rpc().call("verify", {})
+
+    assert error.value.code == -341
+    assert not is_wallet_rpc_available()
+    with pytest.raises(JSONRPCException) as error:
+        get_wallet_rpc().call("verify", {})
+
+    assert error.value.code == -345
+
+
+def test_balancer_check_health(wallet_rpcs, settings):
+    first, _second = wallet_rpcs
+    settings.DJCL_MONERO_WALLET_RPC_HOSTS = [first.host, "127.0.0.1:1"]
+    breaker = get_circuit_breaker(f"http://{first.host}/json_rpc")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    health = get_wallet_rpc().check_health()
+
+    assert health == {
+        f"http://{first.host}/json_rpc": True,
+        "http://127.0.0.1:1/json_rpc": False,
+    }
+    assert first.requests[0]["method"] == "get_version"
+    # The health check closes the circuit of the endpoint that recovered
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_balancer_is_shared_for_same_settings(wallet_rpcs, settings):
+    balancer = get_wallet_rpc()
+    assert get_wallet_rpc() is balancer
+    assert balancer.size == 8
+    assert balancer.endpoints[0] is get_wallet_rpc_pool()
+
+    settings.DJCL_MONERO_WALLET_RPC_BALANCING = "least_outstanding"
+    assert get_wallet_rpc() is not balancer
@@ -0,0 +1,132 @@
+from unittest.mock import patch
+
+import pytest
+from monero.ed25519 import public_from_secret
+
+from django_cryptolock.signatures import (
+    verify_monero_message,
+    _double_scalarmult_base,
+    _encode_point,
+    BASE,
+)
+from django_cryptolock.utils import verify_monero_signature
+
+from .helpers import make_monero_account, sign_monero_message, VALID_MONERO_ADDRESS
+
+
+# Known answers, produced outside of this package by a reference signer that
+# follows wallet2::sign_message and crypto::generate_signature (no shared code
+# with django_cryptolock.signatures). The message is longer than 127 bytes, so
+# its length takes two varint bytes on SigV2.
+KNOWN_ADDRESS = "4BCvorQ8kFpLoffjNF26ZeNwNadsJq9a8LrDuVLQ5ir95sqL6LrGZHoXWZvTiTj3UhHFVCZU2J9X8WoiNAmSrQUrGdhaakh"
+KNOWN_MESSAGE = "Sign this challenge to log in: 44d91949c7b2eb20" + "x" * 100
+KNOWN_SIGNATURES = {
+    "v1_spend": "SigV1GZ8jm7PTcK9eF6hBeZ582JRKrpzvWknLvRbUQk2wifzWaCBUxq1qVcUJT78i8F7LRoM3tCVv6brXf6ejqyGfTBu8",
+    "v2_spend": "SigV2K8goZPhorFjD3PeNxV8spEVgrU67jrqws2SboJD3cKmk9acLrkALQ64SUJzFHm6Gv7BHMyStAnq8vQRaeUMxU9Vc",
+    "v2_view": "SigV22LjqDFZL2SY1NAD6WkAx3PUW7FSBJ13odRjnjcc6ec2pBBjGShE39SCgBxdnHBFcviEbYQqrKikD5CLHHdci1eny",
+}
+
+
+@pytest.fixture
+def account():
+    return make_monero_account()
+
+
+@pytest.mark.parametrize("name", sorted(KNOWN_SIGNATURES))
+def test_known_signature(name):
+    signature = KNOWN_SIGNATURES[name]
+    assert verify_monero_message(KNOWN_ADDRESS, KNOWN_MESSAGE, signature)
+    assert not verify_monero_message(KNOWN_ADDRESS, KNOWN_MESSAGE[:-1], signature)
+
+
+@pytest.mark.parametrize("name", sorted(KNOWN_SIGNATURES))
+def test_known_signature_tampered(name):
+    signature = KNOWN_SIGNATURES[name]
+    tampered = signature[:20] + ("2" if signature[20] != "2" else "3") + signature[21:]
+    assert not verify_monero_message(KNOWN_ADDRESS, KNOWN_MESSAGE, tampered)
+
+
+def test_known_signature_version_is_checked():
+    # A SigV2 signature is not valid as SigV1, and the other way around
+    v2_as_v1 = "SigV1" + KNOWN_SIGNATURES["v2_spend"][5:]
+    v1_as_v2 = "SigV2" + KNOWN_SIGNATURES["v1_spend"][5:]
+    assert not verify_monero_message(KNOWN_ADDRESS, KNOWN_MESSAGE, v2_as_v1)
+    assert not verify_monero_message(KNOWN_ADDRESS, KNOWN_MESSAGE, v1_as_v2)
+
+
+def test_public_key_matches_monero_implementation():
+    secret = 123456789012345678901234567890
+    expected = public_from_secret(secret.to_bytes(32, "little"))
+    if isinstance(expected, str):
+        expected = bytes.fromhex(expected)
+    assert _encode_point(_double_scalarmult_base(0, BASE, secret)) == expected
+
+
+@pytest.mark.parametrize("version", (1, 2))
+def test_valid_spend_key_signature(account, version):
+    address, spend_secret, _ = account
+    signature = sign_monero_message(address, spend_secret, "challenge", version)
+    assert verify_monero_message(address, "challenge", signature)
+
+
+@pytest.mark.parametrize("version", (1, 2))
+def test_valid_view_key_signature(account, version):
+    address, _, view_secret = account
+    signature = sign_monero_message(address, view_secret, "challenge", version, 1)
+    assert verify_monero_message(address, "challenge", signature)
+
+
+def test_v2_signature_with_wrong_mode(account):
+    address, spend_secret, _ = account
+    signature = sign_monero_message(address, spend_secret, "challenge", 2, 1)
+    assert not verify_monero_message(address, "challenge", signature)
+
+
+@pytest.mark.parametrize("version", (1, 2))
+def test_signature_for_other_message(account, version):
+    address, spend_secret, _ = account
+    signature = sign_monero_message(address, spend_secret, "challenge", version)
+    assert not verify_monero_message(address, "other challenge", signature)
+
+
+def test_signature_for_other_address(account):
+    address, spend_secret, _ = account
+    other_address, _, _ = make_monero_account()
+    signature = sign_monero_message(address, spend_secret, "challenge")
+    assert not verify_monero_message(other_address, "challenge", signature)
+
+
+@pytest.mark.parametrize(
+    "signature",
+    (
+        "",
+        "invalid sig",
+        "SigV3" + "1" * 88,
+        "SigV2",
+        "SigV2" + "1" * 11,
+        "SigV2" + "0" * 88,
+        "SigV2" + "1" * 88,
+        "SigV1" + "z" * 88,
+    ),
+)
+def test_malformed_signature(account, signature):
+    address, _, _ = account
+    assert not verify_monero_message(address, "challenge", signature)
+
+
+def test_invalid_address(account):
+    address, spend_secret, _ = account
+    signature = sign_monero_message(address, spend_secret, "challenge")
+    assert not verify_monero_message("bad addr", "challenge", signature)
+
+
+def test_verify_monero_signature_locally(settings, account):
+    settings.DJCL_MONERO_VERIFICATION = "local"
+    address, spend_secret, _ = account
+    signature = sign_monero_message(address, spend_secret, "challenge")
+
+    with patch("django_cryptolock.utils.get_wallet_rpc") as pool_mock:
+        assert verify_monero_signature(address, "challenge", signature)
+        assert not verify_monero_signature(VALID_MONERO_ADDRESS, "challenge", "sig")
+
+    pool_mock.assert_not_called()
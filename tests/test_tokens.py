@@ -0,0 +1,112 @@
+from unittest.mock import MagicMock, patch
+
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db.models import QuerySet
+
+import pytest
+from model_mommy import mommy
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from django_cryptolock.tokens import issue_token, SignedTokenAuthentication
+
+User = get_user_model()
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def user():
+    return mommy.make(User)
+
+
+def auth_request(token):
+    request = MagicMock()
+    request.META = {"HTTP_AUTHORIZATION": f"Token {token}"}
+    return request
+
+
+def test_reuse_token_creates_on_first_login(user):
+    key = issue_token(user)
+    assert Token.objects.get(user=user).key == key
+
+
+def test_reuse_token_keeps_existing(user, django_assert_num_queries):
+    key = issue_token(user)
+    with django_assert_num_queries(1):
+        assert issue_token(user) == key
+    assert Token.objects.count() == 1
+
+
+def test_rotate_token_replaces_existing(settings, user, django_assert_num_queries):
+    settings.DJCL_TOKEN_ISSUANCE = "rotate"
+    first = issue_token(user)
+    with django_assert_num_queries(1):
+        second = issue_token(user)
+
+    assert first != second
+    assert Token.objects.get(user=user).key == second
+    assert Token.objects.count() == 1
+
+
+def test_rotate_token_concurrent_first_login(settings, user):
+    settings.DJCL_TOKEN_ISSUANCE = "rotate"
+    update = QuerySet.update
+    calls = []
+
+    def update_before_insert(queryset, **kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            # Another request creates the token between the update and insert
+            Token.objects.create(user=user)
+            return 0
+        return update(queryset, **kwargs)
+
+    with patch.object(QuerySet, "update", autospec=True) as mock_update:
+        mock_update.side_effect = update_before_insert
+        key = issue_token(user)
+
+    assert len(calls) == 2
+    assert Token.objects.get(user=user).key == key
+
+
+def test_signed_token_is_not_stored(settings, user, django_assert_num_queries):
+    settings.DJCL_TOKEN_ISSUANCE = "signed"
+    with django_assert_num_queries(0):
+        token = issue_token(user)
+    assert token
+    assert not Token.objects.exists()
+
+
+def test_signed_token_authentication(settings, user):
+    settings.DJCL_TOKEN_ISSUANCE = "signed"
+    token = issue_token(user)
+
+    result = SignedTokenAuthentication().authenticate(auth_request(token))
+
+    assert result == (user, token)
+
+
+@pytest.mark.parametrize("token", ("invalid", "1:abc:def"))
+def test_signed_token_authentication_invalid(token):
+    with pytest.raises(AuthenticationFailed):
+        SignedTokenAuthentication().authenticate(auth_request(token))
+
+
+def test_signed_token_authentication_expired(settings, user):
+    settings.DJCL_TOKEN_ISSUANCE = "signed"
+    settings.DJCL_SIGNED_TOKEN_EXPIRATION = -1
+    token = issue_token(user)
+
+    with pytest.raises(AuthenticationFailed):
+        SignedTokenAuthentication().authenticate(auth_request(token))
+
+
+def test_signed_token_authentication_inactive_user(settings, user):
+    settings.DJCL_TOKEN_ISSUANCE = "signed"
+    token = issue_token(user)
+    user.is_active = False
+    user.save()
+
+    with pytest.raises(AuthenticationFailed):
+        SignedTokenAuthentication().authenticate(auth_request(token))
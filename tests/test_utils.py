@@ -1,7 +1,33 @@
+import threading
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from monerorpc.authproxy import JSONRPCException
 import pytest
 from model_mommy import mommy
 
-from django_cryptolock.utils import generate_challenge
+from django_cryptolock.rpc import close_wallet_rpc_pools
+from django_cryptolock.signatures import verify_monero_message
+from django_cryptolock.utils import (
+    averify_signature,
+    generate_challenge,
+    sign_challenge,
+    unsign_challenge,
+    verify_signature,
+    verify_signatures_batch,
+)
+from .helpers import (
+    EXAMPLE_LOGIN_URL,
+    VALID_BITCOIN_ADDRESS,
+    VALID_BITCOIN_SIG,
+    VALID_BITID_URI,
+    StubWalletRPCServer,
+    VALID_MONERO_ADDRESS,
+    make_monero_account,
+    sign_monero_message,
+)
 
 
 def test_challenge_has_default_byte_len():
@@ -14,3 +40,190 @@ def test_challenge_has_custom_byte_len(length, settings):
     settings.DJCL_CHALLENGE_BYTES = length
     challenge = generate_challenge()
     assert len(bytes.fromhex(challenge)) == length
+
+
+def test_signed_challenge_roundtrip():
+    expires = datetime(2030, 1, 1, 12, 30, tzinfo=timezone.utc)
+    token = sign_challenge("abcd", expires)
+    assert unsign_challenge(token) == ("abcd", expires)
+
+
+@pytest.mark.parametrize(
+    "tamper",
+    (
+        lambda t: t.replace("abcd", "abce"),
+        lambda t: t.replace(".1893", ".1993"),
+        lambda t: t[:-1] + ("0" if t[-1] != "0" else "1"),
+        lambda t: t.rpartition(".")[0],
+        lambda t: "",
+        lambda t: "abcd",
+    ),
+)
+def test_signed_challenge_tampered(tamper):
+    expires = datetime(2030, 1, 1, 12, 30, tzinfo=timezone.utc)
+    token = sign_challenge("abcd", expires)
+    assert unsign_challenge(tamper(token)) is None
+
+
+def test_signed_challenge_depends_on_secret_key(settings):
+    expires = datetime(2030, 1, 1, 12, 30, tzinfo=timezone.utc)
+    token = sign_challenge("abcd", expires)
+    settings.SECRET_KEY = "another secret"
+    assert unsign_challenge(token) is None
+
+
+def _monero_items(count):
+    items = []
+    for i in range(count):
+        address, secret, _view_secret = make_monero_account()
+        signature = sign_monero_message(address, secret, str(i))
+        items.append(("Monero", address, str(i), signature))
+    return items
+
+
+@pytest.mark.parametrize("max_workers", (1, 2))
+def test_verify_signatures_batch_keeps_order(settings, max_workers):
+    settings.DJCL_MONERO_VERIFICATION = "local"
+    bitcoin = ("Bitcoin", VALID_BITCOIN_ADDRESS, VALID_BITID_URI, VALID_BITCOIN_SIG)
+    invalid_bitcoin = bitcoin[:3] + (VALID_BITCOIN_SIG[::-1],)
+    monero = _monero_items(2)
+    invalid_monero = monero[0][:2] + ("other",) + monero[0][3:]
+    items = [monero[0], bitcoin, invalid_monero, ("Unknown", "a", "b", "c")]
+    items += [invalid_bitcoin, monero[1]]
+
+    results = verify_signatures_batch(
+        items, callback_uri=EXAMPLE_LOGIN_URL, max_workers=max_workers
+    )
+
+    assert results == [True, True, False, False, False, True]
+
+
+def test_averify_signature_local_runs_off_the_event_loop(settings):
+    settings.DJCL_MONERO_VERIFICATION = "local"
+    address, secret, _view_secret = make_monero_account()
+    signature = sign_monero_message(address, secret, "challenge")
+    threads = []
+
+    def verify(*args):
+        threads.append(threading.get_ident())
+        return verify_monero_message(*args)
+
+    async def check():
+        with patch("django_cryptolock.utils.verify_monero_message", verify):
+            is_valid = await averify_signature(
+                "Monero", address, "challenge", signature, None
+            )
+        return is_valid, threading.get_ident()
+
+    is_valid, loop_thread = async_to_sync(check)()
+
+    assert is_valid
+    assert threads and loop_thread not in threads
+
+
+def test_verify_signatures_batch_checks_callback_uri():
+    item = ("Bitcoin", VALID_BITCOIN_ADDRESS, VALID_BITID_URI, VALID_BITCOIN_SIG)
+
+    assert verify_signatures_batch([item], max_workers=1) == [True]
+    other_uri = "https://other.test/"
+    assert verify_signatures_batch([item], callback_uri=other_uri) == [False]
+
+
+def test_verify_signatures_batch_uses_wallet_rpc(settings):
+    items = [("Monero", f"address{i}", "challenge", "sig") for i in range(8)]
+    with StubWalletRPCServer() as server:
+        settings.DJCL_MONERO_WALLET_RPC_HOST = server.host
+        results = verify_signatures_batch(items)
+    close_wallet_rpc_pools()
+
+    assert results == [True] * 8
+    addresses = sorted(r["params"]["address"] for r in server.requests)
+    assert addresses == sorted(item[1] for item in items)
+
+
+def test_verify_signatures_batch_wallet_rejects_item(settings):
+    def verify(params):
+        if params["address"] == "bad":
+            return {"error": {"code": -2, "message": "Invalid address"}}
+        return {"good": True}
+
+    items = [("Monero", address, "challenge", "sig") for address in "a bad b".split()]
+    with StubWalletRPCServer({"verify": verify}) as server:
+        settings.DJCL_MONERO_WALLET_RPC_HOST = server.host
+        results = verify_signatures_batch(items)
+    close_wallet_rpc_pools()
+
+    assert results == [True, False, True]
+
+
+def test_verify_signatures_batch_raises_without_wallet_rpc(settings):
+    settings.DJCL_MONERO_WALLET_RPC_HOST = "127.0.0.1:1"
+    items = [("Monero", "a", "challenge", "sig"), ("Monero", "b", "challenge", "sig")]
+
+    with pytest.raises(JSONRPCException):
+        verify_signatures_batch(items)
+    close_wallet_rpc_pools()
+
+
+@pytest.fixture
+def verification_cache(settings):
+    settings.DJCL_VERIFICATION_CACHE_TIMEOUT = 10
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def wallet_rpc(settings):
+    with StubWalletRPCServer() as server:
+        settings.DJCL_MONERO_WALLET_RPC_HOST = server.host
+        yield server
+    close_wallet_rpc_pools()
+
+
+def test_verification_cache_disabled_by_default(wallet_rpc):
+    args = ("Monero", VALID_MONERO_ADDRESS, "challenge", "sig", None)
+    assert verify_signature(*args)
+    assert verify_signature(*args)
+    assert len(wallet_rpc.requests) == 2
+
+
+@pytest.mark.parametrize("result", (True, False))
+def test_verification_cache_answers_duplicates(verification_cache, wallet_rpc, result):
+    wallet_rpc.responses["verify"] = {"good": result}
+    args = ("Monero", VALID_MONERO_ADDRESS, "challenge", "sig", None)
+    assert verify_signature(*args) is result
+    assert verify_signature(*args) is result
+    assert async_to_sync(averify_signature)(*args) is result
+    assert len(wallet_rpc.requests) == 1
+
+    other = ("Monero", VALID_MONERO_ADDRESS, "challenge", "other", None)
+    assert verify_signature(*other) is result
+    assert len(wallet_rpc.requests) == 2
+
+
+def test_verification_cache_skips_rpc_errors(verification_cache, settings):
+    settings.DJCL_MONERO_WALLET_RPC_HOST = "127.0.0.1:1"
+    settings.DJCL_MONERO_WALLET_RPC_FAILURE_THRESHOLD = 0
+    args = ("Monero", VALID_MONERO_ADDRESS, "challenge", "sig", None)
+    for _ in range(2):
+        with pytest.raises(JSONRPCException):
+            verify_signature(*args)
+    close_wallet_rpc_pools()
+
+
+def test_verification_cache_keyed_by_callback_uri(verification_cache, settings):
+    settings.DJCL_BITCOIN_NETWORK = "mainnet"
+    request = MagicMock()
+    request.build_absolute_uri.return_value = EXAMPLE_LOGIN_URL
+    args = ("Bitcoin", VALID_BITCOIN_ADDRESS, VALID_BITID_URI, VALID_BITCOIN_SIG)
+    assert verify_signature(*args, request)
+
+    with patch("django_cryptolock.utils.bitid.challenge_valid") as valid_mock:
+        assert verify_signature(*args, request)
+        assert not valid_mock.called
+
+        request.build_absolute_uri.return_value = "https://other.test/"
+        valid_mock.return_value = False
+        assert not verify_signature(*args, request)
+        assert valid_mock.called
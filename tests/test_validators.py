@@ -1,8 +1,24 @@
+from unittest.mock import patch
+
 from django.core.exceptions import ValidationError
 
 import pytest
 
-from django_cryptolock.validators import validate_monero_address
+from django_cryptolock.validators import (
+    validate_monero_address,
+    validate_bitcoin_address,
+    is_bitcoin_address_format,
+    is_monero_address_format,
+    _bitcoin_address_error,
+    _monero_address_error,
+)
+from .helpers import VALID_BITCOIN_ADDRESS, VALID_MONERO_ADDRESS
+
+
+@pytest.fixture(autouse=True)
+def clear_address_cache():
+    _bitcoin_address_error.cache_clear()
+    _monero_address_error.cache_clear()
 
 
 @pytest.mark.parametrize(
@@ -51,3 +67,62 @@ def test_invalid_address(network, address, settings):
         validate_monero_address(address)
 
     assert f"Invalid address for {network}" in str(error.value)
+
+
+def test_monero_validation_is_cached(settings):
+    settings.DJCL_MONERO_NETWORK = "mainnet"
+    address = VALID_MONERO_ADDRESS[:-1] + "r"
+
+    with patch("django_cryptolock.validators.Address") as address_mock:
+        address_mock.return_value.is_mainnet.return_value = True
+        for _ in range(3):
+            validate_monero_address(address)
+
+    assert address_mock.call_count == 1
+
+
+def test_monero_validation_cache_depends_on_network(settings):
+    settings.DJCL_MONERO_NETWORK = "mainnet"
+    validate_monero_address(VALID_MONERO_ADDRESS)
+    settings.DJCL_MONERO_NETWORK = "stagenet"
+
+    with pytest.raises(ValidationError) as error:
+        validate_monero_address(VALID_MONERO_ADDRESS)
+
+    assert "Invalid address for stagenet" in str(error.value)
+
+
+def test_invalid_results_are_cached(settings):
+    settings.DJCL_BITCOIN_NETWORK = "mainnet"
+    address = VALID_BITCOIN_ADDRESS[:-1] + "X"
+
+    with patch("django_cryptolock.validators.address_valid") as valid_mock:
+        valid_mock.return_value = False
+        for _ in range(3):
+            with pytest.raises(ValidationError):
+                validate_bitcoin_address(address)
+
+    assert valid_mock.call_count == 1
+
+
+def test_bitcoin_validation_cache_depends_on_network(settings):
+    settings.DJCL_BITCOIN_NETWORK = "mainnet"
+    validate_bitcoin_address(VALID_BITCOIN_ADDRESS)
+    settings.DJCL_BITCOIN_NETWORK = "testnet"
+
+    with pytest.raises(ValidationError):
+        validate_bitcoin_address(VALID_BITCOIN_ADDRESS)
+
+
+@pytest.mark.parametrize(
+    "address,is_bitcoin,is_monero",
+    [
+        (VALID_BITCOIN_ADDRESS, True, False),
+        (VALID_MONERO_ADDRESS, False, True),
+        (VALID_MONERO_ADDRESS[:-1] + "0", False, False),
+        ("1N5att", False, False),
+    ],
+)
+def test_address_format(address, is_bitcoin, is_monero):
+    assert is_bitcoin_address_format(address) == is_bitcoin
+    assert is_monero_address_format(address) == is_monero
@@ -8,6 +8,12 @@ from django_cryptolock.api_views import (
     CryptoLockAPITokenLoginView,
     CryptoLockAPISignUpView,
 )
+from django_cryptolock.async_views import (
+    AsyncCryptoLockAPITokenLoginView,
+    AsyncCryptoLockAPISignUpView,
+    AsyncCryptoLockLoginView,
+    AsyncCryptoLockSignUpView,
+)
 
 
 urlpatterns = [
@@ -15,5 +21,17 @@ urlpatterns = [
         "api/token_login", CryptoLockAPITokenLoginView.as_view(), name="api_token_login"
     ),
     path("api/signup", CryptoLockAPISignUpView.as_view(), name="api_signup"),
+    path(
+        "async/api/token_login",
+        AsyncCryptoLockAPITokenLoginView.as_view(),
+        name="async_api_token_login",
+    ),
+    path(
+        "async/api/signup",
+        AsyncCryptoLockAPISignUpView.as_view(),
+        name="async_api_signup",
+    ),
+    path("async/login", AsyncCryptoLockLoginView.as_view(), name="async_login"),
+    path("async/signup", AsyncCryptoLockSignUpView.as_view(), name="async_signup"),
     url(r"^", include("django_cryptolock.urls", namespace="django_cryptolock")),
 ]